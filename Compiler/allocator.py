@@ -24,6 +24,8 @@ class StraightlineAllocator:
         self.defined = {}
         self.dealloc = set()
         self.n = n
+        # instructions with unused results not reported yet
+        self.n_unused = 0
 
     def alloc_reg(self, reg, persistent_allocation):
         base = reg.vectorbase
@@ -80,8 +82,11 @@ class StraightlineAllocator:
                     unused_regs.append(j)
             if unused_regs and len(unused_regs) == len(i.get_def()):
                 # only report if all assigned registers are unused
-                print "Register(s) %s never used, assigned by '%s' in %s" % \
-                    (unused_regs,i,format_trace(i.caller))
+                if i.caller is None:
+                    self.n_unused += 1
+                else:
+                    print "Register(s) %s never used, assigned by '%s' in %s" % \
+                        (unused_regs,i,format_trace(i.caller))
 
             for j in i.get_used():
                 self.alloc_reg(j, persistent_allocation)
@@ -147,11 +152,232 @@ def determine_scope(block):
     block.used_from_scope = used_from_scope
     block.defined_registers = set(last_def.iterkeys())
 
+def merge_instructions(instructions, n, i):
+    """ Merge the arguments of instruction i into instruction n.
+    Returns False if start/stop opens of different types meet, in which
+    case both instructions are kept. """
+    def expand_vector_args(inst):
+        # element by element so that the factors of a multiplication
+        # stay next to each other
+        if not inst.is_vec():
+            return list(inst.args)
+        for arg in inst.args:
+            arg.create_vector_elements()
+        return [arg[j] for j in range(inst.get_size()) for arg in inst.args]
+
+    if isinstance(instructions[n], startinput_class):
+        instructions[n].args[1] += instructions[i].args[1]
+    elif isinstance(instructions[n], (startopen_class,stopopen_class)) and \
+            instructions[n].code != instructions[i].code:
+        # vectorized and scalar instructions share the code
+        return False
+    elif isinstance(instructions[n], (stopinput, gstopinput)):
+        if instructions[n].get_size() != instructions[i].get_size():
+            raise NotImplemented()
+        else:
+            instructions[n].args += instructions[i].args[1:]
+    else:
+        if instructions[n].get_size() != instructions[i].get_size():
+            # merge as non-vector instruction
+            instructions[n].args = expand_vector_args(instructions[n]) + \
+                expand_vector_args(instructions[i])
+            if instructions[n].is_vec():
+                instructions[n].size = 1
+        else:
+            instructions[n].args += instructions[i].args
+    return True
+
+def replay_merges(instructions, merge_log, order):
+    """ Repeat the merges recorded by a Merger working on a copy of
+    instructions and return the surviving instructions in order. """
+    for n,i in merge_log:
+        merge_instructions(instructions, n, i)
+    return [instructions[i] for i in order]
+
+# classes whose instructions keep their order, in order of precedence
+ordered_classes = (ReadMemoryInstruction, WriteMemoryInstruction,
+                   IOInstruction, PublicFileIOInstruction, RawInputInstruction,
+                   startprivateoutput_class, stopprivateoutput_class,
+                   prep_class, StackInstruction)
+
+def dependency_category(cls, merge_class):
+    """ Return whether instructions of a class are merged, whether
+    they are stopopens, and 1 plus the index of the first class in
+    ordered_classes they belong to (0 if none). """
+    category = 0
+    for i,ordered in enumerate(ordered_classes):
+        if issubclass(cls, ordered):
+            category = i + 1
+            break
+    return issubclass(cls, merge_class), issubclass(cls, stopopen_class), \
+        category
+
+class DependencyCategories(dict):
+    """ Cache of dependency_category() by instruction class. """
+    def __init__(self, merge_class):
+        self.merge_class = merge_class
+    def __missing__(self, cls):
+        res = self[cls] = dependency_category(cls, self.merge_class)
+        return res
+
+_dependency_categories = {}
+
+def dependency_categories(merge_class):
+    if merge_class not in _dependency_categories:
+        _dependency_categories[merge_class] = \
+            DependencyCategories(merge_class)
+    return _dependency_categories[merge_class]
+
+class MemoryAliases:
+    """ Order of memory accesses in a basic block for preserve_mem_order,
+    where two accesses are only ordered if they may overlap and one of
+    them writes.
+
+    The address of an indirect access is tracked as a symbol plus a
+    constant. A symbol stands for a regint that is not a constant
+    distance from another one, like a loop counter loaded from memory,
+    so accesses with the same symbol overlap if their offsets do. A
+    regint index into an Array is assumed to stay within the array (see
+    Array.get_address()), so that accesses with different symbols only
+    overlap if their arrays do. Accesses without either are ordered with
+    every other one. """
+    # vectors of constant address longer than this are compared as a
+    # whole instead of by address
+    budget = 100
+
+    def __init__(self, add_edge, bounds):
+        self.add_edge = add_edge
+        # Array bounds by id of the address register
+        self.bounds = bounds
+        self.values = {}
+        self.n_symbols = 0
+        # last write and reads since by memory type and address
+        self.exact = defaultdict(dict)
+        # (node, write, region) of the other accesses by memory type
+        self.others = defaultdict(list)
+
+    def value(self, reg):
+        """ (symbol, offset) of a regint, with symbol None for constants """
+        if reg not in self.values:
+            self.n_symbols += 1
+            self.values[reg] = self.n_symbols, 0
+        return self.values[reg]
+
+    def update(self, instr, outputs):
+        """ Track the regint values defined by an instruction. """
+        outputs = [reg for reg in outputs if reg.reg_type == 'ci']
+        if not outputs:
+            return
+        t = type(instr)
+        value = None
+        if t is ldint_class:
+            value = None, instr.args[1]
+        elif t is movint_class:
+            value = self.value(instr.args[1])
+        elif t in (addint_class, subint_class, mulint_class):
+            a, b = self.value(instr.args[1]), self.value(instr.args[2])
+            if t is addint_class:
+                if a[0] is None or b[0] is None:
+                    value = a[0] or b[0], a[1] + b[1]
+            elif t is subint_class:
+                if b[0] is None:
+                    value = a[0], a[1] - b[1]
+                elif a[0] == b[0]:
+                    value = None, a[1] - b[1]
+            elif a[0] is None and b[0] is None:
+                value = None, a[1] * b[1]
+        for reg in outputs:
+            if reg.vector and instr.is_vec():
+                for i in reg.vector:
+                    self.values.pop(i, None)
+            elif value is not None:
+                self.values[reg] = value
+            else:
+                self.values.pop(reg, None)
+
+    def region(self, instr):
+        """ (symbol, start, end, bounds) of the addresses accessed, with
+        bounds the interval of constant addresses containing them or
+        None. """
+        address = instr.args[1]
+        size = instr.get_size()
+        if isinstance(address, (int, long)):
+            symbol, offset = None, address
+        else:
+            symbol, offset = self.value(address)
+        if symbol is None:
+            bounds = offset, offset + size
+        elif id(address) in self.bounds:
+            _, base, length = self.bounds[id(address)]
+            bounds = base, base + length
+        else:
+            bounds = None
+        return symbol, offset, offset + size, bounds
+
+    @staticmethod
+    def may_overlap(a, b):
+        if a[0] == b[0]:
+            return a[1] < b[2] and b[1] < a[2]
+        elif a[3] is not None and b[3] is not None:
+            return a[3][0] < b[3][1] and b[3][0] < a[3][1]
+        else:
+            return True
+
+    @staticmethod
+    def covers(a, b):
+        return a[0] == b[0] and a[1] <= b[1] and b[2] <= a[2]
+
+    def access(self, n, instr, write):
+        mem_type = instr.args[0].reg_type
+        region = self.region(instr)
+        exact = self.exact[mem_type]
+        others = self.others[mem_type]
+        for m, other_write, other in others:
+            if (write or other_write) and self.may_overlap(region, other):
+                self.add_edge(m, n)
+        if region[0] is None and region[2] - region[1] <= self.budget:
+            for address in xrange(region[1], region[2]):
+                if address not in exact:
+                    exact[address] = [None, []]
+                self.access_address(n, exact[address], write)
+            return
+        bounds = region[3]
+        if bounds is None:
+            addresses = exact.keys()
+        elif bounds[1] - bounds[0] < len(exact):
+            addresses = [a for a in xrange(*bounds) if a in exact]
+        else:
+            addresses = [a for a in exact if bounds[0] <= a < bounds[1]]
+        for address in addresses:
+            last_write, reads = exact[address]
+            if last_write is not None:
+                self.add_edge(last_write, n)
+            if write:
+                for m in reads:
+                    self.add_edge(m, n)
+        if write:
+            # later accesses overlapping these are ordered after this
+            others[:] = [x for x in others if not self.covers(region, x[2])]
+        others.append((n, write, region))
+
+    def access_address(self, n, entry, write):
+        last_write, reads = entry
+        if last_write is not None:
+            self.add_edge(last_write, n)
+        if write:
+            for m in reads:
+                self.add_edge(m, n)
+            entry[0] = n
+            entry[1] = []
+        else:
+            reads.append(n)
+
 class Merger:
     def __init__(self, block, options):
         self.block = block
         self.instructions = block.instructions
         self.options = options
+        self.merge_log = []
         if options.max_parallel_open:
             self.max_parallel_open = int(options.max_parallel_open)
         else:
@@ -177,117 +403,12 @@ class Merger:
         except StopIteration:
             return mergecount, None
 
-        def expand_vector_args(inst):
-            new_args = []
-            for arg in inst.args:
-                if inst.is_vec():
-                    arg.create_vector_elements()
-                    for reg in arg:
-                        new_args.append(reg)
-                else:
-                    new_args.append(arg)
-            return new_args
-
-        Type_Different_flag = 0
-
         for i in merges_iter:
-
-            ### added for debug (start) ###
-            # print("n:")
-            # print(n)
-            # print('%d-th instructions[n];' % i)
-            # print(instructions[n])
-            # print('%d-th instructions[n].args;' % i)
-            # print(instructions[n].args)
-            # print("instructions[n] type;")
-            # print(type(instructions[n]))
-            # print('%d-th instructions[i];' % i)
-            # print(instructions[i])
-            # print('%d-th instructions[i].args;' % i)
-            # print(instructions[i].args)
-            # print("instructions[i] type;")
-            # print(type(instructions[i]))
-            ### added for debug (ended) ###
-
-            if isinstance(instructions[n], startinput_class):
-                ### added for debug (start) ###
-                # print("test1")
-                ### added for debug (ended) ###
-
-                instructions[n].args[1] += instructions[i].args[1]
-
-                ### added for debug (start) ###
-                # print(self.instructions)
-                ### added for debug (ended) ###
-            elif isinstance(instructions[n], (startopen_class,stopopen_class)) and (type(instructions[n]) is not type(instructions[i])):
-                ### added for debug (start) ###
-                # print("check4")
-                # print("type_of_instructions[n]:")
-                # print(type(instructions[n]))
-                # print("type_of_instructions[i]:")
-                # print(type(instructions[i]))
-                ### added for debug (ended) ###
-
-                Type_Different_flag = 1
-
-            elif isinstance(instructions[n], (stopinput, gstopinput)):
-                if instructions[n].get_size() != instructions[i].get_size():
-                    raise NotImplemented()
-                else:
-                    instructions[n].args += instructions[i].args[1:]
-
-                    ### added for debug (start) ###
-                    # print("test2")
-                    ### added for debug (ended) ###
-            else:
-                if instructions[n].get_size() != instructions[i].get_size():
-                    ### added for debug (start) ###
-                    # print("test3")
-                    ### added for debug (ended) ###
-
-                    # merge as non-vector instruction
-                    instructions[n].args = expand_vector_args(instructions[n]) + \
-                        expand_vector_args(instructions[i])
-                    if instructions[n].is_vec():
-                        instructions[n].size = 1
-
-                        ### added for debug (start) ###
-                        # print("test4")
-                        ### added for debug (ended) ###
-                else:
-                    ### added for debug (start) ###
-                    # print("test5")
-                    ### added for debug (ended) ###
-                    instructions[n].args += instructions[i].args
-                
-            # join arg_formats if not special iterators
-            # if not isinstance(instructions[n].arg_format, (itertools.repeat, itertools.cycle)) and \
-            #     not isinstance(instructions[i].arg_format, (itertools.repeat, itertools.cycle)):
-            #     instructions[n].arg_format += instructions[i].arg_format
-
-            # instructions[i] = None
-
-            # ADDED
-            if Type_Different_flag == 0:
+            if merge_instructions(instructions, n, i):
                 instructions[i] = None
-            else:
-                Type_Different_flag = 0
-            # ADDED END
-
-            ### added for debug (start) ###
-            # print("after instructions[i] = None: "+str(instructions))
-            ### added for debug (ended) ###
-
-            # self.merge_nodes(n, i)
-            # mergecount += 1
-
-            # ADDED
-            if Type_Different_flag == 0:
-                self.merge_nodes(n, i)
-                mergecount += 1
-            else:
-                Type_Different_flag = 0
-            # ADDED END
+                self.merge_log.append((n, i))
+            self.merge_nodes(n, i)
+            mergecount += 1
 
         return mergecount, n
 
@@ -593,7 +714,9 @@ class Merger:
 
         def extended_isinstance(object):
             value = 0
-            if isinstance(object,e_startmult_class) and object.is_gf2n() is False:
+            if isinstance(object,e_startdotprod):
+                value = 4
+            elif isinstance(object,e_startmult_class) and object.is_gf2n() is False:
                 value = 0
             elif isinstance(object,startopen_class) and object.is_gf2n() is False:
                 value = 1
@@ -658,7 +781,7 @@ class Merger:
                 print 'Merging %d opens in round %d/%d' % (len(merge), i, len(merges))
             nodes = defaultdict(lambda: None)
 
-            for b in (0, 1, 2, 3):
+            for b in (0, 1, 2, 3, 4):
 
                 ### added for debug (start) ###
                 # print("b:")
@@ -807,6 +930,16 @@ class Merger:
                     G.add_edge(e_startmult_node, gstartopen_node)
                     tmp_node = e_startmult_node
 
+                # dot products cannot be merged with multiplications, so
+                # they follow the other instructions of the round
+                e_startdotprod_node = nodes[j, 4] # e_startdotprod
+                if e_startdotprod_node is not None:
+                    if node_count == 0:
+                        tmp_node = e_startdotprod_node
+                    else:
+                        G.add_edge(tmp_node, e_startdotprod_node)
+                    node_count += 1
+
                 # add edge to retain order of opens over rounds
                 if last_nodes[j] is not None:
                     if node_count == 0:
@@ -868,7 +1001,7 @@ class Merger:
                                 triple='green', square='green', bit='green',\
                                 asm_input='lightgreen')
 
-        G = Compiler.graph.SparseDiGraph(len(block.instructions))
+        G = Compiler.graph.CompactDiGraph(len(block.instructions))
         self.G = G
 
         reg_nodes = {}
@@ -879,12 +1012,10 @@ class Merger:
         # print(last_def)
         ### DEBUG (END) ###
 
-        last_mem_write = []
-        last_mem_read = []
         warned_about_mem = []
         last_mem_write_of = defaultdict(list)
         last_mem_read_of = defaultdict(list)
-        last_print_str = None
+        last_print_str = []
         last = defaultdict(lambda: defaultdict(lambda: None))
         last_open = deque()
 
@@ -907,8 +1038,7 @@ class Merger:
         ### DEBUG (END) ###
 
         def add_edge(i, j):
-            from_merge = isinstance(block.instructions[i], merge_class)
-            to_merge = isinstance(block.instructions[j], merge_class)
+            from_merge = i in open_nodes
             G.add_edge(i, j)
             is_source = G.get_attr(i, 'is_source') and G.get_attr(j, 'is_source') and not from_merge
             G.set_attr(j, 'is_source', is_source)
@@ -1002,8 +1132,59 @@ class Merger:
                 add_edge(last[t][player], n)
             last[t][player] = n
 
+        def read_memory(n, instr):
+            if options.preserve_mem_order:
+                aliases.access(n, instr, False)
+            else:
+                mem_access(n, instr, last_mem_read_of, last_mem_write_of)
+
+        def write_memory(n, instr):
+            if options.preserve_mem_order:
+                aliases.access(n, instr, True)
+            else:
+                mem_access(n, instr, last_mem_write_of, last_mem_read_of)
+
+        # keep I/O instructions in order
+        def io(n, instr):
+            if last_print_str:
+                add_edge(last_print_str[0], n)
+            last_print_str[:] = [n]
+
+        def public_file_io(n, instr):
+            keep_order(instr, n, instr.__class__)
+
+        def player_input(n, instr):
+            keep_order(instr, n, instr.__class__, 0)
+            self.input_nodes.append(n)
+            G.add_node(n, merges=[])
+            player = instr.args[0]
+            if isinstance(instr, stopinput):
+                add_edge(last[startinput_class][player], n)
+            elif isinstance(instr, gstopinput):
+                add_edge(last[gstartinput][player], n)
+
+        def start_private_output(n, instr):
+            keep_order(instr, n, startprivateoutput_class, 2)
+
+        def stop_private_output(n, instr):
+            keep_order(instr, n, stopprivateoutput_class, 1)
+
+        def preprocessing(n, instr):
+            keep_order(instr, n, instr.args[0])
+
+        def stack(n, instr):
+            keep_order(instr, n, StackInstruction)
+
+        # indexed by category, see dependency_category()
+        handlers = (None, read_memory, write_memory, io, public_file_io,
+                    player_input, start_private_output, stop_private_output,
+                    preprocessing, stack)
+        categories = dependency_categories(merge_class)
+        aliases = MemoryAliases(add_edge, block.parent.address_bounds)
+
         for n,instr in enumerate(block.instructions):
             outputs,inputs = instr.get_def(), instr.get_used()
+            is_open, is_stop, category = categories[type(instr)]
 
             ### DEBUG (START) ###
             # print("n:")
@@ -1062,7 +1243,7 @@ class Merger:
                 else:
                     write(reg, n)
 
-            if isinstance(instr, merge_class):
+            if is_open:
                 ### DEBUG (START) ###
                 # print("n-th instruction of merge_class:")
                 # print(n)
@@ -1123,7 +1304,7 @@ class Merger:
 
                 depths[n] = depth
 
-            if isinstance(instr, stopopen_class):
+            if is_stop:
                 ### DEBUG (START) ###
                 # print("stop n-th instruction:")
                 # print(n)
@@ -1147,50 +1328,12 @@ class Merger:
                 G.set_attr(n, 'start', last_open)
                 G.add_node(n, merges=[])
 
-            if isinstance(instr, ReadMemoryInstruction):
-                if options.preserve_mem_order:
-                    if last_mem_write and last_mem_read and last_mem_write[-1] > last_mem_read[-1]:
-                        last_mem_read[:] = []
-                    last_mem_read.append(n)
-                    for i in last_mem_write:
-                        add_edge(i, n)
-                else:
-                    mem_access(n, instr, last_mem_read_of, last_mem_write_of)
-            elif isinstance(instr, WriteMemoryInstruction):
-                if options.preserve_mem_order:
-                    if last_mem_write and last_mem_read and last_mem_write[-1] < last_mem_read[-1]:
-                        last_mem_write[:] = []
-                    last_mem_write.append(n)
-                    for i in last_mem_read:
-                        add_edge(i, n)
-                else:
-                    mem_access(n, instr, last_mem_write_of, last_mem_read_of)
-            # keep I/O instructions in order
-            elif isinstance(instr, IOInstruction):
-                if last_print_str is not None:
-                    add_edge(last_print_str, n)
-                last_print_str = n
-            elif isinstance(instr, PublicFileIOInstruction):
-                keep_order(instr, n, instr.__class__)
-            elif isinstance(instr, RawInputInstruction):
-                keep_order(instr, n, instr.__class__, 0)
-                self.input_nodes.append(n)
-                G.add_node(n, merges=[])
-                player = instr.args[0]
-                if isinstance(instr, stopinput):
-                    add_edge(last[startinput_class][player], n)
-                elif isinstance(instr, gstopinput):
-                    add_edge(last[gstartinput][player], n)
-            elif isinstance(instr, startprivateoutput_class):
-                keep_order(instr, n, startprivateoutput_class, 2)
-            elif isinstance(instr, stopprivateoutput_class):
-                keep_order(instr, n, stopprivateoutput_class, 1)
-            elif isinstance(instr, prep_class):
-                keep_order(instr, n, instr.args[0])
-            elif isinstance(instr, StackInstruction):
-                keep_order(instr, n, StackInstruction)
-
-            if not G.pred[n]:
+            if category:
+                handlers[category](n, instr)
+            if options.preserve_mem_order:
+                aliases.update(instr, outputs)
+
+            if not G.in_degree(n):
                 self.sources.append(n)
 
             if n % 100000 == 0 and n > 0:
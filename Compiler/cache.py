@@ -0,0 +1,126 @@
+# (C) 2016 University of Bristol. See License.txt
+
+""" Cache of compilation results.
+
+A result is stored under a hash of the program source, the program
+arguments, all compiler options, the sources of the compiler including
+config.py and config_mine.py, and the Python version. On a hit, the
+bytecode, schedule, cost report and public input files are restored
+instead of compiling again. Files read by the program itself, for
+example with execfile, are not part of the key.
+
+Entries are directories in COMPILE_CACHE_DIR (see config.py). The least
+recently used ones are removed when the total size exceeds
+COMPILE_CACHE_SIZE bytes. """
+
+import os
+import sys
+import glob
+import shutil
+import hashlib
+import tempfile
+from Compiler.config import *
+from Compiler.program import program_names
+
+def compiler_files():
+    compiler_dir = os.path.dirname(os.path.abspath(__file__))
+    res = sorted(glob.glob(compiler_dir + '/*.py'))
+    for name in ('config_mine', 'Compiler.config_mine'):
+        module = sys.modules.get(name)
+        if module is not None and getattr(module, '__file__', None):
+            res.append(os.path.splitext(module.__file__)[0] + '.py')
+    return res
+
+def key(args, options):
+    """ Hash of everything the compilation result depends on. """
+    programs_dir, infile, name = program_names(args, options.assemblymode)
+    h = hashlib.sha256()
+    for filename in [infile] + compiler_files():
+        h.update(filename + '\0')
+        if os.path.exists(filename):
+            h.update(open(filename, 'rb').read())
+        h.update('\0')
+    h.update(repr(args))
+    h.update(repr(sorted(vars(options).items())))
+    h.update(sys.version)
+    return h.hexdigest()
+
+def get_dir(programs_dir):
+    if COMPILE_CACHE_DIR is None:
+        return programs_dir + '/Cache'
+    else:
+        return os.path.expanduser(COMPILE_CACHE_DIR)
+
+def restore(args, options, key):
+    """ Copy the files of a cached compilation back to the programs
+    directory. Returns False if there is no entry for the key. """
+    programs_dir = program_names(args, options.assemblymode)[0]
+    entry = get_dir(programs_dir) + '/' + key
+    if not os.path.isdir(entry):
+        return False
+    try:
+        os.utime(entry, None)
+        for dirname in os.listdir(entry):
+            if not os.path.exists(programs_dir + '/' + dirname):
+                os.mkdir(programs_dir + '/' + dirname)
+            for filename in os.listdir(entry + '/' + dirname):
+                path = '%s/%s/%s' % (programs_dir, dirname, filename)
+                print 'Restoring', path
+                shutil.copy(entry + '/' + dirname + '/' + filename, path)
+    except (IOError, OSError):
+        # entry removed by another process
+        return False
+    print 'Restored compilation from', entry
+    return True
+
+def store(prog, key):
+    """ Add the output files of a program to the cache. """
+    cache_dir = get_dir(prog.programs_dir)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    entry = cache_dir + '/' + key
+    if os.path.exists(entry):
+        return
+    # copy to a temporary directory first so that others never see a
+    # partial entry
+    tmp = tempfile.mkdtemp(prefix='.', dir=cache_dir)
+    for filename in prog.output_files():
+        if os.path.exists(filename):
+            dirname = os.path.basename(os.path.dirname(filename))
+            if not os.path.exists(tmp + '/' + dirname):
+                os.mkdir(tmp + '/' + dirname)
+            shutil.copy(filename, tmp + '/' + dirname)
+    try:
+        os.rename(tmp, entry)
+    except OSError:
+        # stored by another process in the meantime
+        shutil.rmtree(tmp, ignore_errors=True)
+    evict(cache_dir)
+
+def size(path):
+    res = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            res += os.path.getsize(dirpath + '/' + filename)
+    return res
+
+def evict(cache_dir):
+    """ Remove least recently used entries until the cache fits into
+    COMPILE_CACHE_SIZE. """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.startswith('.'):
+            # being stored
+            continue
+        path = cache_dir + '/' + name
+        try:
+            entries.append((os.path.getmtime(path), size(path), path))
+        except OSError:
+            pass
+    total = sum(entry[1] for entry in entries)
+    for mtime, entry_size, path in sorted(entries):
+        if total <= COMPILE_CACHE_SIZE:
+            break
+        print 'Removing %s from compilation cache' % path
+        shutil.rmtree(path, ignore_errors=True)
+        total -= entry_size
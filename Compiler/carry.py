@@ -0,0 +1,301 @@
+# (C) 2016 University of Bristol. See License.txt
+
+"""
+Carry propagation on shares of bits mod 2 for the bit decomposition and
+recomposition of the NEC ring protocols.
+
+The skew decomposition of a share mod 2^n results in three bit vectors
+x1, x2, x3 such that x1 + x2 + x3 is the secret. One round of full
+adders turns them into a sum vector z and a carry vector c, and the
+bits of the secret are those of z + 2 * c. The variants for this
+addition of two bit vectors of length n are:
+
+ripple: n - 1 rounds, one AND per bit
+sqrt: carry-select with growing blocks, about sqrt(2n) + 2 rounds
+kogge-stone: log(n) + 1 rounds, about 2 n log(n) ANDs
+sklansky: log(n) + 1 rounds, about n log(n) ANDs
+
+If only the top bit is needed, all variants but ripple combine the
+carries in a tree with log(n) + 1 rounds and about 4n ANDs. The test for
+zero needs no carry propagation at all, see is_zero(). The leading bit
+for the reciprocal in division is found with prefix_or() in log(n)
+rounds.
+
+The recomposition of bits to a share mod 2^n cannot use a prefix
+circuit because the skew decomposition of every bit depends on the
+carries into it. The variants for it are:
+
+ripple: n - 1 rounds, two ANDs per bit
+inject: 2 rounds, two multiplications mod 2^n per bit injection
+inject-k: like inject, and the fixed-point multiplication only
+  recomposes the k - f result bits, assuming that the product fits into
+  k bits
+
+Vectorized recompositions always use inject because the runtime only
+composes single registers in ripple.
+
+All registers are created with the global vector size, so the
+functions work within vectorized instructions.
+"""
+
+variants = ('ripple', 'sqrt', 'kogge-stone', 'sklansky')
+variant = 'ripple'
+
+rec_variants = ('ripple', 'inject', 'inject-k')
+rec_variant = 'ripple'
+
+def set_variant(options):
+    """ Set the carry propagation variants from the command-line
+    options """
+    global variant, rec_variant
+    value = getattr(options, 'bitdec', None)
+    if value is not None:
+        if value not in variants:
+            raise CompilerError('Unknown bit decomposition variant: %s' % \
+                                    value)
+        variant = value
+    value = getattr(options, 'bitrec', None)
+    if value is not None:
+        if value not in rec_variants:
+            raise CompilerError('Unknown bit recomposition variant: %s' % \
+                                    value)
+        rec_variant = value
+
+def short_fixed_rec():
+    """ Whether the fixed-point multiplication only recomposes the
+    k - f result bits """
+    return rec_variant == 'inject-k'
+
+def new_bit():
+    return program.curr_block.new_reg('sg')
+
+def xor(a, b):
+    res = new_bit()
+    gadds(res, a, b)
+    return res
+
+def xor_one(a):
+    res = new_bit()
+    gaddsi(res, a, 1)
+    return res
+
+def and_(a, b):
+    res = new_bit()
+    ge_startmult(a, b)
+    ge_stopmult(res)
+    return res
+
+def zero():
+    res = new_bit()
+    gldsi(res, 0)
+    return res
+
+def combine(high, low, compute_p=True):
+    """ Carry propagation of two neighbouring blocks:
+        (g,p) = (g_2, p_2)o(g_1, p_1) -> (g_2 + p_2 * g_1, p_2 * p_1)
+    g_2 and p_2 * g_1 cannot both be one, so XOR suffices for OR. """
+    g = xor(high[0], and_(high[1], low[0]))
+    if compute_p:
+        p = and_(high[1], low[1])
+    else:
+        p = None
+    return g, p
+
+def kogge_stone(items):
+    """ Prefixes of (generate, propagate) pairs, distance doubling in
+    every round. Propagate is omitted when a prefix reaches the first
+    item. """
+    res = list(items)
+    dist = 1
+    while dist < len(res):
+        res = res[:dist] + [combine(res[i], res[i - dist], i >= 2 * dist) \
+                                for i in range(dist, len(res))]
+        dist *= 2
+    return [g for g,p in res]
+
+def sklansky(items):
+    """ Prefixes of (generate, propagate) pairs, doubling the block size
+    in every round. The upper half of a block combines with the top of
+    the lower half, so there are only n/2 combinations per round. """
+    res = list(items)
+    block = 1
+    while block < len(res):
+        for start in range(0, len(res), 2 * block):
+            low = start + block - 1
+            for i in range(low + 1, min(low + block + 1, len(res))):
+                res[i] = combine(res[i], res[low], start != 0)
+        block *= 2
+    return [g for g,p in res]
+
+def carry_select(items):
+    """ Ripple carries in blocks of growing size, for both carry-in
+    values in all but the first block. A block is ready when the carry
+    from the previous block arrives, which then selects the carries. """
+    res = []
+    start = 0
+    size = 2
+    while start < len(items):
+        block = items[start:start + size]
+        if start == 0:
+            res += ripple_gp(block, None)
+        else:
+            carry_in = res[-1]
+            carry0 = ripple_gp(block, None)
+            carry1 = ripple_gp(block, True)
+            # carry0 + carry_in * (carry0 + carry1)
+            res += [xor(c0, and_(carry_in, xor(c0, c1))) \
+                        for c0,c1 in zip(carry0, carry1)]
+        start += size
+        size += 1
+    return res
+
+def ripple_gp(items, carry_in_one):
+    """ Carries of (generate, propagate) pairs one after the other, for
+    carry-in zero (None) or one (True). """
+    res = []
+    for g,p in items:
+        if not res:
+            if carry_in_one:
+                # g + p as they cannot both be one
+                res.append(xor(g, p))
+            else:
+                res.append(g)
+        else:
+            res.append(xor(g, and_(p, res[-1])))
+    return res
+
+def tree(items):
+    """ Carry out of all (generate, propagate) pairs, combining
+    neighbours in every round. """
+    res = list(items)
+    while len(res) > 1:
+        res = [combine(res[i + 1], res[i], i != 0) \
+                   for i in range(0, len(res) - 1, 2)] + res[len(res) & ~1:]
+    return res[0][0]
+
+prefix_functions = {
+    'sqrt': carry_select,
+    'kogge-stone': kogge_stone,
+    'sklansky': sklansky,
+}
+
+def add_carries(res, z, c):
+    """ Bits of z + 2 * c in res. c[j] is the carry from bit j to
+    bit j + 1, so c is one shorter than z. """
+    n = len(res)
+    if variant == 'ripple' or n <= 2:
+        ripple(res, z, c)
+        return
+    # carry into bit 1 is zero because bit 0 of 2 * c is zero, so only
+    # bits 1 to n - 2 generate or propagate carries
+    p = [xor(z[j], c[j - 1]) for j in range(1, n - 1)]
+    g = [and_(z[j], c[j - 1]) for j in range(1, n - 1)]
+    # d[j] is the carry into bit j + 2
+    d = prefix_functions[variant](zip(g, p))
+    gmovs(res[0], z[0])
+    gmovs(res[1], p[0])
+    for j in range(2, n - 1):
+        gadds(res[j], p[j - 1], d[j - 2])
+    gadds(res[n - 1], xor(z[n - 1], c[n - 2]), d[n - 3])
+
+def msb(res, z, c):
+    """ Top bit of z + 2 * c in res, see add_carries(). """
+    n = len(z)
+    if variant == 'ripple' or n <= 2:
+        ripple([new_bit() for i in range(n - 1)] + [res], z, c)
+        return
+    p = [xor(z[j], c[j - 1]) for j in range(1, n - 1)]
+    g = [and_(z[j], c[j - 1]) for j in range(1, n - 1)]
+    gadds(res, xor(z[n - 1], c[n - 2]), tree(zip(g, p)))
+
+def is_zero(res, z, c):
+    """ Whether z + 2 * c is zero mod 2^n in res, see add_carries().
+    The sum is zero if and only if the carry into every bit is the XOR
+    of the bits there, in which case the carry out is their OR. This
+    can be checked for all bits at once, with one round for the ORs and
+    log(n) rounds for the AND of the checks. """
+    n = len(z)
+    # bits of 2 * c
+    d = [None] + c
+    checks = [xor_one(z[0])]
+    if n > 1:
+        checks.append(xor_one(xor(z[1], xor(d[1], z[0]))))
+    for j in range(2, n):
+        # z[j - 1] OR d[j - 1]
+        carry_in = xor(xor(z[j - 1], d[j - 1]), and_(z[j - 1], d[j - 1]))
+        checks.append(xor_one(xor(xor(z[j], d[j]), carry_in)))
+    gmovs(res, and_tree(checks))
+
+def or_(a, b):
+    res = new_bit()
+    gadds(res, xor(a, b), and_(a, b))
+    return res
+
+def prefix_or(bits):
+    """ ORs of all prefixes of bits, in log(n) rounds with about
+    n log(n) / 2 ANDs like sklansky(). """
+    res = list(bits)
+    block = 1
+    while block < len(res):
+        for start in range(0, len(res), 2 * block):
+            low = start + block - 1
+            for i in range(low + 1, min(low + block + 1, len(res))):
+                res[i] = or_(res[i], res[low])
+        block *= 2
+    return res
+
+def and_tree(bits):
+    """ AND of all bits, halving their number in every round. """
+    res = list(bits)
+    while len(res) > 1:
+        res = [and_(res[i], res[i + 1]) for i in range(0, len(res) - 1, 2)] \
+            + res[len(res) & ~1:]
+    return res[0]
+
+def ripple(res, z, c):
+    """ Bits of z + 2 * c with one carry after the other. """
+    n = len(res)
+    c_in = zero()
+    d = zero()
+    for j in range(n):
+        c_xor_d = xor(c_in, d)
+        if j < n - 1:
+            # majority of c_in, d and z[j]
+            in_d_prod = and_(xor_one(c_xor_d), xor(c_in, z[j]))
+            c_in, d = c[j], xor(in_d_prod, z[j])
+        gadds(res[j], z[j], c_xor_d)
+
+def inject(res, bits, signed=False):
+    """ Share mod 2^n of the bits in res by injecting every bit. With
+    signed, the last bit counts negatively like in two's complement. """
+    # The top bit is usually the last one computed. Making all bits
+    # depend on it lets the injections share their rounds instead of
+    # following the bits one by one.
+    align = xor(bits[-1], bits[-1])
+    # sign extension repeats registers, which only need one injection
+    injected = {}
+    for bit in bits:
+        if id(bit) not in injected:
+            injected[id(bit)] = program.curr_block.new_reg('s')
+            e_bitinj(xor(bit, align), injected[id(bit)])
+    injected = [injected[id(bit)] for bit in bits]
+    if len(bits) == 1:
+        if signed:
+            mulsi(res, injected[0], -1)
+        else:
+            movs(res, injected[0])
+        return
+    # Horner's scheme as immediates only hold 32 bits
+    acc = injected[-1]
+    factor = -2 if signed else 2
+    for j in range(len(bits) - 2, -1, -1):
+        doubled = program.curr_block.new_reg('s')
+        mulsi(doubled, acc, factor)
+        factor = 2
+        if j == 0:
+            acc = res
+        else:
+            acc = program.curr_block.new_reg('s')
+        adds(acc, doubled, injected[j])
+
+from instructions import *
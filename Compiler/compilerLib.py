@@ -3,11 +3,13 @@
 from Compiler.program import Program
 from Compiler.config import *
 from Compiler.exceptions import *
-import instructions, instructions_base, types, comparison, library
+import instructions, instructions_base, types, comparison, carry, trunc, \
+    division, cse, library
 
 import random
 import time
 import sys
+import copy
 
 
 def run(args, options, param=-1, merge_opens=True, emulate=True, \
@@ -17,15 +19,25 @@ def run(args, options, param=-1, merge_opens=True, emulate=True, \
     If merge_opens is set to True, will attempt to merge any parallelisable open
     instructions. """
     
+    if emulate and getattr(options, 'stream', False):
+        raise CompilerError('Emulation not possible in streaming mode')
     prog = Program(args, options, param, assemblymode)
     instructions.program = prog
     instructions_base.program = prog
     types.program = prog
     comparison.program = prog
+    carry.program = prog
+    trunc.program = prog
+    division.program = prog
+    cse.program = prog
     prog.EMULATE = emulate
     prog.DEBUG = debug
     VARS['program'] = prog
     comparison.set_variant(options)
+    carry.set_variant(options)
+    trunc.set_variant(options)
+    division.set_variant(options)
+    cse.set_variant(options)
     
     print 'Compiling file', prog.infile
     
@@ -60,8 +72,8 @@ def run(args, options, param=-1, merge_opens=True, emulate=True, \
     
     # check program still does the same thing after optimizations
     if emulate:
-        clearmem = list(prog.mem_c)
-        sharedmem = list(prog.mem_s)
+        clearmem = copy.copy(prog.mem_c)
+        sharedmem = copy.copy(prog.mem_s)
         prog.emulate()
         if prog.mem_c != clearmem or prog.mem_s != sharedmem:
             print 'Warning: emulated memory values changed after compiler optimization'
@@ -0,0 +1,175 @@
+# (C) 2016 University of Bristol. See License.txt
+
+""" Cost model of the online phase.
+
+Every instruction is counted as one of
+
+- rounds: start of an open, multiplication or input
+- sent: elements opened, multiplied or input, per party
+- local: any other instruction
+- preprocessed: triples, bits etc.
+
+separately for mod-2^n ('modp') and GF(2^n) ('gf2n') types. Loops and
+branches are aggregated along the requirement tree of a tape in the same
+way as the offline data requirements. The running time is estimated from
+the latency, bandwidth and element sizes in NETWORK (see config.py). """
+
+import os
+import json
+from collections import defaultdict
+from Compiler.config import *
+from Compiler.instructions import startopen_class, stopopen_class, \
+    startinput_class, stopinput, gstopinput
+from Compiler.instructions_base import DataInstruction
+from Compiler import carry, trunc, division, cse
+
+metrics = ('rounds', 'sent', 'local', 'preprocessed')
+field_types = ('modp', 'gf2n')
+
+def instruction_cost(inst):
+    """ Return (metric, field type, amount) of an instruction. """
+    if inst.is_gf2n():
+        field_type = 'gf2n'
+    else:
+        field_type = 'modp'
+    if isinstance(inst, (startopen_class, startinput_class)):
+        return 'rounds', field_type, 1
+    elif isinstance(inst, stopopen_class):
+        return 'sent', field_type, len(inst.args) * inst.get_size()
+    elif isinstance(inst, (stopinput, gstopinput)):
+        return 'sent', field_type, (len(inst.args) - 1) * inst.get_size()
+    elif isinstance(inst, DataInstruction):
+        return 'preprocessed', inst.field_type, inst.get_size()
+    else:
+        return 'local', field_type, inst.get_size()
+
+def add_block(res, block):
+    """ Add the cost of the instructions of a block and, when
+    debugging, of its source lines to res. """
+    for inst in block.instructions:
+        if inst is not None:
+            metric, field_type, amount = instruction_cost(inst)
+            res[metric, field_type] += amount
+    if block.line_cost is not None:
+        for key,amount in block.line_cost.iteritems():
+            res[key] += amount
+
+def source_line(inst):
+    """ Innermost line of the program source creating an instruction,
+    or of any file outside the compiler if called from elsewhere. """
+    caller = getattr(inst, 'caller', None)
+    if caller is None:
+        return None
+    compiler_dir = os.path.dirname(os.path.abspath(__file__))
+    outside = None
+    for frame in caller:
+        if frame[0].endswith('.mpc'):
+            return '%s:%d' % (frame[0], frame[1])
+        if outside is None and \
+                os.path.dirname(os.path.abspath(frame[0])) != compiler_dir:
+            outside = '%s:%d' % (frame[0], frame[1])
+    return outside
+
+def line_cost(instructions, costs, merge_log, kept):
+    """ Cost per source line of a block, given the instructions and
+    their costs before merging, the merges done and the instructions
+    remaining afterwards. A round is counted for every line that takes
+    part in it. """
+    lines = [source_line(inst) for inst in instructions]
+    kept = set(id(inst) for inst in kept if inst is not None)
+    merged = {}
+    for n,i in merge_log:
+        merged.setdefault(n, set([lines[n]])).update(
+            merged.pop(i, [lines[i]]))
+    merged_away = set(i for n,i in merge_log)
+    res = defaultdict(lambda: 0)
+    for j,(metric, field_type, amount) in enumerate(costs):
+        if id(instructions[j]) in kept:
+            if metric == 'rounds':
+                for line in merged.get(j, [lines[j]]):
+                    res[metric, field_type, line] += amount
+            else:
+                res[metric, field_type, lines[j]] += amount
+        elif j in merged_away and metric != 'rounds':
+            res[metric, field_type, lines[j]] += amount
+    return res
+
+def network(program):
+    """ Network parameters from config.py and the command line. """
+    res = dict(NETWORK)
+    for key in ('latency', 'bandwidth'):
+        value = getattr(program.options, key, None)
+        if value is not None:
+            res[key] = float(value)
+    if res.get('gf2n_bytes') is None:
+        res['gf2n_bytes'] = (program.galois_length + 7) / 8
+    return res
+
+def number(x):
+    """ JSON-compatible count, -1 for unbounded loops like use. """
+    if x == float('inf') or x != x:
+        return -1
+    elif x == int(x):
+        return int(x)
+    else:
+        return x
+
+def summary(cost, params):
+    """ Totals of a cost tally and estimated running time in seconds. """
+    res = {}
+    for metric in metrics:
+        res[metric] = dict((field_type, number(cost[metric, field_type])) \
+                               for field_type in field_types)
+    rounds = sum(cost['rounds', t] for t in field_types)
+    sent = sum(cost['sent', t] * params[t + '_bytes'] for t in field_types)
+    local = sum(cost['local', t] for t in field_types)
+    time = rounds * params['latency'] + sent / float(params['bandwidth']) + \
+        local * params['local_op']
+    res['bytes sent'] = number(sent)
+    res['time'] = number(time)
+    return res
+
+def tape_report(tape, params):
+    res = summary(tape.cost, params)
+    lines = defaultdict(lambda: defaultdict(lambda: 0))
+    for key,amount in tape.cost.iteritems():
+        if len(key) == 3:
+            lines[key[2]][key[0], key[1]] += amount
+    if lines:
+        res['lines'] = dict((str(line), summary(cost, params)) \
+                                for line,cost in lines.iteritems())
+    if tape.cse_savings['reused']:
+        res['reused'] = dict(tape.cse_savings)
+    if tape.register_sizes is not None:
+        res['registers'] = dict((reg_type, dict(before=before, after=after)) \
+                                    for reg_type,(before,after) in \
+                                    tape.register_sizes.iteritems())
+    return res
+
+def write_report(program, tapes, filename):
+    """ Write the cost of tapes as JSON. The total is over the tapes
+    run from the main program, which include the threads they start. """
+    params = network(program)
+    total = defaultdict(lambda: 0)
+    for sch in program.schedule:
+        if sch[0] == 'start':
+            for tape,arg in sch[1]:
+                if tape in tapes:
+                    for key,amount in tape.cost.iteritems():
+                        if len(key) == 2:
+                            total[key] += amount
+    report = { 'program': program.name,
+               'network': params,
+               'bitdec': carry.variant,
+               'bitrec': carry.rec_variant,
+               'trunc': trunc.variant,
+               'div_iterations': division.iterations,
+               'cse': cse.enabled,
+               'total': summary(total, params),
+               'tapes': dict((tape.name, tape_report(tape, params)) \
+                                 for tape in tapes) }
+    print 'Writing cost report to', filename
+    out = open(filename, 'w')
+    json.dump(report, out, indent=1, sort_keys=True, separators=(',', ': '))
+    out.write('\n')
+    out.close()
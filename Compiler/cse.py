@@ -0,0 +1,150 @@
+# (C) 2016 University of Bristol. See License.txt
+
+"""
+Common-subexpression elimination of the conversions between shares mod
+2^n and shares mod 2.
+
+A CISC instruction with reusable set (bit decomposition, top bit, zero
+test, bit injection, recomposition, comparison and truncation) is
+expanded once per tape for the same class and inputs, that is, the
+input registers and the bit width. A later one in the same basic block
+or in a block nested in it (see Tape.BasicBlock.scope) copies the
+results of the earlier one, which needs no communication.
+
+Below the CISC level, e_bitdec, e_msb and e_eqz share the full adders
+of the skew decomposition of a register, provided that the earlier one
+covers the bits needed. Comparisons and equality tests of the same sint
+share the difference, see difference(), so that a < b and a == b
+decompose a - b once.
+
+This relies on registers being written once, which holds for the
+registers of the types in types.py. --no-cse turns the reuse off.
+
+Every reuse adds the rounds and multiplications that the skipped
+instructions need on their own to the savings of the tape, which are
+printed and included in the cost report. The rounds are an upper bound
+because the merging of communication may have overlapped them with
+others.
+"""
+
+enabled = True
+
+def set_variant(options):
+    """ Enable or disable the reuse from the command-line options """
+    global enabled
+    enabled = getattr(options, 'cse', True)
+
+def cached(key):
+    """ Value cached for key in the current block or a block it is
+    nested in, or None """
+    if not enabled:
+        return None
+    entry = program.curr_tape.conversions.get(key)
+    if entry is None or not program.curr_block.is_nested_in(entry[1]):
+        return None
+    return entry[2]
+
+def cache(key, inputs, value):
+    if enabled:
+        # keeping the inputs prevents their ids from being reused
+        program.curr_tape.conversions[key] = \
+            inputs, program.curr_block, value
+
+def count(rounds, products):
+    """ Add a reuse saving rounds and products to the tape's savings """
+    savings = program.curr_tape.cse_savings
+    savings['reused'] += 1
+    savings['rounds'] += rounds
+    savings['multiplications'] += products
+
+def cost(instructions):
+    """ Rounds and multiplications of a straight-line sequence of
+    instructions on its own. Elements of vector registers count as
+    ready with the whole vector. """
+    ready = {}
+    started = {False: [], True: []}
+    rounds = 0
+    products = 0
+    for inst in instructions:
+        depth = max([ready.get(reg.vectorbase, 0) \
+                         for reg in inst.get_used()] + [0])
+        if isinstance(inst, startopen_class):
+            started[inst.is_gf2n()].append(depth + 1)
+            continue
+        if isinstance(inst, stopopen_class):
+            depth = started[inst.is_gf2n()].pop(0)
+            rounds = max(rounds, depth)
+            if isinstance(inst, (e_stopmult_class, e_stopdotprod)):
+                products += len(inst.args) * inst.get_size()
+        for reg in inst.get_def():
+            ready[reg.vectorbase] = max(ready.get(reg.vectorbase, 0), depth)
+    return rounds, products
+
+def expand(instr):
+    """ Expand a reusable CISC instruction or copy the results of an
+    earlier one with the same class and inputs """
+    if not enabled:
+        instr.expand()
+        return
+    inputs = []
+    outputs = []
+    for arg,f in zip(instr.args, instr.arg_format):
+        if base.format_str_is_writeable(f):
+            outputs.append(arg)
+        elif base.format_str_is_reg(f):
+            inputs.append(id(arg))
+        else:
+            inputs.append(arg)
+    key = (type(instr),) + tuple(inputs)
+    res = cached(key)
+    if res is None:
+        block = program.curr_block
+        start = len(block.instructions)
+        instr.expand()
+        cache(key, instr, (outputs, cost(block.instructions[start:])))
+        return
+    previous, saved = res
+    base.set_global_vector_size(instr.get_size())
+    for dest,source in zip(outputs, previous):
+        if source.reg_type == 'sg':
+            gmovs(dest, source)
+        else:
+            movs(dest, source)
+    base.reset_global_vector_size()
+    count(*saved)
+
+def full_adders(x, n, low, compute):
+    """ Sum and carry bits of the skew decomposition of the n lower bits
+    of x from bit low on, reusing those of an earlier decomposition of
+    at least these bits. compute(low) computes them otherwise. """
+    size = base.get_global_vector_size()
+    key = ('full adders', id(x), size)
+    res = cached(key)
+    if res is not None:
+        first, last, z, c = res
+        if first <= low and last >= n:
+            count(int(n - 1 > low), (n - 1 - low) * size)
+            return z[low - first:n - first], c[low - first:n - 1 - first]
+    z, c = compute(low)
+    cache(key, x, (low, n, z, c))
+    return z, c
+
+def difference(a, b, symmetric=False):
+    """ Register of a - b for secret registers a and b, computed once
+    in the current block and the blocks nested in it. With symmetric,
+    an earlier b - a is returned, which suffices for a zero test. """
+    if symmetric:
+        res = cached(('difference', id(b), id(a)))
+        if res is not None:
+            return res
+    key = ('difference', id(a), id(b))
+    res = cached(key)
+    if res is None:
+        res = program.curr_block.new_reg('s')
+        subs(res, a, b)
+        cache(key, (a, b), res)
+    return res
+
+import Compiler.instructions_base as base
+from Compiler.instructions import startopen_class, stopopen_class, \
+    e_stopmult_class, e_stopdotprod, subs, movs, gmovs
@@ -0,0 +1,75 @@
+# (C) 2016 University of Bristol. See License.txt
+
+"""
+Division of fixed-point numbers, see sfix.__div__().
+
+A divisor that is known when compiling (a Python number, or a cfix or
+sfix created from one or by load_int() of one) is replaced by its
+reciprocal, so that the division costs one multiplication by a clear
+value and one truncation. The reciprocal is normalised to f significant
+bits whatever the size of the divisor, see public_reciprocal(). A cfix
+divisor only known at run time is inverted in the clear, which needs no
+communication.
+
+A secret divisor is first normalised to a power of two close to its
+reciprocal (see sint.e_reci_appro()), which takes log(k) rounds in
+GF(2^n) for the leading bit. Goldschmidt iterations then double the
+precision of the reciprocal in every iteration, starting from an error
+of at most 1/2. By default there are floor(log2(k)) of them, which can
+be changed with --div-iterations. Every iteration costs two
+multiplications and truncations in sequence. For k = 48 and f = 16,
+four iterations give the same results as the default five.
+
+The reciprocal of a secret divisor is kept per tape and reused for
+every division by the same register in the same basic block or in a
+block nested in it (see Tape.BasicBlock.scope), so that the
+normalisation and iterations are done once.
+"""
+
+import math
+
+iterations = None
+
+def set_variant(options):
+    """ Set the number of iterations from the command-line option """
+    global iterations
+    value = getattr(options, 'div_iterations', None)
+    if value is None:
+        return
+    if value < 0:
+        raise CompilerError('Negative number of division iterations: %d' % \
+                                value)
+    iterations = value
+
+def n_iterations(k):
+    """ Number of Goldschmidt iterations for k-bit numbers """
+    if iterations is None:
+        return int(math.floor(math.log(k, 2)))
+    return iterations
+
+def public_reciprocal(x, f, k):
+    """ Reciprocal of a non-zero number x as an integer r and a number of
+    bits m such that x * r is about 2^m, with f significant bits in r.
+    Multiplying a fixed-point number by r and truncating by m divides it
+    by x. Returns r, m and the bit length of the product before the
+    truncation if the quotient fits into k bits. """
+    e = max(int(math.floor(math.log(abs(x), 2))), 1 - f)
+    m = f + e
+    return int(round(2 ** m / float(x))), m, min(k + e, 64)
+
+def cached_reciprocal(divisor):
+    """ Reciprocal of a secret divisor computed before in the current
+    block or a block it is nested in, or None """
+    if id(divisor) not in program.curr_tape.reciprocals:
+        return None
+    _, block, res = program.curr_tape.reciprocals[id(divisor)]
+    if program.curr_block.is_nested_in(block):
+        return res
+    return None
+
+def cache_reciprocal(divisor, res):
+    # keeping the divisor prevents its id from being reused
+    program.curr_tape.reciprocals[id(divisor)] = \
+        divisor, program.curr_block, res
+
+from Compiler.exceptions import *
@@ -0,0 +1,101 @@
+# (C) 2016 University of Bristol. See License.txt
+
+"""
+Rewriting of sums of products into dot products. Every product of two
+sint is communicated on its own by e_startmult, while e_startdotprod
+only communicates the sum of a group of products (see sint.dot()).
+
+The pass finds trees of secret additions in a basic block, as created by
+expressions like a * b + c * d or sum(x * y for ...). The leaves of a tree
+are the operands that are not the result of another addition used only
+there. If at least two of them are products used only there, the
+multiplications are replaced by one dot product, which the remaining
+leaves are added to.
+"""
+
+from collections import defaultdict
+from Compiler.instructions import e_startmult_class, e_stopmult_class, \
+    adds_class, e_startdotprod, e_stopdotprod
+
+def local(reg):
+    """ Whether a register is scalar and not used outside its block. """
+    return reg.can_eliminate and reg.vectorbase is reg and not reg.vector
+
+def rewrite(block):
+    """ Replace sums of products in a basic block by dot products.
+    Returns the number of products replaced. """
+    instructions = block.instructions
+    products = {}
+    sums = {}
+    uses = defaultdict(lambda: 0)
+    user = {}
+    for i,inst in enumerate(instructions):
+        for reg in inst.get_used():
+            uses[reg] += 1
+            user[reg] = i
+        if type(inst) is e_startmult_class and len(inst.args) == 2 and \
+                i + 1 < len(instructions) and \
+                type(instructions[i + 1]) is e_stopmult_class and \
+                len(instructions[i + 1].args) == 1:
+            products[instructions[i + 1].args[0]] = i
+        elif type(inst) is adds_class:
+            sums[inst.args[0]] = i
+
+    def absorbed(reg):
+        return reg in sums and uses[reg] == 1 and local(reg) and \
+            type(instructions[user[reg]]) is adds_class
+
+    removed = set()
+    inserted = {}
+    count = 0
+    for res,root in sums.iteritems():
+        if absorbed(res):
+            continue
+        leaves = []
+        inner = [root]
+        stack = list(reversed(instructions[root].args[1:]))
+        while stack:
+            reg = stack.pop()
+            if absorbed(reg):
+                inner.append(sums[reg])
+                stack.extend(reversed(instructions[sums[reg]].args[1:]))
+            else:
+                leaves.append(reg)
+        # lists of registers must not be searched as == is overloaded
+        factors = [reg for reg in leaves \
+                       if reg in products and uses[reg] == 1 and local(reg)]
+        if len(factors) < 2:
+            continue
+        rest = [reg for reg in leaves if not (reg in products and \
+                                              uses[reg] == 1 and local(reg))]
+        for reg in factors:
+            removed.update((products[reg], products[reg] + 1))
+        factors = [instructions[products[reg]].args for reg in factors]
+        removed.update(inner)
+        new = []
+        if rest:
+            acc = block.new_reg('s')
+        else:
+            acc = res
+        new.append(e_startdotprod(len(factors), *sum(factors, []),
+                                  add_to_prog=False))
+        new.append(e_stopdotprod(acc, add_to_prog=False))
+        for j,reg in enumerate(rest):
+            if j == len(rest) - 1:
+                out = res
+            else:
+                out = block.new_reg('s')
+            new.append(adds_class(out, acc, reg, add_to_prog=False))
+            acc = out
+        for inst in new:
+            inst.caller = instructions[root].caller
+        inserted[root] = new
+        count += len(factors)
+    if count:
+        block.instructions = []
+        for i,inst in enumerate(instructions):
+            if i in inserted:
+                block.instructions += inserted[i]
+            elif i not in removed:
+                block.instructions.append(inst)
+    return count
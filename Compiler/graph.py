@@ -1,6 +1,8 @@
 # (C) 2016 University of Bristol. See License.txt
 
 import heapq
+from array import array
+from itertools import izip
 from Compiler.exceptions import *
 
 class GraphError(CompilerError):
@@ -107,11 +109,306 @@ class SparseDiGraph(object):
     def degree(self, i):
         return len(self.nodes[i]) - len(self.default_attributes)
 
+    def in_degree(self, i):
+        return len(self.pred[i])
+
+
+class _AdjacencyView(object):
+    """ Read-only view giving G.pred[i] for CompactDiGraph. """
+    __slots__ = ['graph']
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, i):
+        graph = self.graph
+        if not graph.in_degree_of[i]:
+            # no need to compact while building
+            return []
+        if graph.src:
+            graph._compact()
+        row = graph.pred_rows.get(i)
+        if row is not None:
+            return row
+        offsets = graph.pred_offsets
+        return graph.pred_targets[offsets[i]:offsets[i + 1]].tolist()
+
+    def __len__(self):
+        return self.graph.n
+
+
+class _EdgeWeights(object):
+    """ Mapping (i,j) -> weight for CompactDiGraph.
+
+    Only weights differing from the default of 1 are stored. """
+    __slots__ = ['graph', 'sparse']
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.sparse = {}
+
+    def __getitem__(self, edge):
+        return self.sparse.get(edge, 1)
+
+    def __setitem__(self, edge, weight):
+        if weight == 1:
+            self.sparse.pop(edge, None)
+        else:
+            self.sparse[edge] = weight
+
+    def __delitem__(self, edge):
+        self.sparse.pop(edge, None)
+
+    def __iter__(self):
+        G = self.graph
+        for i in xrange(G.n):
+            for j in G[i]:
+                yield i, j
+
+    def __len__(self):
+        return sum(self.graph.out_degree)
+
+
+class CompactDiGraph(object):
+    """ Directed graph for large, sparse dependency graphs.
+
+    Drop-in replacement for SparseDiGraph with a much smaller memory
+    footprint. While the graph is built, edges are appended to two
+    array('i') buffers. Duplicate edges are detected in O(1) as long as
+    edges arrive ordered by target node, which is the case when
+    building dependency graphs. On the first read of a non-empty
+    adjacency row, the buffers are compacted into CSR form (offsets plus
+    targets, for successors and predecessors). Use in_degree() and
+    degree() while building as they never compact. Later modifications
+    (merging nodes) only copy the affected rows into Python lists.
+
+    Integer and boolean node attributes are kept in typed columns, all
+    other attributes in sparse dictionaries. Edge weights default to 1
+    and only other values are stored.
+    """
+    def __init__(self, max_nodes, default_attributes=None):
+        """ max_nodes: maximum no of nodes
+        default_attributes: dict of node attributes and default values """
+        if default_attributes is None:
+            default_attributes = { 'merges': None, 'stop': -1, 'start': -1, 'is_source': True }
+        self.default_attributes = default_attributes
+        self.n = max_nodes
+        self.columns = {}
+        self.objects = {}
+        self.bools = set()
+        for attr,default in default_attributes.items():
+            if isinstance(default, bool):
+                self.columns[attr] = array('b', [default]) * self.n
+                self.bools.add(attr)
+            elif isinstance(default, (int, long)):
+                self.columns[attr] = array('i', [default]) * self.n
+            else:
+                self.columns[attr] = None
+            # values that don't fit the column type
+            self.objects[attr] = {}
+        self.out_degree = array('i', [0]) * self.n
+        self.in_degree_of = array('i', [0]) * self.n
+        # append-only edge buffers
+        self.src = array('i')
+        self.dst = array('i')
+        self.last_target = array('i', [-1]) * self.n
+        self.max_target = -1
+        # CSR form, created on demand
+        self.succ_offsets = None
+        self.succ_targets = None
+        self.pred_offsets = None
+        self.pred_targets = None
+        # rows changed after compaction
+        self.succ_rows = {}
+        self.pred_rows = {}
+        self.pred = _AdjacencyView(self)
+        self.weights = _EdgeWeights(self)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        """ Get list of the neighbours of node i """
+        if not self.out_degree[i]:
+            return []
+        if self.src:
+            self._compact()
+        row = self.succ_rows.get(i)
+        if row is not None:
+            return row
+        offsets = self.succ_offsets
+        return self.succ_targets[offsets[i]:offsets[i + 1]].tolist()
+
+    def __iter__(self):
+        pass
+
+    def __contains__(self, i):
+        return i >= 0 and i < self.n
+
+    def _compact(self):
+        """ Move buffered edges into CSR arrays, keeping insertion order.
+        The buffer is ordered by target, so the sources already form
+        the predecessor lists. """
+        src, dst = self.src, self.dst
+        self.pred_offsets = self._offsets(self.in_degree_of)
+        self.pred_targets = src
+        self.succ_offsets = offsets = self._offsets(self.out_degree)
+        fill = offsets[:-1]
+        targets = array('i', [0]) * len(src)
+        for k,v in izip(src, dst):
+            targets[fill[k]] = v
+            fill[k] += 1
+        self.succ_targets = targets
+        self.src = array('i')
+        self.dst = array('i')
+
+    def _offsets(self, degrees):
+        offsets = array('i', [0]) * (self.n + 1)
+        total = 0
+        for i,d in enumerate(degrees):
+            total += d
+            offsets[i + 1] = total
+        return offsets
+
+    def _row(self, i, reverse):
+        if self.src:
+            self._compact()
+        if reverse:
+            rows, offsets, targets = \
+                self.pred_rows, self.pred_offsets, self.pred_targets
+        else:
+            rows, offsets, targets = \
+                self.succ_rows, self.succ_offsets, self.succ_targets
+        if i in rows:
+            return rows[i]
+        if offsets is None:
+            return []
+        return targets[offsets[i]:offsets[i + 1]].tolist()
+
+    def _mutable_row(self, i, reverse):
+        rows = self.pred_rows if reverse else self.succ_rows
+        row = rows.get(i)
+        if row is None:
+            row = rows[i] = self._row(i, reverse)
+        return row
+
+    def in_degree(self, i):
+        return self.in_degree_of[i]
+
+    def degree(self, i):
+        return self.out_degree[i]
+
+    def add_node(self, i, **attr):
+        if i >= self.n:
+            raise CompilerError('Cannot add node %d to graph of size %d' % (i, self.n))
+        for a,value in attr.items():
+            self.set_attr(i, a, value)
+
+    def set_attr(self, i, attr, value):
+        try:
+            column = self.columns[attr]
+        except KeyError:
+            raise CompilerError('Invalid attribute %s for graph node' % attr)
+        objects = self.objects[attr]
+        if column is not None and \
+                (value is True or value is False if attr in self.bools \
+                 else type(value) is int and -2**31 <= value < 2**31):
+            column[i] = value
+            if objects:
+                objects.pop(i, None)
+        elif value is self.default_attributes[attr]:
+            objects.pop(i, None)
+        else:
+            objects[i] = value
+
+    def get_attr(self, i, attr):
+        objects = self.objects[attr]
+        if objects and i in objects:
+            return objects[i]
+        column = self.columns[attr]
+        if column is None:
+            return self.default_attributes[attr]
+        elif attr in self.bools:
+            return column[i] == 1
+        else:
+            return column[i]
+
+    def remove_node(self, i):
+        """ Remove node i and all its edges """
+        weights = self.weights.sparse
+        for v in self[i]:
+            self._mutable_row(v, True).remove(i)
+            self.in_degree_of[v] -= 1
+            if weights:
+                weights.pop((i,v), None)
+        for v in self.pred[i]:
+            self._mutable_row(v, False).remove(i)
+            self.out_degree[v] -= 1
+            if weights:
+                weights.pop((v,i), None)
+        self.succ_rows[i] = []
+        self.pred_rows[i] = []
+        self.out_degree[i] = 0
+        self.in_degree_of[i] = 0
+        for attr,default in self.default_attributes.iteritems():
+            column = self.columns[attr]
+            if column is not None:
+                column[i] = default
+            self.objects[attr].pop(i, None)
+
+    def add_edge(self, i, j, weight=1):
+        if j >= self.max_target and self.succ_offsets is None:
+            # still building: O(1) duplicate check
+            last_target = self.last_target
+            if last_target[i] != j:
+                last_target[i] = j
+                self.max_target = j
+                self.src.append(i)
+                self.dst.append(j)
+                self.out_degree[i] += 1
+                self.in_degree_of[j] += 1
+            if weight != 1 or self.weights.sparse:
+                self.weights[(i,j)] = weight
+            return
+        if self.succ_offsets is None:
+            self._compact()
+        succ = self.succ_rows.get(i)
+        if succ is None:
+            succ = self._mutable_row(i, False)
+        if j not in succ:
+            succ.append(j)
+            pred = self.pred_rows.get(j)
+            if pred is None:
+                pred = self._mutable_row(j, True)
+            pred.append(i)
+            self.out_degree[i] += 1
+            self.in_degree_of[j] += 1
+        if weight != 1 or self.weights.sparse:
+            self.weights[(i,j)] = weight
+
+    def add_edges_from(self, tuples):
+        for edge in tuples:
+            if len(edge) == 3:
+                self.add_edge(edge[0], edge[1], edge[2])
+            else:
+                self.add_edge(edge[0], edge[1])
+
+    def remove_edge(self, i, j):
+        self._mutable_row(i, False).remove(j)
+        self._mutable_row(j, True).remove(i)
+        self.out_degree[i] -= 1
+        self.in_degree_of[j] -= 1
+        del self.weights[(i,j)]
+
+    def remove_edges_from(self, pairs):
+        for i,j in pairs:
+            self.remove_edge(i, j)
+
 
 def topological_sort(G, nbunch=None, pref=None):
-    seen={}
+    seen=bytearray(len(G))
     order_explored=[] # provide order and 
-    explored={}       # fast search without more general priorityDictionary
+    explored=bytearray(len(G)) # fast search without more general priorityDictionary
     
     if pref is None:
         def get_children(node):
@@ -132,20 +429,20 @@ def topological_sort(G, nbunch=None, pref=None):
     if nbunch is None:
         nbunch = range(len(G))
     for v in nbunch:     # process all vertices in G
-        if v in explored: 
+        if explored[v]:
             continue
         fringe=[v]   # nodes yet to look at
         while fringe:
             w=fringe[-1]  # depth first search
-            if w in explored: # already looked down this branch
+            if explored[w]: # already looked down this branch
                 fringe.pop()
                 continue
             seen[w]=1     # mark as seen
             # Check successors for cycles and for new nodes
             new_nodes=[]
             for n in get_children(w):
-                if n not in explored:
-                    if n in seen: #CYCLE !!
+                if not explored[n]:
+                    if seen[n]: #CYCLE !!
                         raise GraphError("Graph contains a cycle at %d (%s,%s)." % \
                                                         (n, G[n], G.pred[n]))
                     new_nodes.append(n)
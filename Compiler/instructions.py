@@ -1488,52 +1488,27 @@ class e_asm_open(base.CISC):
 @base.gf2n
 @base.vectorize
 class e_lessthan(base.CISC):
-    """ less than function . """
+    """ Signed comparison of n-bit shares mod 2^64. """
     __slots__ = []
     arg_format = ['s','s','int','sgw']
+    reusable = True
 
     def expand(self):
         step = self.args[2]
-        tmp = program.curr_block.new_reg('s')
-        bit_array_sub = [program.curr_block.new_reg('sg') for _ in range(step)]
-
-        # signed ver. (start)
-        prod_left = program.curr_block.new_reg('sg')
-        prod_right = program.curr_block.new_reg('sg')
-        prod = program.curr_block.new_reg('sg')
-        ans = program.curr_block.new_reg('sg')
-        bit_array_self = [program.curr_block.new_reg('sg') for _ in range(step)]
-        bit_array_other = [program.curr_block.new_reg('sg') for _ in range(step)]
-        # signed ver. (end)
-
-        subs(tmp, self.args[0], self.args[1])
-        e_bitdec(tmp, step, *bit_array_sub)
-
-        # signed ver. (start)
-        e_bitdec(self.args[0], step, *bit_array_self)
-        e_bitdec(self.args[1], step, *bit_array_other)
-        gadds(prod_left, bit_array_self[step - 1], bit_array_other[step - 1])
-        gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-        ge_startmult(prod_left, prod_right)
-        ge_stopmult(prod)
-        gadds(self.args[3], prod, bit_array_sub[step - 1])
-        # signed ver. (end)
-
-        # DEBUG (start)
-        """
-        c_bit_array = [cgf2n() for _ in range(step)]
-        for i in range(step):
-            print_char4("i=")
-            print_char4(str(i))
-            print_char('\n')
-            gstartopen(bit_array[i])
-            gstopopen(c_bit_array[i])
-            gprint_reg_plain(c_bit_array[i])
-            print_char('\n')
-        """
-        # DEBUG (end)
-        # result = bit_array_sub[step - 1].e_bit_inject()
+        msb_sub, msb_self, msb_other = \
+            [program.curr_block.new_reg('sg') for _ in range(3)]
 
+        # shared with equality tests of the same registers
+        tmp = cse.difference(self.args[0], self.args[1])
+        # only the top bits are needed
+        e_msb(tmp, step, msb_sub)
+        e_msb(self.args[0], step, msb_self)
+        e_msb(self.args[1], step, msb_other)
+        # the subtraction overflows if the signs differ and the sign of
+        # the result differs from the first one
+        prod = carry.and_(carry.xor(msb_self, msb_other),
+                          carry.xor(msb_sub, msb_self))
+        gadds(self.args[3], prod, msb_sub)
 
 
 @base.gf2n
@@ -1542,20 +1517,11 @@ class e_trunc(base.CISC):
     """ Truncate . """
     __slots__ = []
     arg_format = ['s','int','sw']
+    reusable = True
 
     def expand(self):
-        a = [program.curr_block.new_reg('sg') for _ in range(64)]
-        b = [program.curr_block.new_reg('sg') for _ in range(64)]
-
-        e_bitdec(self.args[0], 64, *a)
-        for i in range(64):
-            if i + self.args[1] >= 64 :
-                gldsi(b[i],0)
-            else :
-                b[i] = a[i + self.args[1]]
-
-        e_bitrec(self.args[2], 64, *b)
-       # return a
+        # see trunc.py for the variants
+        trunc.trunc(self.args[2], self.args[0], self.args[1], signed=False)
 
 
 @base.gf2n
@@ -1642,456 +1608,117 @@ class e_bitdec(base.CISC):
     __slots__ = []
     code = base.opcodes['E_BITDEC']
     arg_format = tools.chain(['s', 'int'], itertools.repeat('sgw'))
+    reusable = True
 
     def expand(self):
+        n = self.args[1]
+        if n == 1:
+            x = [program.curr_block.new_reg('sg') for i in range(4)]
+            e_skew_bit_dec(self.args[0], n, *x[:3])
+            gadds(x[3], x[0], x[1])
+            gadds(self.args[2], x[2], x[3])
+            return
+        z, c = self.shared_full_adders()
+        # see carry.py for the variants
+        carry.add_carries(self.args[2:], z, c)
+
+    def shared_full_adders(self, low=0):
+        """ Sum and carry bits from bit low on, shared with earlier
+        decompositions of the same register, see cse.py """
+        def compute(low):
+            if self.args[1] - low > 2 and base.get_global_vector_size() == 1:
+                return self.full_adders_vector(low)
+            else:
+                return self.full_adders(low)
+        return cse.full_adders(self.args[0], self.args[1], low, compute)
 
-        #decomposition : square_root(n) round ver. (start)
-        # skew_res = [program.curr_block.new_reg('sg') for i in range(3 * 64)]
-        # x1_xor_x2 = [program.curr_block.new_reg('sg') for i in range(64)]
-        # z = [program.curr_block.new_reg('sg') for i in range(64)]
-        # in_c_left = [program.curr_block.new_reg('sg') for i in range(64)]
-        # x1_xor_x3 = [program.curr_block.new_reg('sg') for i in range(64)]
-        # in_c_prod = [program.curr_block.new_reg('sg') for i in range(64)]
-        # c = [program.curr_block.new_reg('sg') for i in range(64 + 1)]
-        #
-        # c_xor_d = [[program.curr_block.new_reg('sg') for i in range(64)] for j in range(2)]
-        # in_d_left = [[program.curr_block.new_reg('sg') for i in range(64)] for j in range(2)]
-        # in_d_prod = [[program.curr_block.new_reg('sg') for i in range(64)] for j in range(2)]
-        # c_xor_z = [program.curr_block.new_reg('sg') for i in range(64)]
-        #
-        # first_4bit_d = [program.curr_block.new_reg('sg') for i in range(5)]
-        # d_4bit_block = [[program.curr_block.new_reg('sg') for i in range(5)] for j in range(2)]
-        # d_5bit_block = [[program.curr_block.new_reg('sg') for i in range(6)] for j in range(2)]
-        # d_6bit_block = [[program.curr_block.new_reg('sg') for i in range(7)] for j in range(2)]
-        # d_7bit_block = [[program.curr_block.new_reg('sg') for i in range(8)] for j in range(2)]
-        # d_8bit_block = [[program.curr_block.new_reg('sg') for i in range(9)] for j in range(2)]
-        # d_9bit_block = [[program.curr_block.new_reg('sg') for i in range(10)] for j in range(2)]
-        # d_10bit_block = [[program.curr_block.new_reg('sg') for i in range(11)] for j in range(2)]
-        # d_11bit_block = [[program.curr_block.new_reg('sg') for i in range(12)] for j in range(2)]
-        #
-        # in_mux_right_4 = [program.curr_block.new_reg('sg') for i in range(5)]
-        # in_mux_prod_4 = [program.curr_block.new_reg('sg') for i in range(5)]
-        # in_mux_right_5 = [program.curr_block.new_reg('sg') for i in range(6)]
-        # in_mux_prod_5 = [program.curr_block.new_reg('sg') for i in range(6)]
-        # in_mux_right_6 = [program.curr_block.new_reg('sg') for i in range(7)]
-        # in_mux_prod_6 = [program.curr_block.new_reg('sg') for i in range(7)]
-        # in_mux_right_7 = [program.curr_block.new_reg('sg') for i in range(8)]
-        # in_mux_prod_7 = [program.curr_block.new_reg('sg') for i in range(8)]
-        # in_mux_right_8 = [program.curr_block.new_reg('sg') for i in range(9)]
-        # in_mux_prod_8 = [program.curr_block.new_reg('sg') for i in range(9)]
-        # in_mux_right_9 = [program.curr_block.new_reg('sg') for i in range(10)]
-        # in_mux_prod_9 = [program.curr_block.new_reg('sg') for i in range(10)]
-        # in_mux_right_10 = [program.curr_block.new_reg('sg') for i in range(11)]
-        # in_mux_prod_10 = [program.curr_block.new_reg('sg') for i in range(11)]
-        # in_mux_right_11 = [program.curr_block.new_reg('sg') for i in range(12)]
-        # in_mux_prod_11 = [program.curr_block.new_reg('sg') for i in range(12)]
-        #
-        # e_skew_bit_dec(self.args[0], 64, *skew_res)
-        #
-        # gldsi(c[0], 0)
-        # gldsi(first_4bit_d[0], 0)
-        #
-        # gldsi(d_4bit_block[0][0], 0)
-        # gldsi(d_4bit_block[1][0], 1)
-        #
-        # gldsi(d_5bit_block[0][0], 0)
-        # gldsi(d_5bit_block[1][0], 1)
-        #
-        # gldsi(d_6bit_block[0][0], 0)
-        # gldsi(d_6bit_block[1][0], 1)
-        #
-        # gldsi(d_7bit_block[0][0], 0)
-        # gldsi(d_7bit_block[1][0], 1)
-        #
-        # gldsi(d_8bit_block[0][0], 0)
-        # gldsi(d_8bit_block[1][0], 1)
-        #
-        # gldsi(d_9bit_block[0][0], 0)
-        # gldsi(d_9bit_block[1][0], 1)
-        #
-        # gldsi(d_10bit_block[0][0], 0)
-        # gldsi(d_10bit_block[1][0], 1)
-        #
-        # gldsi(d_11bit_block[0][0], 0)
-        # gldsi(d_11bit_block[1][0], 1)
-        #
-        # # compute all [z] and [c]
-        # for j in range(64):
-        #     # compute [z]
-        #     gadds(x1_xor_x2[j], skew_res[3 * j], skew_res[3 * j + 1])
-        #     gadds(z[j], skew_res[3 * j + 2], x1_xor_x2[j])
-        #     # compute [c]
-        #     gaddsi(in_c_left[j], x1_xor_x2[j], 1)
-        #     gadds(x1_xor_x3[j], skew_res[3 * j], skew_res[3 * j + 2])
-        #     ge_startmult(in_c_left[j], x1_xor_x3[j])
-        #     ge_stopmult(in_c_prod[j])
-        #     gadds(c[j + 1], in_c_prod[j], skew_res[3 * j + 2])
-        #     # compute c_xor_z
-        #     gadds(c_xor_z[j], c[j], z[j])
-        #
-        # # compute for first 4 bit and next 4bit
-        # for j in range(4):
-        #     # for frist_4_bit_d
-        #     gadds(c_xor_d[0][j], c[j], first_4bit_d[j])
-        #     gaddsi(in_d_left[0][j], c_xor_d[0][j], 1)
-        #     ge_startmult(in_d_left[0][j], c_xor_z[j])
-        #     ge_stopmult(in_d_prod[0][j])
-        #     gadds(first_4bit_d[j + 1], in_d_prod[0][j], z[j])
-        #     # compute [x|j]
-        #     gadds(self.args[2 + j], c_xor_z[j], first_4bit_d[j])
-        #
-        #     for i in range(2):
-        #         # for other block
-        #         # first bit of 4bit_block = 4th bit
-        #         gadds(c_xor_d[i][4+j], c[4+j], d_4bit_block[i][j])
-        #         gaddsi(in_d_left[i][4+j], c_xor_d[i][4+j], 1)
-        #         ge_startmult(in_d_left[i][4+j], c_xor_z[4+j])
-        #         ge_stopmult(in_d_prod[i][4+j])
-        #         gadds(d_4bit_block[i][j+1], in_d_prod[i][4+j], z[4+j])
-        #
-        # # compute for next 5bit
-        # for j in range(5):
-        #     for i in range(2):
-        #         # first bit of 5bit_block = 8th bit
-        #         gadds(c_xor_d[i][8+j], c[8+j], d_5bit_block[i][j])
-        #         gaddsi(in_d_left[i][8+j], c_xor_d[i][8+j], 1)
-        #         ge_startmult(in_d_left[i][8+j], c_xor_z[8+j])
-        #         ge_stopmult(in_d_prod[i][8+j])
-        #         gadds(d_5bit_block[i][j+1], in_d_prod[i][8+j], z[8+j])
-        #
-        # # compute for next 6bit
-        # for j in range(6):
-        #     for i in range(2):
-        #         # first bit of 6bit_block = 13th bit
-        #         gadds(c_xor_d[i][13+j], c[13+j], d_6bit_block[i][j])
-        #         gaddsi(in_d_left[i][13+j], c_xor_d[i][13+j], 1)
-        #         ge_startmult(in_d_left[i][13+j], c_xor_z[13+j])
-        #         ge_stopmult(in_d_prod[i][13+j])
-        #         gadds(d_6bit_block[i][j+1], in_d_prod[i][13+j], z[13+j])
-        #
-        # # compute for next 7bit
-        # for j in range(7):
-        #     for i in range(2):
-        #         # first bit of 7bit_block = 19th bit
-        #         gadds(c_xor_d[i][19+j], c[19+j], d_7bit_block[i][j])
-        #         gaddsi(in_d_left[i][19+j], c_xor_d[i][19+j], 1)
-        #         ge_startmult(in_d_left[i][19+j], c_xor_z[19+j])
-        #         ge_stopmult(in_d_prod[i][19+j])
-        #         gadds(d_7bit_block[i][j+1], in_d_prod[i][19+j], z[19+j])
-        #
-        # # compute for next 8bit
-        # for j in range(8):
-        #     for i in range(2):
-        #         # first bit of 8bit_block = 26th bit
-        #         gadds(c_xor_d[i][26 + j], c[26 + j], d_8bit_block[i][j])
-        #         gaddsi(in_d_left[i][26 + j], c_xor_d[i][26 + j], 1)
-        #         ge_startmult(in_d_left[i][26 + j], c_xor_z[26 + j])
-        #         ge_stopmult(in_d_prod[i][26 + j])
-        #         gadds(d_8bit_block[i][j + 1], in_d_prod[i][26 + j], z[26 + j])
-        #
-        # # compute for next 9bit
-        # for j in range(9):
-        #     for i in range(2):
-        #         # first bit of 9bit_block = 34th bit
-        #         gadds(c_xor_d[i][34 + j], c[34 + j], d_9bit_block[i][j])
-        #         gaddsi(in_d_left[i][34 + j], c_xor_d[i][34 + j], 1)
-        #         ge_startmult(in_d_left[i][34 + j], c_xor_z[34 + j])
-        #         ge_stopmult(in_d_prod[i][34 + j])
-        #         gadds(d_9bit_block[i][j + 1], in_d_prod[i][34 + j], z[34 + j])
-        #
-        # # compute for next 10bit
-        # for j in range(10):
-        #     for i in range(2):
-        #         # first bit of 10bit_block = 43th bit
-        #         gadds(c_xor_d[i][43 + j], c[43 + j], d_10bit_block[i][j])
-        #         gaddsi(in_d_left[i][43 + j], c_xor_d[i][43 + j], 1)
-        #         ge_startmult(in_d_left[i][43 + j], c_xor_z[43 + j])
-        #         ge_stopmult(in_d_prod[i][43 + j])
-        #         gadds(d_10bit_block[i][j + 1], in_d_prod[i][43 + j], z[43 + j])
-        #
-        # # compute for next 11bit
-        # for j in range(11):
-        #     for i in range(2):
-        #         # first bit of 11bit_block = 53th bit
-        #         gadds(c_xor_d[i][53 + j], c[53 + j], d_11bit_block[i][j])
-        #         gaddsi(in_d_left[i][53 + j], c_xor_d[i][53 + j], 1)
-        #         ge_startmult(in_d_left[i][53 + j], c_xor_z[53 + j])
-        #         ge_stopmult(in_d_prod[i][53 + j])
-        #         gadds(d_11bit_block[i][j + 1], in_d_prod[i][53 + j], z[53 + j])
-        #
-        # # connect first 4bit and next 4bit block
-        # selected_d_4bit_block = [program.curr_block.new_reg('sg') for i in range(5)]
-        # for j in range(5):
-        #     # compute MUX
-        #     gadds(in_mux_right_4[j], d_4bit_block[0][j], d_4bit_block[1][j])
-        #     ge_startmult(in_mux_right_4[j], first_4bit_d[4])
-        #     ge_stopmult(in_mux_prod_4[j])
-        #     gadds(selected_d_4bit_block[j], in_mux_prod_4[j], d_4bit_block[0][j])
-        #     if j < 4:
-        #         # compute [x|j]
-        #         gadds(self.args[2 + (4 + j)], c_xor_z[4 + j], selected_d_4bit_block[j])
-        #
-        # # connect 4bit block and next 5bit block
-        # selected_d_5bit_block = [program.curr_block.new_reg('sg') for i in range(6)]
-        # for j in range(6):
-        #     # compute MUX
-        #     gadds(in_mux_right_5[j], d_5bit_block[0][j], d_5bit_block[1][j])
-        #     ge_startmult(in_mux_right_5[j], selected_d_4bit_block[4])
-        #     ge_stopmult(in_mux_prod_5[j])
-        #     gadds(selected_d_5bit_block[j], in_mux_prod_5[j], d_5bit_block[0][j])
-        #     if j < 5:
-        #         # compute [x|j]
-        #         gadds(self.args[2 + (8 + j)], c_xor_z[8 + j], selected_d_5bit_block[j])
-        #
-        # # connect 5bit block and next 6bit block
-        # selected_d_6bit_block = [program.curr_block.new_reg('sg') for i in range(7)]
-        # for j in range(7):
-        #     # compute MUX
-        #     gadds(in_mux_right_6[j], d_6bit_block[0][j], d_6bit_block[1][j])
-        #     ge_startmult(in_mux_right_6[j], selected_d_5bit_block[5])
-        #     ge_stopmult(in_mux_prod_6[j])
-        #     gadds(selected_d_6bit_block[j], in_mux_prod_6[j], d_6bit_block[0][j])
-        #     if j < 6:
-        #         # compute [x|j]
-        #         gadds(self.args[2 + (13 + j)], c_xor_z[13 + j], selected_d_6bit_block[j])
-        #
-        # # connect 6bit block and next 7bit block
-        # selected_d_7bit_block = [program.curr_block.new_reg('sg') for i in range(8)]
-        # for j in range(8):
-        #     # compute MUX
-        #     gadds(in_mux_right_7[j], d_7bit_block[0][j], d_7bit_block[1][j])
-        #     ge_startmult(in_mux_right_7[j], selected_d_6bit_block[6])
-        #     ge_stopmult(in_mux_prod_7[j])
-        #     gadds(selected_d_7bit_block[j], in_mux_prod_7[j], d_7bit_block[0][j])
-        #     if j < 7:
-        #         # compute [x|j]
-        #         gadds(self.args[2 + (19 + j)], c_xor_z[19 + j], selected_d_7bit_block[j])
-        #
-        # # connect 7bit block and next 8bit block
-        # selected_d_8bit_block = [program.curr_block.new_reg('sg') for i in range(9)]
-        # for j in range(9):
-        #     # compute MUX
-        #     gadds(in_mux_right_8[j], d_8bit_block[0][j], d_8bit_block[1][j])
-        #     ge_startmult(in_mux_right_8[j], selected_d_7bit_block[7])
-        #     ge_stopmult(in_mux_prod_8[j])
-        #     gadds(selected_d_8bit_block[j], in_mux_prod_8[j], d_8bit_block[0][j])
-        #     if j < 8:
-        #         # compute [x|j]
-        #         gadds(self.args[2 + (26 + j)], c_xor_z[26 + j], selected_d_8bit_block[j])
-        #
-        # # connect 8bit block and next 9bit block
-        # selected_d_9bit_block = [program.curr_block.new_reg('sg') for i in range(10)]
-        # for j in range(10):
-        #     # compute MUX
-        #     gadds(in_mux_right_9[j], d_9bit_block[0][j], d_9bit_block[1][j])
-        #     ge_startmult(in_mux_right_9[j], selected_d_8bit_block[8])
-        #     ge_stopmult(in_mux_prod_9[j])
-        #     gadds(selected_d_9bit_block[j], in_mux_prod_9[j], d_9bit_block[0][j])
-        #     if j < 9:
-        #         # compute [x|j]
-        #         gadds(self.args[2 + (34 + j)], c_xor_z[34 + j], selected_d_9bit_block[j])
-        #
-        # # connect 9bit block and next 10bit block
-        # selected_d_10bit_block = [program.curr_block.new_reg('sg') for i in range(11)]
-        # for j in range(11):
-        #     # compute MUX
-        #     gadds(in_mux_right_10[j], d_10bit_block[0][j], d_10bit_block[1][j])
-        #     ge_startmult(in_mux_right_10[j], selected_d_9bit_block[9])
-        #     ge_stopmult(in_mux_prod_10[j])
-        #     gadds(selected_d_10bit_block[j], in_mux_prod_10[j], d_10bit_block[0][j])
-        #     if j < 10:
-        #         # compute [x|j]
-        #         gadds(self.args[2 + (43 + j)], c_xor_z[43 + j], selected_d_10bit_block[j])
-        #
-        # # connect 10bit block and next 11bit block
-        # selected_d_11bit_block = [program.curr_block.new_reg('sg') for i in range(12)]
-        # for j in range(11):
-        #     # compute MUX
-        #     gadds(in_mux_right_11[j], d_11bit_block[0][j], d_11bit_block[1][j])
-        #     ge_startmult(in_mux_right_11[j], selected_d_10bit_block[10])
-        #     ge_stopmult(in_mux_prod_11[j])
-        #     gadds(selected_d_11bit_block[j], in_mux_prod_11[j], d_11bit_block[0][j])
-        #     # compute [x|j]
-        #     gadds(self.args[2 + (53 + j)], c_xor_z[53 + j], selected_d_11bit_block[j])
-        #decomposition : square_root(n) round ver. (end)
-
-        #decomposition : log(n) round ver. (start)
-        # log_val = int(math.ceil(math.log(self.args[1], 2)))
-        #
-        # skew_res = [program.curr_block.new_reg('sg') for i in range(3 * self.args[1])]
-        # x1_xor_x2 = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        # z = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        # in_c_left = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        # x1_xor_x3 = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        # in_c_prod = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        # c = [program.curr_block.new_reg('sg') for i in range(self.args[1] + 1)]
-        # c_xor_z = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        #
-        # c_xor_d = [[[program.curr_block.new_reg('sg') for i in range(self.args[1])] for j in range(2)] for k in range(log_val)]
-        # in_d_left = [[[program.curr_block.new_reg('sg') for i in range(self.args[1])] for j in range(2)] for k in range(log_val)]
-        # in_d_prod = [[[program.curr_block.new_reg('sg') for i in range(self.args[1])] for j in range(2)] for k in range(log_val)]
-        # d = [[[program.curr_block.new_reg('sg') for i in range(self.args[1] + 1)] for j in range(2)] for k in range(log_val)]
-        #
-        # in_mux_right = [[[program.curr_block.new_reg('sg') for i in range(self.args[1] + 1)] for j in range(2)] for k in range(log_val)]
-        # in_mux_prod = [[[program.curr_block.new_reg('sg') for i in range(self.args[1] + 1)] for j in range(2)] for k in range(log_val)]
-        #
-        # gldsi(c[0],0)
-        # gldsi(d[log_val - 1][0][0], 0)
-        #
-        # e_skew_bit_dec(self.args[0], self.args[1], *skew_res)
-        #
-        # # compute all [z] and [c]
-        # for j in range(self.args[1]):
-        #     # compute [z]
-        #     gadds(x1_xor_x2[j], skew_res[3 * j], skew_res[3 * j + 1])
-        #     gadds(z[j], skew_res[3 * j + 2], x1_xor_x2[j])
-        #     # compute [c]
-        #     gaddsi(in_c_left[j], x1_xor_x2[j], 1)
-        #     gadds(x1_xor_x3[j], skew_res[3 * j], skew_res[3 * j + 2])
-        #     ge_startmult(in_c_left[j], x1_xor_x3[j])
-        #     ge_stopmult(in_c_prod[j])
-        #     gadds(c[j + 1], in_c_prod[j], skew_res[3 * j + 2])
-        #     # compute c_xor_z
-        #     gadds(c_xor_z[j], c[j], z[j])
-        #
-        # # compute all [d] -- assume that self.args[1] >= 8
-        # for k in range(log_val - 1):
-        #     valid_carry_idx = 2 ** (k + 1)
-        #     # print("valid_carry_idx = {0}".format(valid_carry_idx))
-        #     if k == 0:
-        #         # compute candidate of [d]
-        #         for j in range(2):
-        #             for i in range(self.args[1]):
-        #                 if (j == 0) and (i == 0):
-        #                     gadds(c_xor_d[k][0][i], c[i], d[log_val - 1][0][i])
-        #                     gaddsi(in_d_left[k][0][i], c_xor_d[k][0][i], 1)
-        #                     ge_startmult(in_d_left[k][0][i], c_xor_z[i])
-        #                     ge_stopmult(in_d_prod[k][0][i])
-        #                     gadds(d[log_val - 1][0][i+1], in_d_prod[k][0][i], z[i])
-        #                 elif (j == 0) and (i == 1):
-        #                     gadds(c_xor_d[k][0][i], c[i], d[log_val - 1][0][i])
-        #                     gaddsi(in_d_left[k][0][i], c_xor_d[k][0][i], 1)
-        #                     ge_startmult(in_d_left[k][0][i], c_xor_z[i])
-        #                     ge_stopmult(in_d_prod[k][0][i])
-        #                     gadds(d[log_val - 1][0][i+1], in_d_prod[k][0][i], z[i])
-        #                 elif (i >= 2) and (i % 2 == 0):
-        #                     gaddsi(c_xor_d[k][j][i], c[i], j)
-        #                     gaddsi(in_d_left[k][j][i], c_xor_d[k][j][i], 1)
-        #                     ge_startmult(in_d_left[k][j][i], c_xor_z[i])
-        #                     ge_stopmult(in_d_prod[k][j][i])
-        #                     gadds(d[k][j][i+1], in_d_prod[k][j][i], z[i])
-        #
-        #                 elif (i >= 2) and (i % 2 == 1):
-        #                     gadds(c_xor_d[k][j][i], c[i], d[k][j][i])
-        #                     gaddsi(in_d_left[k][j][i], c_xor_d[k][j][i], 1)
-        #                     ge_startmult(in_d_left[k][j][i], c_xor_z[i])
-        #                     ge_stopmult(in_d_prod[k][j][i])
-        #                     gadds(d[k][j][i+1], in_d_prod[k][j][i], z[i])
-        #
-        #         # select and connect blocks of [d]
-        #         for j in range(2):
-        #             for i in range(1, self.args[1]):
-        #                 if (j == 0) and (i == valid_carry_idx):
-        #                     for connect_idx in range(valid_carry_idx, 2 * valid_carry_idx):
-        #                         # compute MUX
-        #                         gadds(in_mux_right[k][j][connect_idx + 1], d[k][0][connect_idx + 1], d[k][1][connect_idx + 1])
-        #                         ge_startmult(in_mux_right[k][j][connect_idx + 1], d[log_val - 1][0][i])
-        #                         ge_stopmult(in_mux_prod[k][j][connect_idx + 1])
-        #                         gadds(d[log_val - 1][0][connect_idx + 1], in_mux_prod[k][j][connect_idx + 1], d[k][0][connect_idx + 1])
-        #                 elif (i >= 2 * valid_carry_idx) and (i % (2 * valid_carry_idx) == valid_carry_idx -1):
-        #                     d[k + 1][j][i] = d[k][j][i]
-        #                 elif (i >= 2 * valid_carry_idx) and (i % (2 * valid_carry_idx) == valid_carry_idx):
-        #                     for connect_idx in range(i, i + valid_carry_idx):
-        #                         # compute MUX
-        #                         gadds(in_mux_right[k][j][connect_idx + 1], d[k][0][connect_idx + 1], d[k][1][connect_idx + 1])
-        #                         ge_startmult(in_mux_right[k][j][connect_idx + 1], d[k][j][i])
-        #                         ge_stopmult(in_mux_prod[k][j][connect_idx + 1])
-        #                         gadds(d[k + 1][j][connect_idx + 1], in_mux_prod[k][j][connect_idx + 1], d[k][0][connect_idx + 1])
-        #                         if connect_idx == i:
-        #                             d[k+1][j][i] = d[k][j][i]
-        #     else:
-        #         # select and connect blocks of [d]
-        #         for j in range(2):
-        #             count = 1
-        #             for i in range(1, self.args[1]):
-        #                 finished_block = 2 * count
-        #                 if (j == 0) and (i == valid_carry_idx):
-        #                     for connect_idx in range(valid_carry_idx, 2 * valid_carry_idx):
-        #                         # compute MUX
-        #                         gadds(in_mux_right[k][j][connect_idx + 1], d[k][0][connect_idx + 1], d[k][1][connect_idx + 1])
-        #                         ge_startmult(in_mux_right[k][j][connect_idx + 1], d[log_val - 1][0][i])
-        #                         ge_stopmult(in_mux_prod[k][j][connect_idx + 1])
-        #                         gadds(d[log_val - 1][0][connect_idx + 1], in_mux_prod[k][j][connect_idx + 1], d[k][0][connect_idx + 1])
-        #                 elif (i >= finished_block * valid_carry_idx) and (i % (2 * valid_carry_idx) > 0) and (i % (2 * valid_carry_idx) <= valid_carry_idx - 1) and (k <= (log_val - 2)):
-        #                     d[k + 1][j][i] = d[k][j][i]
-        #                 elif (i >= finished_block * valid_carry_idx) and (i % (2 * valid_carry_idx) >= valid_carry_idx) and (k <= (log_val - 2)):
-        #                     for connect_idx in range(i, i + valid_carry_idx):
-        #                         # compute MUX
-        #                         gadds(in_mux_right[k][j][connect_idx + 1], d[k][0][connect_idx + 1], d[k][1][connect_idx + 1])
-        #                         ge_startmult(in_mux_right[k][j][connect_idx + 1], d[k][j][i])
-        #                         ge_stopmult(in_mux_prod[k][j][connect_idx + 1])
-        #                         gadds(d[k + 1][j][connect_idx + 1], in_mux_prod[k][j][connect_idx + 1], d[k][0][connect_idx + 1])
-        #                         if connect_idx == i:
-        #                             d[k + 1][j][i] = d[k][j][i]
-        #                         if connect_idx == i + valid_carry_idx - 1:
-        #                             count += 1
-        # # compute [x|j]
-        # for i in range(self.args[1]):
-        #     gadds(self.args[2 + i], c_xor_z[i], d[log_val - 1][0][i])
-        # decomposition : log(n) round ver. (end)
-
-        # decomposition : n-1 round ver. (start)
-        skew_res = [program.curr_block.new_reg('sg') for i in range(3 * self.args[1])]
-        x1_xor_x2 = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        z = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        in_c_left = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        x1_xor_x3 = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        in_c_prod = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        c = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        c_xor_d = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        in_d_left = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        in_d_prod = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        c_xor_z = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-        d = [program.curr_block.new_reg('sg') for i in range(self.args[1])]
-
-
-        e_skew_bit_dec(self.args[0], self.args[1], *skew_res)
-        gldsi(c[0], 0)
-        gldsi(d[0], 0)
+    def full_adders(self, low=0):
+        """ Sum and carry bits of the skew decomposition from bit low
+        on. There is no carry from the top bit. """
+        n = self.args[1]
+        new_reg = program.curr_block.new_reg
+        skew_res = [new_reg('sg') for i in range(3 * n)]
+        e_skew_bit_dec(self.args[0], n, *skew_res)
+        z = []
+        c = []
+        for j in range(low, n):
+            x1, x2, x3 = skew_res[3 * j:3 * j + 3]
+            x1_xor_x2 = carry.xor(x1, x2)
+            z.append(carry.xor(x3, x1_xor_x2))
+            if j < n - 1:
+                in_c_prod = carry.and_(carry.xor_one(x1_xor_x2),
+                                       carry.xor(x1, x3))
+                c.append(carry.xor(in_c_prod, x3))
+        return z, c
+
+    def full_adders_vector(self, low=0):
+        """ Same as full_adders() but with one vector instruction per
+        step for all bits. The skew decomposition writes straight into
+        the vector elements. """
+        n = self.args[1]
+        size = n - 1 - low
+        new_reg = program.curr_block.new_reg
+        x1, x2, x3, x1_xor_x2, z, in_c_left, x1_xor_x3, in_c_prod, c = \
+            [new_reg('sg', size=size) for i in range(9)]
+        top = [new_reg('sg') for i in range(5)]
+        skew_res = [new_reg('sg') for i in range(3 * low)]
+        for j in range(size):
+            skew_res += [x1[j], x2[j], x3[j]]
+        e_skew_bit_dec(self.args[0], n, *(skew_res + top[:3]))
+
+        vgadds(size, x1_xor_x2, x1, x2)
+        vgadds(size, z, x3, x1_xor_x2)
+        vgaddsi(size, in_c_left, x1_xor_x2, 1)
+        vgadds(size, x1_xor_x3, x1, x3)
+        vge_startmult(size, in_c_left, x1_xor_x3)
+        vge_stopmult(size, in_c_prod)
+        vgadds(size, c, in_c_prod, x3)
+        gadds(top[3], top[0], top[1])
+        gadds(top[4], top[2], top[3])
+        return [z[j] for j in range(size)] + [top[4]], \
+            [c[j] for j in range(size)]
+
+
+@base.vectorize
+class e_bitdec_high(e_bitdec_class):
+    r""" Convert bits m to n-1 of a share mod 2^n to an array of shares
+    mod 2 without the carry from the lower bits, so the result may be
+    one too low. """
+    __slots__ = []
+    code = None
+    arg_format = tools.chain(['s', 'int', 'int'], itertools.repeat('sgw'))
 
-        for j in range(self.args[1]):
-            if self.args[1] == 1:
-                gadds(x1_xor_x2[j], skew_res[3 * j], skew_res[3 * j + 1])
-                gadds(self.args[2 + j], skew_res[3 * j + 2], x1_xor_x2[j])
-            else:
-                if j == self.args[1] - 1:
-                    # compute [z]
-                    gadds(x1_xor_x2[j], skew_res[3 * j], skew_res[3 * j + 1])
-                    gadds(z[j], skew_res[3 * j + 2], x1_xor_x2[j])
-                    # compute c_xor_d[j]
-                    gadds(c_xor_d[j], c[j], d[j])
-                    # compute [x|j]
-                    gadds(self.args[2 + j], z[j], c_xor_d[j])
-                else:
-                    # compute [z]
-                    gadds(x1_xor_x2[j], skew_res[3 * j], skew_res[3 * j + 1])
-                    gadds(z[j], skew_res[3 * j + 2], x1_xor_x2[j])
-                    # compute [c]
-                    gaddsi(in_c_left[j], x1_xor_x2[j], 1)
-                    gadds(x1_xor_x3[j], skew_res[3 * j], skew_res[3 * j + 2])
-                    ge_startmult(in_c_left[j], x1_xor_x3[j])
-                    ge_stopmult(in_c_prod[j])
-                    gadds(c[j+1], in_c_prod[j], skew_res[3 * j + 2])
-                    # compute [d]
-                    gadds(c_xor_d[j], c[j], d[j])
-                    gaddsi(in_d_left[j], c_xor_d[j], 1)
-                    gadds(c_xor_z[j], c[j], z[j])
-                    ge_startmult(in_d_left[j], c_xor_z[j])
-                    ge_stopmult(in_d_prod[j])
-                    gadds(d[j + 1], in_d_prod[j], z[j])
-                    # compute [x|j]
-                    gadds(self.args[2 + j], z[j], c_xor_d[j])
-        # decomposition : n-1 round ver. (end)
+    def expand(self):
+        n, m = self.args[1:3]
+        # start one bit lower to include the full adder carry into bit m
+        z, c = self.shared_full_adders(m - 1)
+        carry.add_carries([carry.new_bit()] + list(self.args[3:]), z, c)
+
+
+@base.vectorize
+class e_msb(e_bitdec_class):
+    r""" Convert the top bit of the n lower bits of a share mod 2^64 to a
+    share mod 2. """
+    __slots__ = []
+    code = None
+    arg_format = ['s', 'int', 'sgw']
+
+    def expand(self):
+        z, c = self.shared_full_adders()
+        carry.msb(self.args[2], z, c)
+
+
+@base.vectorize
+class e_eqz(e_bitdec_class):
+    r""" Test the n lower bits of a share mod 2^64 for zero, resulting in
+    a share mod 2. """
+    __slots__ = []
+    code = None
+    arg_format = ['s', 'int', 'sgw']
+
+    def expand(self):
+        z, c = self.shared_full_adders()
+        carry.is_zero(self.args[2], z, c)
 
 
 #@base.gf2n
@@ -2101,6 +1728,7 @@ class e_bitinj(base.CISC):
     __slots__ = []
     code = base.opcodes['E_BITINJ']
     arg_format = ['sg', 'sw']
+    reusable = True
     def expand(self):
 
         x1 = program.curr_block.new_reg('s')
@@ -2249,52 +1877,55 @@ class e_bitinj(base.CISC):
         """
 
 
+@base.vectorize
+class e_bitinj_mul(base.CISC):
+    r""" Multiply a share mod 2^n by a share mod 2 converted to mod 2^n,
+    in the same two rounds as the conversion alone. """
+    __slots__ = []
+    code = None
+    arg_format = ['sg', 's', 'sw']
+    reusable = True
+
+    def expand(self):
+        new_reg = program.curr_block.new_reg
+        x1, x2, x3, prod12, x3_y, sum12, twice_prod12, x1_xor_x2, \
+            twice_x3_y, right, prod = [new_reg('s') for i in range(11)]
+        y = self.args[1]
+
+        e_skew_bit_inj(self.args[0], x1, x2, x3)
+
+        # with u = x1 + x2 - 2 * x1 * x2, the bit is u + x3 - 2 * u * x3,
+        # so its product with y is x3 * y + u * (y - 2 * x3 * y)
+        e_startmult(x1, x2, x3, y)
+        e_stopmult(prod12, x3_y)
+        adds(sum12, x1, x2)
+        mulsi(twice_prod12, prod12, 2)
+        subs(x1_xor_x2, sum12, twice_prod12)
+        mulsi(twice_x3_y, x3_y, 2)
+        subs(right, y, twice_x3_y)
+        e_startmult(x1_xor_x2, right)
+        e_stopmult(prod)
+        adds(self.args[2], x3_y, prod)
+
+
 @base.vectorize
 class e_bitrec(base.CISC):
     r""" Convert an n-array of shares mod 2 to a share mod 2^n. """
     __slots__ = []
     code = base.opcodes['E_BITREC']
     arg_format = tools.chain(['sw', 'int'], itertools.repeat('sg'))
+    reusable = True
 
     def expand(self):
         # self.args[1] is the number of array's elements
         # assume that 0 < self.args[1] <= ring_size
+        # the skew ring composition of the runtime only handles single
+        # registers, so vectors are always injected
+        if carry.rec_variant != 'ripple' or self.get_size() > 1:
+            carry.inject(self.args[0], self.args[2:2 + self.args[1]])
+            return
 
-        # re-composition using bit-injection (start)
-        # injected_a = [program.curr_block.new_reg('s') for i in range(self.args[1])]
-        # two_power_a = [program.curr_block.new_reg('s') for i in range(self.args[1])]
-        # res = [program.curr_block.new_reg('s') for i in range(self.args[1])]
-        #
-        # if self.args[1] > 1:
-        #     for i in range(self.args[1]):
-        #         e_bitinj(self.args[2+i], injected_a[i])
-        #         if i == 0:
-        #             two_power_a[i] = injected_a[i]
-        #         elif i == 1:
-        #             mulsi(two_power_a[i], injected_a[i], 2)
-        #         else:
-        #             tmp_two_power_a = [program.curr_block.new_reg('s') for z in range(i+1)]
-        #             for j in range(i+1):
-        #                 if j == 0:
-        #                     tmp_two_power_a[j] = injected_a[i]
-        #                 elif j == i:
-        #                     mulsi(two_power_a[i], tmp_two_power_a[j - 1], 2)
-        #                 else:
-        #                     mulsi(tmp_two_power_a[j], tmp_two_power_a[j - 1], 2)
-        #
-        #     res[0] = two_power_a[0]
-        #     for i in range(1, self.args[1]):
-        #         if i == self.args[1] - 1:
-        #             adds(self.args[0], two_power_a[i], res[i - 1])
-        #         elif i == 1:
-        #             adds(res[i], two_power_a[i], two_power_a[i - 1])
-        #         else:
-        #             adds(res[i], two_power_a[i], res[i - 1])
-        # else:
-        #     e_bitinj(self.args[2], self.args[0])
-        # re-composition using bit-injection (end)
-
-        # re-composition: n-1 round ver. (end)
+        # re-composition: n-1 round ver. (start)
         ring_size = 64
 
         bit_s = [program.curr_block.new_reg('sg') for i in range(ring_size)]
@@ -2396,6 +2027,22 @@ class e_bitrec(base.CISC):
         # re-composition: n-1 round ver. (end)
 
 
+@base.vectorize
+class e_sbitrec(base.CISC):
+    r""" Convert an n-array of shares mod 2 representing a number in
+    two's complement to a share mod 2^64. """
+    __slots__ = []
+    arg_format = tools.chain(['sw', 'int'], itertools.repeat('sg'))
+    reusable = True
+
+    def expand(self):
+        bits = list(self.args[2:2 + self.args[1]])
+        if carry.rec_variant == 'ripple':
+            e_bitrec(self.args[0], 64, *(bits + [bits[-1]] * (64 - len(bits))))
+        else:
+            carry.inject(self.args[0], bits, signed=True)
+
+
 
 #@base.gf2n
 @base.vectorize
@@ -2477,6 +2124,28 @@ class e_stopmult(stopopen_class):
     code = base.opcodes['E_STOPMULT']
     arg_format = itertools.repeat('sw')
 
+class e_startdotprod(startopen_class):
+    """ Start the dot products of groups of secret registers. Every group
+    is a length $n$ followed by $n$ pairs of factors. """
+    __slots__ = []
+    code = base.opcodes['E_STARTDOTPROD']
+
+    @property
+    def arg_format(self):
+        # merging appends groups, so the format follows the arguments
+        res = []
+        i = 0
+        while i < len(self.args):
+            res += ['int'] + ['s'] * (2 * self.args[i])
+            i += 2 * self.args[i] + 1
+        return res
+
+class e_stopdotprod(stopopen_class):
+    """ Store the dot products in $s_i$, one for every group. """
+    __slots__ = []
+    code = base.opcodes['E_STOPDOTPROD']
+    arg_format = itertools.repeat('sw')
+
 @base.gf2n
 @base.vectorize
 class muls(base.CISC):
@@ -2605,4 +2274,4 @@ class g2muls(base.CISC):
 #        addm(self.args[0], s[8], c[2])
 
 # hack for circular dependency
-from Compiler import comparison
+from Compiler import comparison, carry, trunc, cse
@@ -9,6 +9,7 @@ import functools
 from Compiler.exceptions import *
 from Compiler.config import *
 from Compiler import util
+from Compiler import tools
 
 
 ###
@@ -84,6 +85,8 @@ opcodes = dict(
     E_STOPMULT = 0x41,
     E_MULTI_STARTMULT = 0x42,
     E_MULTI_STOPMULT = 0x43,
+    E_STARTDOTPROD = 0x44,
+    E_STOPDOTPROD = 0x45,
     GMULBITC = 0x136,
     GMULBITM = 0x137,
     # Open
@@ -284,6 +287,7 @@ def vectorize(instruction, global_dict=None):
     Vectorized_Instruction.__name__ = vectorized_name
     global_dict[vectorized_name] = Vectorized_Instruction
     global_dict[instruction.__name__ + '_class'] = instruction
+    set_arg_indices(instruction)
     return maybe_vectorized_instruction
 
 
@@ -340,6 +344,8 @@ def gf2n(instruction):
             reset_global_instruction_type()
 
     GF2N_Instruction.__name__ = 'g' + instruction_cls.__name__
+    set_arg_indices(instruction_cls)
+    set_arg_indices(GF2N_Instruction)
     if vectorized:
         vec_GF2N = vectorize(GF2N_Instruction, global_dict)
 
@@ -495,6 +501,42 @@ def format_str_is_reg(format_str):
 def format_str_is_writeable(format_str):
     return format_str_is_reg(format_str) and format_str[-1] == 'w'
 
+def arg_indices(arg_format):
+    """ Indices of the read and written register arguments of a format.
+
+    Returns (arg_format, read, written, n_fixed, read_rest, write_rest)
+    where the last two say whether the arguments after the first n_fixed
+    of a variable-length format are read or written registers, or None
+    if the format is not a list, repeat or chain ending in a repeat or
+    contains unknown formats. """
+    if isinstance(arg_format, (list, tuple)):
+        fixed, rest = arg_format, None
+    elif isinstance(arg_format, itertools.repeat):
+        fixed, rest = [], next(arg_format)
+    elif isinstance(arg_format, tools.chain) and \
+            isinstance(arg_format.args[-1], itertools.repeat):
+        fixed = list(itertools.chain(*arg_format.args[:-1]))
+        rest = next(arg_format.args[-1])
+    else:
+        return None
+    if not all(f in ArgFormats for f in itertools.chain(fixed, [rest or 'int'])):
+        # some decorated classes are never used
+        return None
+    read = tuple(i for i,f in enumerate(fixed) \
+                     if format_str_is_reg(f) and not format_str_is_writeable(f))
+    written = tuple(i for i,f in enumerate(fixed) \
+                        if format_str_is_writeable(f))
+    read_rest = rest is not None and format_str_is_reg(rest) and \
+        not format_str_is_writeable(rest)
+    write_rest = rest is not None and format_str_is_writeable(rest)
+    return arg_format, read, written, len(fixed), read_rest, write_rest
+
+def set_arg_indices(instruction):
+    """ Store the argument indices of an instruction class. """
+    arg_format = instruction.__dict__.get('arg_format')
+    if arg_format is not None:
+        instruction.arg_indices = arg_indices(arg_format)
+
 
 class Instruction(object):
     """
@@ -503,6 +545,8 @@ class Instruction(object):
     """
     __slots__ = ['args', 'arg_format', 'code', 'caller']
     count = 0
+    # see arg_indices(), set per class on first use if not by decorators
+    arg_indices = None
 
     def __init__(self, *args, **kwargs):
         """ Create an instruction and append it to the program list. """
@@ -557,15 +601,40 @@ class Instruction(object):
             except KeyError as e:
                 raise CompilerError('Incorrect number of arguments for instruction %s' % (self))
     
+    def get_arg_indices(self):
+        indices = self.arg_indices
+        if indices is None or indices[0] is not self.arg_format:
+            indices = arg_indices(self.arg_format)
+            if indices is not None and \
+                    self.arg_format is getattr(type(self), 'arg_format'):
+                type(self).arg_indices = indices
+        return indices
+
     def get_used(self):
         """ Return the set of registers that are read in this instruction. """
-        return set(arg for arg,w in zip(self.args, self.arg_format) if \
-            format_str_is_reg(w) and not format_str_is_writeable(w))
+        indices = self.get_arg_indices()
+        if indices is None:
+            return set(arg for arg,w in zip(self.args, self.arg_format) if \
+                format_str_is_reg(w) and not format_str_is_writeable(w))
+        args = self.args
+        n_args = len(args)
+        res = set(args[i] for i in indices[1] if i < n_args)
+        if indices[4]:
+            res.update(args[indices[3]:])
+        return res
     
     def get_def(self):
         """ Return the set of registers that are written to in this instruction. """
-        return set(arg for arg,w in zip(self.args, self.arg_format) if \
-            format_str_is_writeable(w))
+        indices = self.get_arg_indices()
+        if indices is None:
+            return set(arg for arg,w in zip(self.args, self.arg_format) if \
+                format_str_is_writeable(w))
+        args = self.args
+        n_args = len(args)
+        res = set(args[i] for i in indices[2] if i < n_args)
+        if indices[5]:
+            res.update(args[indices[3]:])
+        return res
     
     def get_pre_arg(self):
         return ""
@@ -793,6 +862,8 @@ class CISC(Instruction):
     """
     __slots__ = []
     code = None
+    # whether the results can be reused for the same inputs, see cse.py
+    reusable = False
 
     def __init__(self, *args):
         self.args = args
@@ -800,7 +871,11 @@ class CISC(Instruction):
         #if EMULATE:
         #    self.expand()
         if not program.FIRST_PASS:
-            self.expand()
+            if self.reusable:
+                from Compiler import cse
+                cse.expand(self)
+            else:
+                self.expand()
     
     def expand(self):
         """ Expand this into a sequence of RISC instructions. """
@@ -3,7 +3,7 @@
 from Compiler.types import cint,sint,cfix,sfix,sfloat,MPCThread,Array,MemValue,cgf2n,sgf2n,_number,_mem,_register,regint,Matrix,_types, cfloat
 from Compiler.instructions import *
 from Compiler.util import tuplify,untuplify
-from Compiler import instructions,instructions_base,comparison,program
+from Compiler import instructions,instructions_base,comparison,program,util
 import inspect,math
 import random
 import collections
@@ -797,12 +797,71 @@ def mergesort(A):
         width.imul(2)
         return width < len(A)
 
+def demux_bits(bits, length=None):
+    """ One-hot sgf2n vector of the index given by bits, least
+    significant first, optionally cut to length. The halves are demuxed
+    recursively and combined with one vector multiplication, which
+    takes log(len(bits)) rounds in total. """
+    if len(bits) == 1:
+        res = sgf2n(size=2)
+        gaddsi(res[0], bits[0], 1)
+        gmovs(res[1], bits[0])
+        return res
+    low = demux_bits(bits[:len(bits) / 2])
+    high = demux_bits(bits[len(bits) / 2:])
+    size = min(length or 2**len(bits), len(low) * len(high))
+    left = sgf2n(size=size)
+    right = sgf2n(size=size)
+    for i in range(size):
+        gmovs(left[i], low[i % len(low)])
+        gmovs(right[i], high[i / len(low)])
+    res = sgf2n(size=size)
+    vge_startmult(size, left, right)
+    vge_stopmult(size, res)
+    return res
+
+def one_hot(index, length):
+    """ One-hot sgf2n vector of a secret index in [0, length). """
+    n_bits = util.log2(length)
+    bits = [sgf2n() for i in range(n_bits)]
+    e_bitdec(sint.conv(index), n_bits, *bits)
+    return demux_bits(bits, length)
+
+def oblivious_get(values, index):
+    """ Element of a list or vector of sint at a secret index in
+    [0, len(values)). The index bits are demuxed to a one-hot vector,
+    which is converted and multiplied with the values in two rounds. All
+    steps are vectorized. """
+    n = len(values)
+    if n == 1:
+        return values[0]
+    if isinstance(values, sint):
+        vector = values
+    else:
+        vector = sint(size=n)
+        for i,value in enumerate(values):
+            movs(vector[i], sint.conv(value))
+    prods = sint(size=n)
+    ve_bitinj_mul(n, one_hot(index, n), vector, prods)
+    res = prods[0]
+    for i in range(1, n):
+        total = sint()
+        adds(total, res, prods[i])
+        res = total
+    return res
+
 def range_loop(loop_body, start, stop=None, step=None):
     if stop is None:
         stop = start
         start = 0
     if step is None:
         step = 1
+    if isinstance(start, int) and isinstance(stop, int) and \
+            isinstance(step, int) and step != 0 and \
+            len(xrange(start, stop, step)) <= \
+            getattr(get_program().options, 'merge_blocks', 0):
+        unrolled_loop(loop_body, xrange(start, stop, step))
+        return
     def loop_fn(i):
         loop_body(i)
         return i + step
@@ -824,6 +883,15 @@ def range_loop(loop_body, start, stop=None, step=None):
             get_tape().req_node.children[-1].aggregator = \
                 lambda x: ((stop - start) / step) * x[0]
 
+def unrolled_loop(loop_body, indices):
+    """ Compile every iteration in a block of its own, which the
+    compiler later merges with the previous one if possible so that
+    independent communication rounds are combined. """
+    for i in indices:
+        get_tape().start_new_basicblock(name='unrolled-%d' % i,
+                                        merge_with_previous=True)
+        loop_body(i)
+
 def for_range(start, stop=None, step=None):
     def decorator(loop_body):
         range_loop(loop_body, start, stop, step)
@@ -1017,7 +1085,7 @@ def do_while(loop_fn):
     parent_node = get_tape().req_node
     # possibly unknown loop count
     get_tape().open_scope(lambda x: x[0].set_all(float('Inf')), \
-                              name='begin-loop')
+                              name='begin-loop', loop=True)
     loop_block = instructions.program.curr_block
     condition = loop_fn()
     if callable(condition):
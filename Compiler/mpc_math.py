@@ -0,0 +1,362 @@
+# (C) 2016 University of Bristol. See License.txt
+
+"""
+Fixed-point functions of sfix on shares mod 2^64, built on the bit
+decomposition and recomposition of the NEC ring protocols instead of
+the prime-field helpers in floatingpoint.py. Programs import the module
+with
+
+    import mpc_math
+
+All functions are vectorized: an sfix vector (for example from
+sfixArray.get_vector()) or an sfixArray is evaluated with the same
+number of rounds as a single value. An sfixArray argument returns a new
+sfixArray.
+
+The functions use two kinds of approximation:
+
+piecewise polynomial: the argument is split by its bits into an
+  integer part or exponent and a fraction in [0, 1), and the fraction is
+  evaluated with a polynomial fitted at Chebyshev nodes. The powers of
+  the fraction take ceil(log2(d)) rounds of multiplication and
+  truncation for degree d. The sum of the terms is truncated once. This
+  covers exp2_fx(), exp_fx(), log2_fx(), log_fx() and sigmoid().
+iterative: Goldschmidt or Newton iterations from a normalised first
+  guess, doubling the precision in every iteration. This covers
+  sqrt_fx(), reciprocal() and sigmoid(x, 'exp').
+
+The costs are given in terms of the building blocks, whose rounds depend
+on --bitdec and --bitrec (see carry.py) and --trunc (see trunc.py): bit
+decompositions, bit recompositions, truncations (one decomposition and
+one recomposition each), bit injections (two rounds) and rounds of
+multiplications mod 2^64 and in GF(2^n). The multiplications are per
+element. All values must fit into sfix.k bits like for the other sfix
+operations.
+"""
+
+import math
+from Compiler import carry, trunc, util
+from Compiler.types import sint, sgf2n, sfix, sfixArray, vectorize, \
+    round_fixed_product
+from Compiler.instructions import e_bitdec, e_bitrec, e_bitinj, e_bitinj_mul
+from Compiler.exceptions import *
+
+def _fit(function, degree, lo=0., hi=1.):
+    """ Coefficients of the polynomial interpolating function at the
+    Chebyshev nodes of [lo, hi], lowest first. """
+    xs = [lo + (hi - lo) * (1 + math.cos((2 * i + 1) * math.pi / \
+                                          (2 * degree + 2))) / 2 \
+              for i in range(degree + 1)]
+    rows = [[x ** j for j in range(degree + 1)] + [function(x)] for x in xs]
+    # Gauss-Jordan elimination with partial pivoting
+    for c in range(degree + 1):
+        p = max(range(c, degree + 1), key=lambda r: abs(rows[r][c]))
+        rows[c], rows[p] = rows[p], rows[c]
+        for r in range(degree + 1):
+            if r != c:
+                factor = rows[r][c] / rows[c][c]
+                rows[r] = [a - factor * b for a,b in zip(rows[r], rows[c])]
+    return [rows[i][-1] / rows[i][i] for i in range(degree + 1)]
+
+# errors below 2^-17 on [0, 1)
+exp2_coefficients = _fit(lambda t: 2 ** t, 4)
+log2_coefficients = _fit(lambda t: math.log(1 + t, 2), 6)
+# sigmoid(s + t) for the integer parts s in [-sigmoid_range, sigmoid_range)
+sigmoid_range = 16
+sigmoid_coefficients = [_fit(lambda t: 1 / (1 + math.exp(-s - t)), 4) \
+                            for s in range(-sigmoid_range, sigmoid_range)]
+
+def elementwise(function):
+    """ Vectorize function and apply it to all elements of an sfixArray
+    at once. """
+    function = vectorize(function)
+    def wrapper(x, *args, **kwargs):
+        if isinstance(x, sfixArray):
+            res = sfixArray(len(x))
+            res.assign_vector(function(x.get_vector(), *args, **kwargs))
+            return res
+        return function(x, *args, **kwargs)
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+def _bits(v, n):
+    """ Lowest n bits of a share mod 2^64. """
+    bits = [sgf2n() for i in range(n)]
+    e_bitdec(v, n, *bits)
+    return bits
+
+def _inject(bit):
+    """ Share mod 2^64 of a bit, see sgf2n.e_bit_inject(). """
+    res = sint()
+    e_bitinj(bit, res)
+    return res
+
+def _inject_mul(bit, x):
+    """ Product of a bit and a sint, see sgf2n.e_bit_inject_mul(). """
+    res = sint()
+    e_bitinj_mul(bit, x, res)
+    return res
+
+def _xor_all(bits):
+    if not bits:
+        return carry.zero()
+    return reduce(carry.xor, bits)
+
+def _leading_bit(bits):
+    """ One-hot bits of the highest bit set, in log(n) rounds. """
+    # T[i] is whether one of the bits from i up is set
+    T = carry.prefix_or(bits[::-1])[::-1]
+    return [carry.xor(T[i], T[i + 1]) for i in range(len(T) - 1)] + [T[-1]]
+
+def _product(terms):
+    """ Product of sint, combining neighbours in every round. """
+    terms = list(terms)
+    while len(terms) > 1:
+        terms = [terms[i] * terms[i + 1] \
+                     for i in range(0, len(terms) - 1, 2)] + \
+                     terms[len(terms) & ~1:]
+    return terms[0]
+
+def _pow2_terms(bits, factor=1):
+    """ Factors of 2^(factor * e) for the sint bits of e, least
+    significant first. """
+    return [b * (2 ** (factor * 2 ** i) - 1) + 1 for i,b in enumerate(bits)]
+
+def _powers(x, degree):
+    """ x, x^2, ..., x^degree as sfix, where x^i takes ceil(log2(i))
+    rounds of multiplication and truncation. """
+    res = [None, x]
+    for i in range(2, degree + 1):
+        res.append(res[i / 2] * res[i - i / 2])
+    return res[1:]
+
+def _extra():
+    """ Bits beyond f for coefficients, as long as the terms fit into 64
+    bits. """
+    return min(sfix.f, 64 - sfix.k)
+
+def _poly_raw(coefficients, powers, extra):
+    """ Sum of the coefficients times the powers as sint with
+    f + extra fractional bits, without truncation. """
+    f = sfix.f
+    res = int(round(coefficients[0] * 2 ** (f + extra)))
+    for c,x in zip(coefficients[1:], powers):
+        res = x.v * int(round(c * 2 ** extra)) + res
+    return res
+
+def _round(raw, m, k=None):
+    """ raw with f + m fractional bits rounded to an sfix. """
+    if k is None:
+        k = sfix.k + m
+    return sfix(round_fixed_product(raw, m, min(k, 64)))
+
+def _exp2(v, shift):
+    """ 2^x for the share v of x with f + shift fractional bits. """
+    f, k = sfix.f, sfix.k
+    n = util.log2(k)
+    extra = _extra()
+    # the integer part is non-negative from x = -f
+    bits = _bits(v + f * 2 ** (f + shift), k + shift)
+    frac = sint()
+    e_bitrec(frac, f, *bits[shift:f + shift])
+    powers = _powers(sfix(frac), len(exp2_coefficients) - 1)
+    fraction = _round(_poly_raw(exp2_coefficients, powers, extra), extra)
+    # 2^(floor(x) + f), zero below -f
+    injected = [_inject(b) for b in bits[f + shift:f + shift + n] + \
+                    [carry.xor_one(bits[k + shift - 1])]]
+    scale = _product(_pow2_terms(injected[:-1]) + injected[-1:])
+    return _round(scale * fraction.v, f, k)
+
+@elementwise
+def exp2_fx(x):
+    """ 2^x for sfix x below k - f - 1. Below -f, the result is zero.
+
+    One bit decomposition of k bits, one recomposition of f bits and
+    four truncations in sequence (two for the powers of the fraction, one
+    for the polynomial and one for the result). In parallel, log2(k) + 1
+    bits are injected and multiplied in ceil(log2(log2(k) + 1)) rounds.
+    About 10 multiplications mod 2^64 besides the injections. """
+    return _exp2(x.v, 0)
+
+@elementwise
+def exp_fx(x):
+    """ e^x for sfix x, see exp2_fx(). The factor log2(e) is folded into
+    the bit decomposition, which then covers k + min(f, 64 - k) bits, so
+    that the cost is the same. The factor only has min(f, 64 - k)
+    fractional bits, which adds a relative error of about |x| * 2^-17
+    for k = 48. """
+    shift = _extra()
+    return _exp2(x.v * int(round(math.log(math.e, 2) * 2 ** shift)), shift)
+
+def _log2(x, factor):
+    """ factor * log2(x) for sfix x > 0. """
+    f, k = sfix.f, sfix.k
+    extra = _extra()
+    # positive values fit into k - 1 bits
+    K = k - 1
+    lead = _leading_bit(_bits(x.v, K))
+    # shift to the top: x * 2^s is in [2^(K - 1), 2^K)
+    n = util.log2(K)
+    shift = [_xor_all([lead[j] for j in range(K) if (K - 1 - j) >> t & 1]) \
+                 for t in range(n)]
+    injected = [_inject(b) for b in shift]
+    normalized = x.v * _product(_pow2_terms(injected))
+    # 1 + u in [1, 2) with f fractional bits
+    mantissa = sint()
+    trunc.trunc(mantissa, normalized, K - 1 - f, K + 1)
+    powers = _powers(sfix(mantissa - 2 ** f), len(log2_coefficients) - 1)
+    # x = (1 + u) * 2^(K - 1 - s - f)
+    exponent = sum(b * 2 ** t for t,b in enumerate(injected))
+    scale = 2 ** (f + extra)
+    raw = _poly_raw([c * factor for c in log2_coefficients], powers, extra) + \
+        int(round((K - 1 - f) * factor * scale)) - \
+        exponent * int(round(factor * scale))
+    return _round(raw, extra)
+
+@elementwise
+def log2_fx(x):
+    """ log2(x) for sfix x > 0.
+
+    One bit decomposition of k - 1 bits, a prefix OR over them in
+    log2(k) rounds of AND, one bit injection and ceil(log2(log2(k)))
+    rounds of multiplication to normalise, and five truncations in
+    sequence (one for the normalisation, three for the powers and one
+    for the polynomial). log2(k) bit injections, about 11 other
+    multiplications mod 2^64 and k/2 log2(k) ANDs. """
+    return _log2(x, 1)
+
+@elementwise
+def log_fx(x, base=math.e):
+    """ Logarithm of sfix x > 0 to a public base, at the cost of
+    log2_fx(). """
+    return _log2(x, 1 / math.log(base, 2))
+
+@elementwise
+def sqrt_fx(x, iterations=4):
+    """ Square root of sfix x >= 0 by Goldschmidt iterations.
+
+    x is normalised to m in [1/4, 1) by an even shift 2r, so that
+    sqrt(x) = sqrt(m) * 2^((E - f) / 2 - r) for an even E - f. The
+    iterations run with (E - f) / 2 + f - 1 fractional bits, so that the
+    result is precise to f bits up to the largest sfix. A linear first
+    guess of 1 / sqrt(m) has a relative error of 0.1, and every iteration
+    squares the error, so the default of four iterations reaches 2^-40.
+
+    One bit decomposition of k - 1 bits, a prefix OR in log2(k) rounds
+    of AND, one bit injection, ceil(log2(log2(k))) rounds of
+    multiplication and 4 + 2 * iterations truncations in sequence.
+    log2(k) / 2 bit injections and about 10 + 3 * iterations other
+    multiplications mod 2^64. """
+    f, k = sfix.f, sfix.k
+    K = k - 1
+    E = K + (K - f) % 2
+    # fractional bits in the iterations
+    F = (E - f) / 2 + f - 1
+    lead = _leading_bit(_bits(x.v, K))
+    # x * 4^r is in [2^(E - 2), 2^E)
+    n = util.log2((E + 1) / 2)
+    r = [_xor_all([lead[j] for j in range(K) if (E - 1 - j) / 2 >> t & 1]) \
+             for t in range(n)]
+    injected = [_inject(b) for b in r]
+    normalized = x.v * _product(_pow2_terms(injected, 2))
+    m = sint()
+    trunc.trunc(m, normalized, E - F, E + 1)
+    # linear first guesses of 1 / sqrt(m) and 1 / (2 sqrt(m)) on [1/4, 1)
+    a, b = _fit(lambda t: 1 / math.sqrt(t), 1, .25, 1.)
+    guess = lambda scale: \
+        round_fixed_product(m * int(round(b * scale * 2 ** 10)) + \
+                                int(round(a * scale * 2 ** (F + 10))), 10, 64)
+    y = guess(1)
+    h = guess(.5)
+    mul = lambda u, v: round_fixed_product(u * v, F, 64)
+    g = mul(m, y)
+    for i in range(iterations):
+        e = 2 ** (F - 1) - mul(g, h)
+        g = g + mul(g, e)
+        if i < iterations - 1:
+            h = h + mul(h, e)
+    # 2^(P - r) for P = 2^n - 1, from the complement of the bits of r
+    P = 2 ** n - 1
+    scale = _product([2 ** (2 ** t) - b * (2 ** (2 ** t) - 1) \
+                          for t,b in enumerate(injected)])
+    return _round(g * scale, P - (E - f) / 2 + F - f, 64)
+
+@elementwise
+def reciprocal(x):
+    """ 1 / x for secret sfix x, see sfix.compute_reciprocal() and
+    division.py. The normalisation of x takes one bit decomposition and
+    a prefix OR, followed by floor(log2(k)) Goldschmidt iterations with
+    two multiplications and truncations each. The result is reused for
+    further divisions by x. """
+    return x.compute_reciprocal()
+
+def _demux(bits):
+    """ One-hot bits of the number given by bits, least significant
+    first, in log(len(bits)) rounds of AND. """
+    if len(bits) == 1:
+        return [carry.xor_one(bits[0]), bits[0]]
+    low = _demux(bits[:len(bits) / 2])
+    high = _demux(bits[len(bits) / 2:])
+    return [carry.and_(l, h) for h in high for l in low]
+
+def _sigmoid_poly(x):
+    f, k = sfix.f, sfix.k
+    extra = _extra()
+    n = util.log2(sigmoid_range)
+    bits = _bits(x.v, k)
+    sign = bits[k - 1]
+    # whether x is in [-2^n, 2^n)
+    in_range = carry.and_tree([carry.xor_one(carry.xor(b, sign)) \
+                                   for b in bits[f + n:k - 1]])
+    above = carry.and_(carry.xor_one(in_range), carry.xor_one(sign))
+    # floor(x) + 2^n selects the segment
+    segment = _demux(bits[f:f + n] + [carry.xor_one(sign)])
+    frac = sint()
+    e_bitrec(frac, f, *bits[:f])
+    powers = _powers(sfix(frac), len(sigmoid_coefficients[0]) - 1)
+    raw = _inject(above) * 2 ** (f + extra)
+    for bit,coefficients in zip(segment, sigmoid_coefficients):
+        bit = carry.and_(bit, in_range)
+        value = _poly_raw(coefficients, powers, extra)
+        if isinstance(value, sint):
+            raw += _inject_mul(bit, value)
+        elif value:
+            raw += _inject(bit) * value
+    return _round(raw, extra)
+
+def _sigmoid_exp(x, iterations):
+    sign = _bits(x.v, sfix.k)[-1]
+    absolute = sfix(x.v - _inject_mul(sign, x.v) * 2)
+    # 1 + e^-|x| is in (1, 2]
+    d = exp_fx(-absolute) + 1
+    # Newton iterations for 1 / d from 24/17 - 8/17 d
+    y = d * (-8. / 17) + 24. / 17
+    for i in range(iterations):
+        y = y * (2 - d * y)
+    return y + sfix(_inject_mul(sign, (1 - y * 2).v))
+
+@elementwise
+def sigmoid(x, variant='poly', iterations=3):
+    """ 1 / (1 + e^-x) for sfix x.
+
+    poly: piecewise polynomial of degree 4 on the unit intervals in
+      [-16, 16), and 0 or 1 outside. One bit decomposition of k bits,
+      one recomposition of f bits, two truncations for the powers of the
+      fraction and one for the result. A demux of five bits selects the
+      interval in three rounds of AND, and the 32 candidate polynomials
+      are computed locally and selected with one round of 33 bit
+      injections. About 26 other multiplications mod 2^64.
+    exp: the reciprocal of 1 + e^-|x| by Newton iterations from a linear
+      first guess with error 1/17, and the result for negative x by
+      symmetry. exp_fx() plus one bit decomposition, two bit injections
+      and 2 * iterations + 2 truncations, about 12 + 2 * iterations
+      multiplications mod 2^64 besides the injections. Three iterations
+      reach 2^-31.
+    """
+    if variant == 'poly':
+        return _sigmoid_poly(x)
+    elif variant == 'exp':
+        return _sigmoid_exp(x, iterations)
+    else:
+        raise CompilerError('Unknown sigmoid variant: %s' % variant)
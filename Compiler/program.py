@@ -7,6 +7,8 @@ import Compiler.instructions
 import Compiler.instructions_base
 import compilerLib
 import allocator as al
+import cost
+import dotprod
 import random
 import time
 import sys, os, errno
@@ -14,6 +16,11 @@ import inspect
 from collections import defaultdict
 import itertools
 import math
+import multiprocessing
+import bisect
+import copy
+from array import array
+from cStringIO import StringIO
 
 
 data_types = dict(
@@ -31,6 +38,67 @@ field_types = dict(
 )
 
 
+class Memory(dict):
+    """ Emulated memory, only storing addresses that have been written.
+    Unwritten addresses hold their own address as value. """
+    def __missing__(self, addr):
+        return addr
+
+    def __eq__(self, other):
+        # an address written with its own value equals an unwritten one
+        return all(self[addr] == other[addr] \
+                       for addr in set(self).union(other))
+
+    def __ne__(self, other):
+        return not self == other
+
+class RegisterIndexSet(object):
+    """ Compact set of registers, stored as sorted register indices per
+    register type. Keeps the registers defined in streamed blocks
+    without keeping the registers themselves. """
+    def __init__(self, registers):
+        indices = defaultdict(list)
+        for reg in registers:
+            indices[reg.reg_type].append(reg.i)
+        self.indices = dict((reg_type, array('i', sorted(l))) \
+                                for reg_type,l in indices.iteritems())
+
+    def __contains__(self, reg):
+        indices = self.indices.get(reg.reg_type)
+        if indices is None:
+            return False
+        k = bisect.bisect_left(indices, reg.i)
+        return k < len(indices) and indices[k] == reg.i
+
+
+def program_names(args, assemblymode=False):
+    """ Return the programs directory, the source file and the name of
+    a program given the compiler arguments. """
+    # ignore path to file - source must be in Programs/Source
+    if 'Programs' in os.listdir(os.getcwd()):
+        # compile prog in ./Programs/Source directory
+        programs_dir = os.getcwd() + '/Programs'
+    else:
+        # assume source is in main SPDZ directory
+        programs_dir = sys.path[0] + '/Programs'
+
+    progname = args[0].split('/')[-1]
+    if progname.endswith('.mpc'):
+        progname = progname[:-4]
+
+    if assemblymode:
+        infile = programs_dir + '/Source/' + progname + '.asm'
+    else:
+        infile = programs_dir + '/Source/' + progname + '.mpc'
+    """
+    name is input file name (minus extension) + any optional arguments.
+    Used to generate output filenames
+    """
+    name = progname
+    if len(args) > 1:
+        name += '-' + '-'.join(args[1:])
+    return programs_dir, infile, name
+
 class Program(object):
     """ A program consists of a list of tapes and a scheduled order
     of execution for these tapes.
@@ -95,35 +163,21 @@ class Program(object):
         return res
     
     def init_names(self, args, assemblymode):
-        # ignore path to file - source must be in Programs/Source
-        if 'Programs' in os.listdir(os.getcwd()):
-            # compile prog in ./Programs/Source directory
-            self.programs_dir = os.getcwd() + '/Programs'
-        else:
-            # assume source is in main SPDZ directory
-            self.programs_dir = sys.path[0] + '/Programs'
+        self.programs_dir, self.infile, self.name = \
+            program_names(args, assemblymode)
         print 'Compiling program in', self.programs_dir
         
         # create extra directories if needed
         for dirname in ['Public-Input', 'Bytecode', 'Schedules']:
             if not os.path.exists(self.programs_dir + '/' + dirname):
                 os.mkdir(self.programs_dir + '/' + dirname)
-        
-        progname = args[0].split('/')[-1]
-        if progname.endswith('.mpc'):
-            progname = progname[:-4]
-        
-        if assemblymode:
-            self.infile = self.programs_dir + '/Source/' + progname + '.asm'
-        else:
-            self.infile = self.programs_dir + '/Source/' + progname + '.mpc'
-        """
-        self.name is input file name (minus extension) + any optional arguments.
-        Used to generate output filenames
-        """
-        self.name = progname
-        if len(args) > 1:
-            self.name += '-' + '-'.join(args[1:])
+
+    def output_files(self):
+        """ Files written by write_bytes(). """
+        return [self.public_input_file.name,
+                self.programs_dir + '/Schedules/%s.sch' % self.name,
+                self.programs_dir + '/Schedules/%s.cost.json' % self.name] + \
+                [tape.outfile for tape in self.tapes]
 
     def new_tape(self, function, args=[], name=None):
         if name is None:
@@ -221,8 +275,9 @@ class Program(object):
         """ Reset register and memory values. """
         for tape in self.tapes:
             tape.reset_registers()
-        self.mem_c = range(USER_MEM + TMP_MEM)
-        self.mem_s = range(USER_MEM + TMP_MEM)
+        self.mem_c = Memory()
+        self.mem_s = Memory()
+        self.mem_i = Memory()
         random.seed(0)
     
     def write_bytes(self, outfile=None):
@@ -261,6 +316,10 @@ class Program(object):
         sch_file.write(' '.join(sys.argv) + '\n')
         for tape in self.tapes:
             tape.write_bytes()
+
+        cost.write_report(self, nonempty_tapes, self.programs_dir + \
+                              '/Schedules/%s.cost.json' % self.name)
+        self.public_input_file.flush()
     
     def schedule_start(self, tape, arg=None):
         """ Schedule the start of a thread. """
@@ -370,8 +429,30 @@ class Program(object):
         self.security = security
         print 'Changed statistical security for comparison etc. to', security
 
+def merge_in_subprocess(i):
+    """ Merge block i of Tape.parallel_merge in a worker process.
+    Output is returned instead of printed to keep it in block order. """
+    tape, blocks, options = Tape.parallel_merge
+    block = blocks[i]
+    index = dict((id(inst), j) for j,inst in enumerate(block.instructions))
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        merge_log = tape.merge_basicblock(block, i, len(blocks), options)
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    order = array('i', (index[id(inst)] for inst in block.instructions \
+                            if inst is not None))
+    return merge_log, order, output
+
 class Tape:
     """ A tape contains a list of basic blocks, onto which instructions are added. """
+    # blocks handled by merge_in_subprocess
+    parallel_merge = None
+    # smallest block worth sending to a worker process
+    min_parallel_block = 1000
+
     def __init__(self, name, program, param=-1):
         """ Set prime p and the initial instructions and registers. """
         self.program = program
@@ -383,14 +464,31 @@ class Tape:
         self.basicblocks = []
         self.purged = False
         self.active_basicblock = None
+        self.block_counter = 0
+        # for every open scope, whether it is a loop
+        self.open_scopes = []
+        self.streaming = getattr(program.options, 'stream', False)
+        self.stream_point = None
+        self.stream_offset = 0
+        self.stream_file = None
+        self.streamed_lines = 0
         self.start_new_basicblock()
         self._is_empty = False
         self.merge_opens = True
         self.if_states = []
+        # register file sizes before and after allocation by type
+        self.register_sizes = None
         self.req_bit_length = defaultdict(lambda: 0)
         self.function_basicblocks = {}
         self.functions = []
         self.prevent_direct_memory_write = False
+        # reciprocals of secret divisors, see division.py
+        self.reciprocals = {}
+        # Arrays of regint addresses, see Array.get_address()
+        self.address_bounds = {}
+        # results of conversions for reuse and the savings, see cse.py
+        self.conversions = {}
+        self.cse_savings = defaultdict(lambda: 0)
 
     class BasicBlock(object):
         def __init__(self, parent, name, scope, exit_condition=None):
@@ -398,7 +496,15 @@ class Tape:
             self.P = parent.P
             self.instructions = []
             self.name = name
-            self.index = len(parent.basicblocks)
+            self.index = parent.block_counter
+            self.req_node = parent.req_node
+            self.streamed_length = None
+            # nothing but control flow separates this from the previous block
+            self.merge_with_previous = False
+            # cost per source line when debugging
+            self.line_cost = None
+            # bits converted to mod 2^n, see sgf2n.e_bit_inject()
+            self.bit_injections = {}
             self.open_queue = []
             self.exit_condition = exit_condition
             self.exit_block = None
@@ -414,6 +520,15 @@ class Tape:
         def new_reg(self, reg_type, size=None):
             return self.parent.new_reg(reg_type, size=size)
 
+        def is_nested_in(self, block):
+            """ Whether this is block or nested in it, see scope """
+            scope = self
+            while scope is not None:
+                if scope is block:
+                    return True
+                scope = scope.scope
+            return False
+
         def set_return(self, previous_block, sub_block):
             self.previous_block = previous_block
             self.sub_block = sub_block
@@ -438,7 +553,11 @@ class Tape:
             self.instructions.append(self.exit_condition)
         
         def get_offset(self, next_block):
-            return next_block.offset - (self.offset + len(self.instructions))
+            if self.streamed_length is None:
+                length = len(self.instructions)
+            else:
+                length = self.streamed_length
+            return next_block.offset - (self.offset + length)
         
         def adjust_jump(self):
             """ Set the correct relative jump offset """
@@ -458,15 +577,31 @@ class Tape:
             self._is_empty = (len(self.basicblocks) == 0)
         return self._is_empty
 
-    def start_new_basicblock(self, scope=False, name=''):
+    def start_new_basicblock(self, scope=False, name='',
+                             merge_with_previous=False):
         # use False because None means no scope
         if scope is False:
             scope = self.active_basicblock
-        suffix = '%s-%d' % (name, len(self.basicblocks))
+        if self.streaming and self.stream_point is not None and \
+                not merge_with_previous:
+            # jumps and returns of blocks before the stream point have
+            # been set by now
+            self.stream_basicblocks(self.stream_point)
+        suffix = '%s-%d' % (name, self.block_counter)
         sub = self.BasicBlock(self, self.name + '-' + suffix, scope)
+        sub.merge_with_previous = merge_with_previous
         self.basicblocks.append(sub)
+        self.block_counter += 1
         self.active_basicblock = sub
         self.req_node.add_block(sub)
+        if merge_with_previous:
+            # keep the previous block until it can be merged
+            pass
+        elif all(self.open_scopes):
+            # only loops are open, which do not set exits of earlier blocks
+            self.stream_point = sub
+        else:
+            self.stream_point = None
         print 'Compiling basic block', sub.name
 
     def init_registers(self):
@@ -488,6 +623,9 @@ class Tape:
         del self.reg_values
         del self.basicblocks
         del self.active_basicblock
+        del self.reciprocals
+        del self.address_bounds
+        del self.conversions
         self.purged = True
 
     def unpurged(function):
@@ -500,78 +638,256 @@ class Tape:
         return wrapper
 
     @unpurged
-    def optimize(self, options):
-        if len(self.basicblocks) == 0:
-            print 'Tape %s is empty' % self.name
+    def stream_basicblocks(self, next_block):
+        """ Optimize all blocks before next_block, append them to the
+        bytecode file and release their instructions.
+
+        Only called in streaming mode, when no if block or function
+        definition is open that might still set the exit of these
+        blocks. """
+        n_blocks = self.basicblocks.index(next_block)
+        if n_blocks == 0:
             return
+        blocks = self.basicblocks[:n_blocks]
+        print 'Streaming %d blocks of tape %s' % (n_blocks, self.name)
+        # later blocks might use any register
+        options = copy.copy(self.program.options)
+        options.dead_code_elimination = False
+        if getattr(options, 'merge_blocks', 0):
+            blocks = self.merge_straightline_blocks(blocks, options)
+        self.merge_basicblocks(blocks, options)
+        self.set_jumps(blocks + [next_block], self.stream_offset)
+        self.stream_offset = next_block.offset
+        if self.stream_file is None:
+            self.stream_file = open(self.outfile, 'w')
+            print 'Streaming to', self.outfile
+        if self.program.options.asmoutfile:
+            self.write_str(self.program.options.asmoutfile + '-' + self.name,
+                           blocks)
+        for block in blocks:
+            block.req_node.add_streamed(block)
+            for inst in block.instructions:
+                self.stream_file.write(str(inst.get_bytes()))
+            block.streamed_length = len(block.instructions)
+            block.instructions = []
+            # later blocks in the scope still look up these
+            block.defined_registers = \
+                RegisterIndexSet(block.defined_registers)
+            block.used_from_scope = None
+            block.line_cost = None
+        del self.basicblocks[:n_blocks]
+
+    def merge_straightline_blocks(self, blocks, options):
+        """ Append blocks to the previous block where control always
+        falls through and no jump or call refers to the boundary. The
+        communication rounds of the joined blocks are then merged.
+        Returns the remaining blocks. """
+        targets = set(self.function_basicblocks)
+        for block in blocks:
+            targets.add(block.exit_block)
+            if block.previous_block is not None:
+                targets.add(block.previous_block)
+                targets.add(block.sub_block)
+        groups = []
+        for block in blocks:
+            if groups and block.merge_with_previous and \
+                    groups[-1][-1].exit_condition is None and \
+                    block not in targets and \
+                    block.req_node is groups[-1][0].req_node and \
+                    block.persistent_allocation == \
+                    groups[-1][0].persistent_allocation:
+                groups[-1].append(block)
+            else:
+                groups.append([block])
+        before = after = n_merged = 0
+        for group in groups:
+            if len(group) == 1:
+                continue
+            first = group[0]
+            before += sum(self.count_rounds(block, options) for block in group)
+            for block in group[1:]:
+                first.instructions += block.instructions
+                first.exit_condition = block.exit_condition
+                first.exit_block = block.exit_block
+                for child in block.children:
+                    child.scope = first
+                    first.children.append(child)
+                if block.scope is not None:
+                    block.scope.children.remove(block)
+                block.req_node.blocks.remove(block)
+                block.instructions = []
+            after += self.count_rounds(first, options)
+            n_merged += len(group)
+        if n_merged:
+            print 'Merged %d straight-line blocks into %d in tape %s, ' \
+                'rounds reduced from %d to %d' % \
+                (n_merged, len(filter(lambda g: len(g) > 1, groups)),
+                 self.name, before, after)
+        return [group[0] for group in groups]
+
+    def count_rounds(self, block, options):
+        """ Number of rounds of communication after merging. """
+        merger = al.Merger(block, options)
+        return len(set(merger.depths[n] for n in merger.open_nodes))
+
+    def merge_basicblocks(self, blocks, options):
+        for block in blocks:
+            al.determine_scope(block)
 
-        if self.if_states:
-            raise CompilerError('Unclosed if/else blocks')
-
-        print 'Processing tape', self.name, 'with %d blocks' % len(self.basicblocks)
+        if getattr(options, 'dotprod', False):
+            n_products = sum(dotprod.rewrite(block) for block in blocks)
+            if n_products:
+                print 'Replaced %d products by dot products in tape %s' % \
+                    (n_products, self.name)
 
-        for block in self.basicblocks:
-            al.determine_scope(block)
+        if self.program.DEBUG:
+            unmerged = [(list(block.instructions),
+                         map(cost.instruction_cost, block.instructions)) \
+                            for block in blocks]
+        merge_logs = [[]] * len(blocks)
 
         # merge open instructions
         # need to do this if there are several blocks
         if (options.merge_opens and self.merge_opens) or options.dead_code_elimination:
-            for i,block in enumerate(self.basicblocks):
-
-                ### added for debug (start) ###
-                # print("i={0}".format(i))
-                # print("block:{0}".format(block))
-                # print("block.instructions:{0}".format(block.instructions))
-                ### added for debug (ended) ###
-
-                if len(block.instructions) > 0:
-                    print 'Processing basic block %s, %d/%d, %d instructions' % \
-                        (block.name, i, len(self.basicblocks), \
-                         len(block.instructions))
-                # the next call is necessary for allocation later even without merging
-                merger = al.Merger(block, options)
-                if options.dead_code_elimination:
-                    if len(block.instructions) > 10000:
-                        print 'Eliminate dead code...'
-                    merger.eliminate_dead_code()
-                if options.merge_opens and self.merge_opens:
-                    if len(block.instructions) == 0:
-                        block.used_from_scope = set()
-                        block.defined_registers = set()
-                        continue
-                    if len(block.instructions) > 10000:
-                        print 'Merging open instructions...'
-                    #numrounds = merger.longest_paths_merge()
-                    numrounds = merger.extended_longest_paths_merge_4inst()
-                    if numrounds > 0:
-                        print 'Program requires %d rounds of communication' % numrounds
-                    numinv = sum(len(i.args) for i in block.instructions if isinstance(i, Compiler.instructions.startopen_class))
-                    if numinv > 0:
-                        print 'Program requires %d invocations' % numinv
-                if options.dead_code_elimination:
-                    block.instructions = filter(lambda x: x is not None, block.instructions)
+            jobs = getattr(options, 'jobs', 1) or 1
+            parallel = [i for i,block in enumerate(blocks) \
+                            if len(block.instructions) >= self.min_parallel_block]
+            if jobs > 1 and not hasattr(os, 'fork'):
+                print 'Parallel merging needs fork(), using one process'
+                jobs = 1
+            if jobs > 1 and parallel:
+                merge_logs = self.merge_parallel(blocks, parallel, jobs, options)
+            else:
+                merge_logs = [self.merge_basicblock(block, i, len(blocks), options) \
+                                  for i,block in enumerate(blocks)]
         if not (options.merge_opens and self.merge_opens):
             print 'Not merging open instructions in tape %s' % self.name
 
-        # add jumps
-        offset = 0
-        for block in self.basicblocks:
+        if self.program.DEBUG:
+            for block,(instructions,costs),merge_log in \
+                    zip(blocks, unmerged, merge_logs):
+                block.line_cost = cost.line_cost(instructions, costs,
+                                                 merge_log, block.instructions)
+
+    def merge_basicblock(self, block, i, n_blocks, options):
+        """ Eliminate dead code and merge opens in one block.
+        Returns the merges done. """
+        if len(block.instructions) > 0:
+            print 'Processing basic block %s, %d/%d, %d instructions' % \
+                (block.name, i, n_blocks, \
+                 len(block.instructions))
+        # the next call is necessary for allocation later even without merging
+        merger = al.Merger(block, options)
+        if options.dead_code_elimination:
+            if len(block.instructions) > 10000:
+                print 'Eliminate dead code...'
+            merger.eliminate_dead_code()
+        if options.merge_opens and self.merge_opens:
+            if len(block.instructions) == 0:
+                block.used_from_scope = set()
+                block.defined_registers = set()
+                return merger.merge_log
+            if len(block.instructions) > 10000:
+                print 'Merging open instructions...'
+            #numrounds = merger.longest_paths_merge()
+            numrounds = merger.extended_longest_paths_merge_4inst()
+            if numrounds > 0:
+                print 'Program requires %d rounds of communication' % numrounds
+            numinv = sum(len(i.args) for i in block.instructions if isinstance(i, Compiler.instructions.startopen_class))
+            if numinv > 0:
+                print 'Program requires %d invocations' % numinv
+        if options.dead_code_elimination:
+            block.instructions = filter(lambda x: x is not None, block.instructions)
+        return merger.merge_log
+
+    def merge_parallel(self, blocks, parallel, jobs, options):
+        """ Merge large blocks in a pool of forked processes.
+
+        The workers inherit the blocks through fork() instead of
+        receiving a serialised copy. They only send back the merges and
+        the order of the remaining instructions, which are then applied
+        to the blocks here. Small blocks are merged here.
+        Returns the merges done per block. """
+        print 'Merging %d blocks using %d processes' % (len(parallel), jobs)
+        Tape.parallel_merge = self, blocks, options
+        pool = multiprocessing.Pool(jobs)
+        merge_logs = []
+        try:
+            results = pool.imap(merge_in_subprocess, parallel)
+            parallel = set(parallel)
+            for i,block in enumerate(blocks):
+                if i in parallel:
+                    merge_log, order, output = next(results)
+                    sys.stdout.write(output)
+                    block.instructions = al.replay_merges(block.instructions,
+                                                          merge_log, order)
+                else:
+                    merge_log = self.merge_basicblock(block, i, len(blocks),
+                                                      options)
+                merge_logs.append(merge_log)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            Tape.parallel_merge = None
+        return merge_logs
+
+    def set_jumps(self, blocks, offset):
+        """ Add jumps and set offsets of blocks starting at offset.
+        In streaming mode, the last block is the first one not streamed
+        yet and only gets its offset set. """
+        if self.streaming:
+            blocks, next_block = blocks[:-1], blocks[-1]
+        for block in blocks:
             if block.exit_condition is not None:
                 block.add_jump()
             block.offset = offset
             offset += len(block.instructions)
-        for block in self.basicblocks:
+        if self.streaming:
+            next_block.offset = offset
+            if next_block.previous_block in blocks:
+                next_block.adjust_return()
+        for block in blocks:
             if block.exit_block is not None:
                 block.adjust_jump()
-            if block.previous_block is not None:
+            if block.previous_block is not None and \
+                    block.previous_block.streamed_length is None:
                 block.adjust_return()
 
+    @unpurged
+    def optimize(self, options):
+        if len(self.basicblocks) == 0:
+            print 'Tape %s is empty' % self.name
+            return
+
+        if self.if_states:
+            raise CompilerError('Unclosed if/else blocks')
+
+        streamed = self.stream_offset > 0
+        # remaining blocks are processed as usual
+        self.streaming = False
+
+        print 'Processing tape', self.name, 'with %d blocks' % len(self.basicblocks)
+
+        if getattr(options, 'merge_blocks', 0):
+            self.basicblocks = \
+                self.merge_straightline_blocks(self.basicblocks, options)
+
+        self.merge_basicblocks(self.basicblocks, options)
+
+        # add jumps
+        self.set_jumps(self.basicblocks, self.stream_offset)
+
         # now remove any empty blocks (must be done after setting jumps)
         self.basicblocks = filter(lambda x: len(x.instructions) != 0, self.basicblocks)
 
         # allocate registers
         reg_counts = self.count_regs()
-        if filter(lambda n: n > REG_MAX, reg_counts) and not options.noreallocate:
+        if streamed and not options.noreallocate:
+            print 'Not re-allocating registers in streamed tape %s' % self.name
+        elif not options.noreallocate:
             print 'Tape register usage:'
             print 'modp: %d clear, %d secret' % (reg_counts[RegType.ClearModp], reg_counts[RegType.SecretModp])
             print 'GF2N: %d clear, %d secret' % (reg_counts[RegType.ClearGF2N], reg_counts[RegType.SecretGF2N])
@@ -580,9 +896,9 @@ class Tape:
             def alloc_loop(block):
                 for reg in block.used_from_scope:
                     allocator.alloc_reg(reg, block.persistent_allocation)
+                # empty blocks can have children with instructions
                 for child in block.children:
-                    if child.instructions:
-                        alloc_loop(child)
+                    alloc_loop(child)
             for i,block in enumerate(reversed(self.basicblocks)):
                 if len(block.instructions) > 10000:
                     print 'Allocating %s, %d/%d' % \
@@ -593,6 +909,14 @@ class Tape:
                             block.exit_block.scope is not None:
                         alloc_loop(block.exit_block.scope)
                 allocator.process(block.instructions, block.persistent_allocation)
+            if allocator.n_unused:
+                print 'Results of %d instructions never used, ' \
+                    'compile with -d for details' % allocator.n_unused
+            self.register_sizes = dict((t, (reg_counts[t], allocator.usage[t])) \
+                                           for t in RegType.Types)
+            print 'Register file sizes of tape %s:' % self.name, \
+                ', '.join('%s %d -> %d' % ((t,) + self.register_sizes[t]) \
+                              for t in RegType.Types)
 
         # offline data requirements
         print 'Compile offline data requirements...'
@@ -629,6 +953,19 @@ class Tape:
             print 'Tape requires prime bit length', self.req_bit_length['p']
             print 'Tape requires galois bit length', self.req_bit_length['2']
 
+        savings = self.cse_savings
+        if savings['reused']:
+            print 'Reused %d conversions in tape %s, saving up to %d ' \
+                'rounds and %d multiplications' % \
+                (savings['reused'], self.name, savings['rounds'],
+                 savings['multiplications'])
+
+        # online cost
+        self.cost = self.req_tree.aggregate_cost()
+        print 'Tape requires %s rounds, sends %s elements' % \
+            tuple(cost.number(sum(self.cost[metric, t] for t in cost.field_types)) \
+                      for metric in ('rounds', 'sent'))
+
     @unpurged
     def _get_instructions(self):
         return itertools.chain.\
@@ -654,22 +991,39 @@ class Tape:
         f.close()
     
     @unpurged
-    def write_str(self, filename):
-        """ Write the sequence of instructions to a file. """
+    def write_str(self, filename, blocks=None):
+        """ Write the sequence of instructions to a file.
+
+        In streaming mode, the blocks are appended to what has been
+        written before. """
         print 'Writing to', filename
-        f = open(filename, 'w')
-        n = 0
-        for block in self.basicblocks:
+        if blocks is None:
+            blocks = self.basicblocks
+        if self.streamed_lines:
+            f = open(filename, 'a')
+        else:
+            f = open(filename, 'w')
+        n = self.streamed_lines
+        for block in blocks:
             if block.instructions:
                 f.write('# %s\n' % block.name)
                 for line in block.instructions:
                     f.write('%s # %d\n' % (line, n))
                     n += 1
         f.close()
+        if self.streaming:
+            self.streamed_lines = n
     
     @unpurged
     def write_bytes(self, filename=None):
         """ Write the program's byte encoding to a file. """
+        if self.stream_file is not None:
+            # append the blocks not streamed yet
+            print 'Writing to', self.outfile
+            self.stream_file.write(self.get_bytes())
+            self.stream_file.close()
+            self.stream_file = None
+            return
         if filename is None:
             filename = self.outfile
         if not filename.endswith('.bc'):
@@ -691,11 +1045,17 @@ class Tape:
             return self.reg_counter[reg_type]
     
     def reset_registers(self):
-        """ Reset register values to zero. """
-        self.reg_values = RegType.create_dict(lambda: [0] * INIT_REG_MAX)
+        """ Reset register values to zero. Values are only stored when
+        emulating, and then sparsely. """
+        if self.program.EMULATE:
+            self.reg_values = RegType.create_dict(dict)
+        else:
+            self.reg_values = None
     
     def get_value(self, reg_type, i):
-        return self.reg_values[reg_type][i]
+        if self.reg_values is None:
+            return 0
+        return self.reg_values[reg_type].get(i, 0)
     
     def __str__(self):
         return self.name
@@ -741,23 +1101,42 @@ class Tape:
             return repr(dict(self))
 
     class ReqNode(object):
-        __slots__ = ['num', 'children', 'name', 'blocks']
+        __slots__ = ['num', 'children', 'name', 'blocks', 'streamed',
+                     'streamed_cost']
         def __init__(self, name):
             self.children = []
             self.name = name
             self.blocks = []
-        def aggregate(self, *args):
             self.num = Tape.ReqNum()
+            self.streamed = Tape.ReqNum()
+            self.streamed_cost = Tape.ReqNum()
+        def aggregate(self, *args):
+            self.num = Tape.ReqNum(self.streamed)
             for block in self.blocks:
                 for inst in block.instructions:
                     inst.add_usage(self)
             res = reduce(lambda x,y: x + y.aggregate(self.name),
                          self.children, self.num)
             return res
+        def aggregate_cost(self, *args):
+            res = Tape.ReqNum(self.streamed_cost)
+            for block in self.blocks:
+                cost.add_block(res, block)
+            return reduce(lambda x,y: x + y.aggregate_cost(), self.children,
+                          res)
         def increment(self, data_type, num=1):
             self.num[data_type] += num
         def add_block(self, block):
             self.blocks.append(block)
+        def add_streamed(self, block):
+            """ Count the requirements of a block before its
+            instructions are released. """
+            num = self.num
+            self.num = self.streamed
+            for inst in block.instructions:
+                inst.add_usage(self)
+            self.num = num
+            cost.add_block(self.streamed_cost, block)
 
     class ReqChild(object):
         __slots__ = ['aggregator', 'nodes', 'parent']
@@ -768,20 +1147,25 @@ class Tape:
         def aggregate(self, name):
             res = self.aggregator([node.aggregate() for node in self.nodes])
             return res
+        def aggregate_cost(self):
+            return self.aggregator([node.aggregate_cost() \
+                                        for node in self.nodes])
         def add_node(self, tape, name):
             new_node = Tape.ReqNode(name)
             self.nodes.append(new_node)
             tape.req_node = new_node
 
-    def open_scope(self, aggregator, scope=False, name=''):
+    def open_scope(self, aggregator, scope=False, name='', loop=False):
         child = self.ReqChild(aggregator, self.req_node)
         self.req_node.children.append(child)
-        child.add_node(self, '%s-%d' % (name, len(self.basicblocks)))
+        child.add_node(self, '%s-%d' % (name, self.block_counter))
+        self.open_scopes.append(loop)
         self.start_new_basicblock(name=name)
         return child
 
     def close_scope(self, outer_scope, parent_req_node, name):
         self.req_node = parent_req_node
+        self.open_scopes.pop()
         self.start_new_basicblock(outer_scope, name)
 
     def require_bit_length(self, bit_length, t='p'):
@@ -890,13 +1274,14 @@ class Tape:
         
         @property
         def value(self):
-            return self.program.reg_values[self.reg_type][self.i]
+            if self.program.reg_values is None:
+                return 0
+            return self.program.reg_values[self.reg_type].get(self.i, 0)
         
         @value.setter
         def value(self, val):
-            while (len(self.program.reg_values[self.reg_type]) <= self.i):
-                self.program.reg_values[self.reg_type] += [0] * INIT_REG_MAX
-            self.program.reg_values[self.reg_type][self.i] = val
+            if self.program.reg_values is not None:
+                self.program.reg_values[self.reg_type][self.i] = val
         
         @property
         def is_active(self):
@@ -0,0 +1,50 @@
+# (C) 2016 University of Bristol. See License.txt
+
+"""
+Truncation of shares mod 2^64, that is, shifting right by m bits via
+bit decomposition and recomposition. The variants are:
+
+exact: decompose all 64 bits and recompose the upper 64 - m
+short: decompose only the k bits of a value that is known to fit into
+  k bits, and recompose k - m bits
+prob: like short, but without the carries into bit m - 1, so the
+  result is one too low (modulo 2^(k - m)) with probability up to about
+  1/2
+
+Without a bound, k is 64, so that short is the same as exact. The
+rounds of the decomposition are those of the carry propagation (see
+carry.py) over k bits for short and over k - m + 1 bits for prob, plus
+one for the full adders.
+"""
+
+variants = ('exact', 'short', 'prob')
+variant = 'exact'
+
+def set_variant(options):
+    """ Set the truncation variant from the command-line option """
+    global variant
+    value = getattr(options, 'trunc', None)
+    if value is None:
+        return
+    if value not in variants:
+        raise CompilerError('Unknown truncation variant: %s' % value)
+    variant = value
+
+def trunc(res, x, m, k=64, signed=True):
+    """ x shifted right by m bits in res. x must fit into k bits, where
+    bit k - 1 is the sign if signed. """
+    if variant == 'exact':
+        k = 64
+    if variant == 'prob' and m > 0:
+        bits = [program.curr_block.new_reg('sg') for i in range(k - m)]
+        e_bitdec_high(x, k, m, *bits)
+    else:
+        bits = [program.curr_block.new_reg('sg') for i in range(k)]
+        e_bitdec(x, k, *bits)
+        bits = bits[m:]
+    if signed:
+        e_sbitrec(res, k - m, *bits)
+    else:
+        e_bitrec(res, k - m, *bits)
+
+from instructions import *
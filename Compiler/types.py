@@ -6,7 +6,7 @@ from Compiler.exceptions import *
 from Compiler.instructions import *
 from Compiler.instructions_base import *
 from floatingpoint import two_power
-import comparison, floatingpoint
+import comparison, floatingpoint, carry, trunc, division, cse
 import math
 import util
 import operator
@@ -984,6 +984,67 @@ class _secret(_register):
         stopprivateoutput(masked.reveal(), player)
 
 
+def signed_less_than(a, b, bit_length=None):
+    """ Share mod 2 of a < b for a signed sint and a signed sint, cint or
+    int. Without bit_length, all 64 bits are compared, which needs the
+    top bits of a, b and a - b to correct an overflow. If a and b fit
+    into bit_length bits, only the top bit of a - b is needed. """
+    res = sgf2n()
+    if isinstance(a, (int, long)):
+        a = cint(a)
+    if isinstance(b, (int, long)):
+        b = cint(b)
+    if not isinstance(a, (sint, cint)) or not isinstance(b, (sint, cint)):
+        raise NotImplementedError
+    if bit_length is not None and bit_length < 64:
+        if isinstance(a, sint) and isinstance(b, sint):
+            # shared with equality tests, see cse.py
+            e_msb(cse.difference(a, b), bit_length + 1, res)
+        else:
+            e_msb(a - b, bit_length + 1, res)
+    elif isinstance(a, sint) and isinstance(b, sint):
+        e_lessthan(a, b, 64, res)
+    else:
+        # as in e_lessthan with the sign of the clear value
+        msb_sub = sgf2n()
+        prod_left = sgf2n()
+        prod_right = sgf2n()
+        prod = sgf2n()
+        e_msb(a - b, 64, msb_sub)
+        if isinstance(a, sint):
+            msb_a = sgf2n()
+            e_msb(a, 64, msb_a)
+            gaddm(prod_left, msb_a, cgf2n(b >> 63))
+            gadds(prod_right, msb_sub, msb_a)
+        else:
+            msb_b = sgf2n()
+            e_msb(b, 64, msb_b)
+            sign = cgf2n(a >> 63)
+            gaddm(prod_left, msb_b, sign)
+            gaddm(prod_right, msb_sub, sign)
+        ge_startmult(prod_left, prod_right)
+        ge_stopmult(prod)
+        gadds(res, prod, msb_sub)
+    return res
+
+def equal_bit(a, b, bit_length=None):
+    """ Share mod 2 of a == b for a sint and a sint, cint or int. If a
+    and b fit into bit_length bits, only that many bits of a - b are
+    tested. """
+    res = sgf2n()
+    if isinstance(b, (int, long)):
+        b = cint(b)
+    if not isinstance(a, sint) or not isinstance(b, (sint, cint)):
+        raise NotImplementedError
+    if bit_length is None or bit_length > 64:
+        bit_length = 64
+    if isinstance(b, sint):
+        # a - b is zero if and only if b - a is, see cse.py
+        e_eqz(cse.difference(a, b, symmetric=True), bit_length, res)
+    else:
+        e_eqz(a - b, bit_length, res)
+    return res
+
 class sint(_secret, _int):
     " Shared mod p integer type. """
     __slots__ = []
@@ -1060,6 +1121,25 @@ class sint(_secret, _int):
     def __init__(self, val=None, size=None):
         super(sint, self).__init__('s', val=val, size=size)
 
+    @classmethod
+    def dot(cls, a, b):
+        """ Sum of the products of two lists. The products of sint pairs
+        take one round and one element of communication together. """
+        pairs = zip(a, b)
+        if len(pairs) != len(a) or len(pairs) != len(b):
+            raise CompilerError('Dot product of lists of different lengths')
+        def secret(x, y):
+            return isinstance(x, sint) and isinstance(y, sint) and \
+                x.size == y.size == 1
+        res = sum(x * y for x,y in pairs if not secret(x, y))
+        factors = [pair for pair in pairs if secret(*pair)]
+        if factors:
+            prod = cls()
+            e_startdotprod(len(factors), *itertools.chain(*factors))
+            e_stopdotprod(prod)
+            res += prod
+        return res
+
     @vectorize
     def __neg__(self):
         return 0 - self
@@ -1076,124 +1156,7 @@ class sint(_secret, _int):
         """
 
         # BIU-NEC_lt
-        if isinstance(other, sint):
-            step = 64
-            ans = sgf2n()
-            e_lessthan(self, other, step, *ans)
-            #tmp = sint()
-            #bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            #prod_left = sgf2n()
-            #prod_right = sgf2n()
-            #prod = sgf2n()
-            #ans = sgf2n()
-            #bit_array_self = [sgf2n() for _ in range(step)]
-            #bit_array_other = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            #subs(tmp, self, other)
-            #e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            #e_bitdec(self, step, *bit_array_self)
-            #e_bitdec(other, step, *bit_array_other)
-            #gadds(prod_left, bit_array_self[step - 1], bit_array_other[step - 1])
-            #gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            #ge_startmult(prod_left,prod_right)
-            #ge_stopmult(prod)
-            #gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            # DEBUG (start)
-            """
-            c_bit_array = [cgf2n() for _ in range(step)]
-            for i in range(step):
-                print_char4("i=")
-                print_char4(str(i))
-                print_char('\n')
-                gstartopen(bit_array[i])
-                gstopopen(c_bit_array[i])
-                gprint_reg_plain(c_bit_array[i])
-                print_char('\n')
-            """
-            # DEBUG (end)
-
-            # result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-            return result
-        elif isinstance(other, cint):
-            step = 64
-            tmp = sint()
-            bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            prod_left = sgf2n()
-            prod_right = sgf2n()
-            prod = sgf2n()
-            ans = sgf2n()
-            bit_array_self = [sgf2n() for _ in range(step)]
-            bit_array_other = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            subml(tmp, self, other)
-            e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self, step, *bit_array_self)
-            sign = cgf2n(other >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            # result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-            return result
-        elif isinstance(other, int):
-            other_val = cint(other)
-            step = 64
-            tmp = sint()
-            bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            prod_left = sgf2n()
-            prod_right = sgf2n()
-            prod = sgf2n()
-            ans = sgf2n()
-            bit_array_self = [sgf2n() for _ in range(step)]
-            bit_array_other = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            subml(tmp, self, other_val)
-            e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self, step, *bit_array_self)
-            sign = cgf2n(other_val >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            # result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-            return result
-        else:
-            raise NotImplementedError
+        return signed_less_than(self, other, bit_length).e_bit_inject()
 
     @read_mem_value
     @vectorize
@@ -1207,231 +1170,23 @@ class sint(_secret, _int):
         """
 
         # BIU-NEC_gt
-        if isinstance(other, sint):
-            step = 64
-            tmp = sint()
-            bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            prod_left = sgf2n()
-            prod_right = sgf2n()
-            prod = sgf2n()
-            ans = sgf2n()
-            bit_array_self = [sgf2n() for _ in range(step)]
-            bit_array_other = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            subs(tmp, other, self)
-            e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self, step, *bit_array_self)
-            e_bitdec(other, step, *bit_array_other)
-            gadds(prod_left, bit_array_self[step - 1], bit_array_other[step - 1])
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_other[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            # result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-
-            return result
-        elif isinstance(other, cint):
-            step = 64
-            tmp = sint()
-            bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            prod_left = sgf2n()
-            prod_right = sgf2n()
-            prod = sgf2n()
-            ans = sgf2n()
-            bit_array_self = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            submr(tmp, other, self)
-            e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self, step, *bit_array_self)
-            sign = cgf2n(other >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gaddm(prod_right, bit_array_sub[step - 1], sign)
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            # result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-            return result
-        elif isinstance(other, int):
-            step = 64
-            tmp = sint()
-            other_val = cint(other)
-            bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            prod_left = sgf2n()
-            prod_right = sgf2n()
-            prod = sgf2n()
-            ans = sgf2n()
-            bit_array_self = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            submr(tmp, other_val, self)
-            e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self, step, *bit_array_self)
-            sign = cgf2n(other_val >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gaddm(prod_right, bit_array_sub[step - 1], sign)
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            # result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-            return result
-        else:
-            raise NotImplementedError
+        return signed_less_than(other, self, bit_length).e_bit_inject()
 
+    @read_mem_value
+    @vectorize
     def __le__(self, other, bit_length=None, security=None):
         """
         # original_le
         return 1 - self.greater_than(other, bit_length, security)
         """
 
-       # BIU-NEC_le
-        if isinstance(other, sint):
-
-            step = 64
-            tmp = sint()
-            bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            prod_left = sgf2n()
-            prod_right = sgf2n()
-            prod = sgf2n()
-            ans = sgf2n()
-            bit_array_self = [sgf2n() for _ in range(step)]
-            bit_array_other = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            subs(tmp, other, self)
-            e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self, step, *bit_array_self)
-            e_bitdec(other, step, *bit_array_other)
-            gadds(prod_left, bit_array_self[step - 1], bit_array_other[step - 1])
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_other[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-
-            # gaddsi(bit_res, bit_array_sub[step - 1], 1)
-            # res = bit_res.e_bit_inject()
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            res = bit_res.e_bit_inject()
-            # signed ver. (end)
-
-            return res
-        elif isinstance(other, cint):
-            step = 64
-            tmp = sint()
-            bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            prod_left = sgf2n()
-            prod_right = sgf2n()
-            prod = sgf2n()
-            ans = sgf2n()
-            bit_array_self = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            submr(tmp, other, self)
-            e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self, step, *bit_array_self)
-            sign = cgf2n(other >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gaddm(prod_right, bit_array_sub[step - 1], sign)
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-
-            # gaddsi(bit_res, bit_array_sub[step - 1], 1)
-            # res = bit_res.e_bit_inject()
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            res = bit_res.e_bit_inject()
-            # signed ver. (end)
-            return res
-        elif isinstance(other, int):
-            step = 64
-            tmp = sint()
-            other_val = cint(other)
-            bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            prod_left = sgf2n()
-            prod_right = sgf2n()
-            prod = sgf2n()
-            ans = sgf2n()
-            bit_array_self = [sgf2n() for _ in range(step)]
-            bit_array_other = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            submr(tmp, other_val, self)
-            e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self, step, *bit_array_self)
-            sign = cgf2n(other_val >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gaddm(prod_right, bit_array_sub[step - 1], sign)
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-
-            # gaddsi(bit_res, bit_array_sub[step - 1], 1)
-            # res = bit_res.e_bit_inject()
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            res = bit_res.e_bit_inject()
-            # signed ver. (end)
-            return res
-        else:
-            raise NotImplementedError
+        # BIU-NEC_le
+        bit_res = sgf2n()
+        gaddsi(bit_res, signed_less_than(other, self, bit_length), 1)
+        return bit_res.e_bit_inject()
 
+    @read_mem_value
+    @vectorize
     def __ge__(self, other, bit_length=None, security=None):
         """
         # original_ge
@@ -1439,120 +1194,9 @@ class sint(_secret, _int):
         """
 
         # BIU-NEC_ge
-        if isinstance(other, sint):
-
-            step = 64
-            tmp = sint()
-            bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            prod_left = sgf2n()
-            prod_right = sgf2n()
-            prod = sgf2n()
-            ans = sgf2n()
-            bit_array_self = [sgf2n() for _ in range(step)]
-            bit_array_other = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            subs(tmp, self, other)
-            e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self, step, *bit_array_self)
-            e_bitdec(other, step, *bit_array_other)
-            gadds(prod_left, bit_array_self[step - 1], bit_array_other[step - 1])
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-
-            # gaddsi(bit_res, bit_array[step - 1], 1)
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            # signed ver. (end)
-
-            res = bit_res.e_bit_inject()
-            return res
-        elif isinstance(other, cint):
-            step = 64
-            tmp = sint()
-            bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            prod_left = sgf2n()
-            prod_right = sgf2n()
-            prod = sgf2n()
-            ans = sgf2n()
-            bit_array_self = [sgf2n() for _ in range(step)]
-            bit_array_other = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            subml(tmp, self, other)
-            e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self, step, *bit_array_self)
-            sign = cgf2n(other >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-
-            # gaddsi(bit_res, bit_array[step - 1], 1)
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            # signed ver. (end)
-
-            res = bit_res.e_bit_inject()
-            return res
-        elif isinstance(other, int):
-            step = 64
-            tmp = sint()
-            other_val = cint(other)
-            bit_array_sub = [sgf2n() for _ in range(step)]
-
-            # signed ver. (start)
-            prod_left = sgf2n()
-            prod_right = sgf2n()
-            prod = sgf2n()
-            ans = sgf2n()
-            bit_array_self = [sgf2n() for _ in range(step)]
-            # signed ver. (end)
-
-            subml(tmp, self, other_val)
-            e_bitdec(tmp, step, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self, step, *bit_array_self)
-            sign = cgf2n(other_val >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-
-            # gaddsi(bit_res, bit_array[step - 1], 1)
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            # signed ver. (end)
-
-            res = bit_res.e_bit_inject()
-            return res
-        else:
-            raise NotImplementedError
+        bit_res = sgf2n()
+        gaddsi(bit_res, signed_less_than(self, other, bit_length), 1)
+        return bit_res.e_bit_inject()
 
     @read_mem_value
     @vectorize
@@ -1564,225 +1208,20 @@ class sint(_secret, _int):
         """
 
         # BIU-NEC_eq
-        if isinstance(other, sint):
-            step = 64
-            tmp = sint()
-            subs(tmp, self, other)
-            #DEBUG (start)
-            """
-            c_tmp = cint()
-            print_char4("dif:")
-            startopen(tmp)
-            stopopen(c_tmp)
-            """
-            #DEBUG (end)
-
-            bit_array = [sgf2n() for _ in range(step)]
-            op_bit_array = [sgf2n() for _ in range(step)]
-            e_bitdec(tmp, step, *bit_array)
-
-            #DEBUG (start)
-            c_bit_array = [cgf2n() for _ in range(step)]
-            c_op_bit_array = [cgf2n() for _ in range(step)]
-            #DEBUG (end)
-
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-
-                #DEBUG(start)
-                """
-                print_char4("i=")
-                print_char4(str(i))
-                print_char('\n')
-                print_char4("bef:")
-                gstartopen(bit_array[i])
-                gstopopen(c_bit_array[i])
-                gprint_reg_plain(c_bit_array[i])
-                print_char('\n')
-                print_char4("aft:")
-                gstartopen(op_bit_array[i])
-                gstopopen(c_op_bit_array[i])
-                gprint_reg_plain(c_op_bit_array[i])
-                print_char('\n')
-                """
-                # DEBUG(end)
-
-            # minimize communication bits
-            """
-            tmp_step = step
-            for i in range(util.log2(step)):
-                tmp_step = tmp_step/2
-                print("num: "+str(tmp_step)+'\n')
-                for j in range(tmp_step):
-                    tmp_bit_array = [sgf2n() for _ in range(tmp_step)]
-                    ge_startmult(op_bit_array[2 * j], op_bit_array[2 * j + 1])
-                    ge_stopmult(tmp_bit_array[j])
-                    op_bit_array[j] = tmp_bit_array[j]
-            #res = op_bit_array[0].e_bit_inject()
-            #return res
-            return op_bit_array[0]
-            """
-
-            # minimize communication rounds
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-
-            # return tmp_bit_array[step - 1]
-            res = tmp_bit_array[step - 1].e_bit_inject()
-            return res
-        elif isinstance(other, cint):
-            step = 64
-            tmp = sint()
-            subml(tmp, self, other)
-
-            bit_array = [sgf2n() for _ in range(step)]
-            op_bit_array = [sgf2n() for _ in range(step)]
-            e_bitdec(tmp, step, *bit_array)
-
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-
-            # minimize communication rounds
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-
-            # return tmp_bit_array[step - 1]
-            res = tmp_bit_array[step - 1].e_bit_inject()
-            return res
-        elif isinstance(other, int):
-            step = 64
-            tmp = sint()
-            other_val = cint(other)
-            subml(tmp, self, other_val)
-
-            bit_array = [sgf2n() for _ in range(step)]
-            op_bit_array = [sgf2n() for _ in range(step)]
-            e_bitdec(tmp, step, *bit_array)
-
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-
-            # minimize communication rounds
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-
-            # return tmp_bit_array[step - 1]
-            res = tmp_bit_array[step - 1].e_bit_inject()
-            return res
-        else:
-            raise NotImplementedError
+        return equal_bit(self, other, bit_length).e_bit_inject()
 
+    @read_mem_value
+    @vectorize
     def __ne__(self, other, bit_length=None, security=None):
         """
         # original_ne
         return 1 - self.equal(other, bit_length, security)
         """
 
-        # BIU-NEC_eq
-        if isinstance(other, sint):
-            step = 64
-            tmp = sint()
-            bit_res = sgf2n()
-            subs(tmp, self, other)
-            bit_array = [sgf2n() for _ in range(step)]
-            op_bit_array = [sgf2n() for _ in range(step)]
-            e_bitdec(tmp, step, *bit_array)
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-
-            # minimize communication bits
-            """
-            tmp_step = step
-            for i in range(util.log2(step)):
-                tmp_step = tmp_step / 2
-                for j in range(tmp_step):
-                    tmp_bit_array = [sgf2n() for _ in range(tmp_step)]
-                    ge_startmult(op_bit_array[2 * j], op_bit_array[2 * j + 1])
-                    ge_stopmult(tmp_bit_array[j])
-                    op_bit_array[j] = tmp_bit_array[j]
-            gaddsi(bit_res, op_bit_array[0], 1)
-            res = bit_res.e_bit_inject()
-            return res
-            """
-            # minimize communication rounds
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-
-            gaddsi(bit_res, tmp_bit_array[step - 1], 1)
-            # return bit_res
-            res = bit_res.e_bit_inject()
-            return res
-        elif isinstance(other, cint):
-            step = 64
-            tmp = sint()
-            bit_res = sgf2n()
-            subml(tmp, self, other)
-            bit_array = [sgf2n() for _ in range(step)]
-            op_bit_array = [sgf2n() for _ in range(step)]
-            e_bitdec(tmp, step, *bit_array)
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-
-            # minimize communication rounds
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-
-            gaddsi(bit_res, tmp_bit_array[step - 1], 1)
-            # return bit_res
-            res = bit_res.e_bit_inject()
-            return res
-        elif isinstance(other, int):
-            step = 64
-            tmp = sint()
-            bit_res = sgf2n()
-            other_val = cint(other)
-            subml(tmp, self, other_val)
-            bit_array = [sgf2n() for _ in range(step)]
-            op_bit_array = [sgf2n() for _ in range(step)]
-            e_bitdec(tmp, step, *bit_array)
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-
-            # minimize communication rounds
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-
-            gaddsi(bit_res, tmp_bit_array[step - 1], 1)
-            # return bit_res
-            res = bit_res.e_bit_inject()
-            return res
-        else:
-            raise NotImplementedError
+        # BIU-NEC_ne
+        bit_res = sgf2n()
+        gaddsi(bit_res, equal_bit(self, other, bit_length), 1)
+        return bit_res.e_bit_inject()
 
     less_than = __lt__
     greater_than = __gt__
@@ -1901,7 +1340,7 @@ class sint(_secret, _int):
     @vectorize
     def e_truncation(self, denom):
         tmp_res = sint()
-        e_trunc(self, denom, *tmp_res)
+        e_trunc(self, denom, tmp_res)
         return tmp_res
 
     @vectorize
@@ -1946,8 +1385,6 @@ class sint(_secret, _int):
         s_two_pow_f = sint()
         v = sint()
         res = sint()
-        bit_array = [sgf2n() for _ in range(ring_size)]
-        w = [sgf2n() for _ in range(ring_size)]
 
         # DEBUG (start)
         # clr_pow = cint()
@@ -1971,69 +1408,32 @@ class sint(_secret, _int):
         # print_reg_plain(clr_v)
         # DEBUG (end)
 
-        e_bitdec(v, ring_size, *bit_array)
-        for i in range(ring_size):
-            # DEBUG (strat)
-            # print_char4("i="+str(i))
-            # print_char('\n')
-            # DEBUG(end)
-
-            if i <= ring_size - m - 1:
-                w[i] = bit_array[i + m]
-
-                # DEBUG (start)
-                # gstartopen(w[i])
-                # gstopopen(clear_bit_array[i])
-                # gprint_reg_plain(clear_bit_array[i])
-                # print_char('\n')
-                # DEBUG (end)
-
-            else:
-                w[i] = bit_array[ring_size - 1]
-
-                # DEBUG (start)
-                # gstartopen(w[i])
-                # gstopopen(clear_bit_array[i])
-                # gprint_reg_plain(clear_bit_array[i])
-                # print_char('\n')
-                # DEBUG (end)
-
-        e_bitrec(res, ring_size, *w)
+        # shift by m with sign extension, see trunc.py
+        trunc.trunc(res, v, m)
         return res
 
     @vectorize
     def e_reci_appro(self, m):
+        """ Power of two close to 2^(m - 2) / self with the sign of self.
+        The leading bit is found with a prefix OR in log(m) rounds, see
+        carry.prefix_or(). """
         ring_size = 64
         res = sint()
-        T = [sgf2n() for _ in range(ring_size)]
-        y_bit_array = [sgf2n() for _ in range(ring_size)]
         x_bit_array = [sgf2n() for _ in range(ring_size)]
-        T_left = [sgf2n() for _ in range(ring_size)]
-        T_right = [sgf2n() for _ in range(ring_size)]
-        T_prod = [sgf2n() for _ in range(ring_size)]
-        Y_left = [sgf2n() for _ in range(ring_size)]
-        Y_prod = [sgf2n() for _ in range(ring_size)]
-
         e_bitdec(self, ring_size, *x_bit_array)
-        for i in range(m-1, ring_size):
-            gldsi(T[i], 0)
-            y_bit_array[i] = x_bit_array[ring_size - 1]
-
-        # loop for i = m-2, ... ,0
-        for i in range(m-2, -1, -1):
-
-            gadds(T_left[i], x_bit_array[i], x_bit_array[ring_size - 1])
-            gaddsi(T_right[i], T[i + 1], 1)
-            ge_startmult(T_left[i], T_right[i])
-            ge_stopmult(T_prod[i])
-            gadds(T[i], T_prod[i], T[i+1])
+        sign = x_bit_array[ring_size - 1]
 
-            gaddsi(Y_left[i], x_bit_array[ring_size - 1], 1)
-            ge_startmult(Y_left[i], T[i+1])
-            ge_stopmult(Y_prod[i])
-            gadds(y_bit_array[m-2-i], Y_prod[i], T[i])
+        # T[i] is whether one of bits m - 2 to i differs from the sign
+        T = carry.prefix_or([carry.xor(x_bit_array[i], sign) \
+                                 for i in range(m - 2, -1, -1)])[::-1]
+        # bit m - 2 - i marks the leading bit i for positive numbers,
+        # negative ones get ones from there
+        not_sign = carry.xor_one(sign)
+        y_bit_array = [T[m - 2]] + \
+            [carry.xor(carry.and_(not_sign, T[i + 1]), T[i]) \
+                 for i in range(m - 3, -1, -1)] + [sign]
 
-        e_bitrec(res, ring_size, *y_bit_array)
+        e_sbitrec(res, m, *y_bit_array)
 
         return res
 
@@ -2227,10 +1627,15 @@ class sgf2n(_secret, _gf2n):
 
     @vectorize
     def e_bit_inject(self):
-        res = [sint()]
-        # res = sint()
-        e_bitinj(self, *res)
-        return res[0]
+        """ Share mod 2^n of the bit. The conversion is done once per
+        basic block, however often the bit is used. """
+        injections = program.curr_block.bit_injections
+        if id(self) not in injections:
+            res = sint()
+            e_bitinj(self, res)
+            # keeping the bit prevents its id from being reused
+            injections[id(self)] = self, res
+        return injections[id(self)][1]
 
     @vectorize
     def ge_get_input_from_file(self, p_id, num_token):
@@ -2244,84 +1649,142 @@ class sgf2n(_secret, _gf2n):
 
         return a
 
+    @vectorize
+    def e_bit_inject_mul(self, other):
+        """ Product of the bit converted to mod 2^n and a sint, in the
+        same two rounds as the conversion alone. This only pays off if
+        other is known about as early as the bit, otherwise convert
+        first and multiply when other is ready. """
+        if id(self) in program.curr_block.bit_injections or \
+                not isinstance(other, sint):
+            return self.e_bit_inject() * other
+        res = sint()
+        e_bitinj_mul(self, other, res)
+        return res
+
+    @classmethod
+    def e_bit_inject_list(cls, bits):
+        """ Convert a list of bits to shares mod 2^n with one vector
+        instruction, that is, in two rounds whatever the length. """
+        bits = list(bits)
+        vector = cls(size=len(bits))
+        for i,bit in enumerate(bits):
+            gmovs(vector[i], bit)
+        injected = vector.e_bit_inject()
+        res = [sint() for bit in bits]
+        for i,value in enumerate(res):
+            movs(value, injected[i])
+        return res
+
+    @vectorize
     def if_else(self, a, b):
-        inj_res = [sint()]
-        tmp_res = sint()
-        ans = sint()
-        e_bitinj(self, *inj_res)
-        diff = sint()
-        if isinstance(a, sint):
-            if isinstance(b, sint):
-                subs(diff, a, b)
-                e_startmult(inj_res[0], diff)
-                e_stopmult(tmp_res)
-                adds(ans, tmp_res, b)
-                return ans
-            elif isinstance(b, cint):
-                subml(diff, a, b)
-                e_startmult(inj_res[0], diff)
-                e_stopmult(tmp_res)
-                addm(ans, tmp_res, b)
-                return ans
-            elif isinstance(b, int):
-                cast_b = cint(b)
-                subml(diff, a, cast_b)
-                e_startmult(inj_res[0], diff)
-                e_stopmult(tmp_res)
-                addm(ans, tmp_res, cast_b)
-                return ans
-            else:
-                raise NotImplementedError()
-        elif isinstance(a, cint):
-            if isinstance(b, sint):
-                submr(diff, a, b)
-                e_startmult(inj_res[0], diff)
-                e_stopmult(tmp_res)
-                adds(ans, tmp_res, b)
-                return ans
-            elif isinstance(b, cint):
-                c_diff = cint()
-                subc(c_diff, a, b)
-                mulm(tmp_res, inj_res[0], c_diff)
-                addm(ans, tmp_res, b)
-                return ans
-            elif isinstance(b, int):
-                cast_b = cint(b)
-                c_diff = cint()
-                subc(c_diff, a, cast_b)
-                mulm(tmp_res, inj_res[0], c_diff)
-                addm(ans, tmp_res, cast_b)
-                return ans
-            else:
-                raise NotImplementedError()
-        elif isinstance(a, int):
-            cast_a = cint(a)
-            if isinstance(b, sint):
-                submr(diff, cast_a, b)
-                e_startmult(inj_res[0], diff)
-                e_stopmult(tmp_res)
-                adds(ans, tmp_res, b)
-                return ans
-            elif isinstance(b, cint):
-                c_diff = cint()
-                subc(c_diff, cast_a, b)
-                mulm(tmp_res, inj_res[0], c_diff)
-                addm(ans, tmp_res, b)
-                return ans
-            elif isinstance(b, int):
-                cast_b = cint(b)
-                c_diff = cint()
-                subc(c_diff, cast_a, cast_b)
-                mulm(tmp_res, inj_res[0], c_diff)
-                addm(ans, tmp_res, cast_b)
-                return ans
-            else:
-                raise NotImplementedError()
+        """ a if the bit is one and b otherwise, for sint, cint or int
+        a and b """
+        if isinstance(a, (int, long)):
+            a = cint(a)
+        if isinstance(b, (int, long)):
+            b = cint(b)
+        if not isinstance(a, (sint, cint)) or not isinstance(b, (sint, cint)):
+            raise NotImplementedError()
+        # converting before a - b is known keeps the conversion out of
+        # the critical path when the bit is ready first
+        return self.e_bit_inject() * (a - b) + b
 
 sint.basic_type = sint
 sgf2n.basic_type = sgf2n
 
 
+class sbitvec(object):
+    """ Up to 64 secret bits in the lanes of one sgf2n vector register,
+    for example the bits of a share mod 2^64. XOR, AND and NOT act on all
+    lanes with one instruction, and e_bitdec and e_bitrec read and write
+    the lanes directly. The runtime keeps every share mod 2 as one bit
+    per batch element, so an AND of n lanes sends n bits. """
+    __slots__ = ['v']
+    max_length = 64
+
+    def __init__(self, value=None, length=None):
+        """ value is a list of bits (sgf2n or registers), an sgf2n
+        vector or None for length lanes to be written later. """
+        if isinstance(value, (list, tuple)):
+            length = len(value)
+        elif value is not None:
+            length = value.size
+        if length is None or not 0 < length <= self.max_length:
+            raise CompilerError('sbitvec needs 1 to %d lanes' % \
+                                    self.max_length)
+        if isinstance(value, sgf2n):
+            self.v = value
+        else:
+            self.v = sgf2n(size=length)
+        if isinstance(value, (list, tuple)):
+            for i,bit in enumerate(value):
+                gmovs(self.v[i], bit)
+
+    @classmethod
+    def from_sint(cls, x, n=64):
+        """ Lowest n bits of a scalar sint, see e_bitdec. """
+        res = cls(length=n)
+        e_bitdec(x, n, *res.bits())
+        return res
+
+    def to_sint(self):
+        """ Unsigned share mod 2^64 of the lanes, see e_bitrec. """
+        res = sint()
+        e_bitrec(res, len(self), *self.bits())
+        return res
+
+    def bits(self):
+        """ Lanes as scalar registers, least significant first. """
+        return [self.v[i] for i in range(len(self))]
+
+    @property
+    def size(self):
+        return self.v.size
+
+    def __len__(self):
+        return self.v.size
+
+    def _check(self, other):
+        if len(self) != len(other):
+            raise CompilerError('Different numbers of lanes: %d, %d' % \
+                                    (len(self), len(other)))
+
+    @vectorize
+    def __xor__(self, other):
+        if not isinstance(other, sbitvec):
+            return NotImplemented
+        self._check(other)
+        res = sgf2n()
+        gadds(res, self.v, other.v)
+        return sbitvec(res)
+
+    @vectorize
+    def __and__(self, other):
+        if not isinstance(other, sbitvec):
+            return NotImplemented
+        self._check(other)
+        res = sgf2n()
+        ge_startmult(self.v, other.v)
+        ge_stopmult(res)
+        return sbitvec(res)
+
+    @vectorize
+    def __invert__(self):
+        res = sgf2n()
+        gaddsi(res, self.v, 1)
+        return sbitvec(res)
+
+    def __or__(self, other):
+        if not isinstance(other, sbitvec):
+            return NotImplemented
+        return self ^ other ^ (self & other)
+
+    def reveal(self):
+        """ The lanes in a cgf2n vector. """
+        return self.v.reveal()
+
+
 class sgf2nint(sgf2n):
     bits = None
 
@@ -2638,6 +2101,25 @@ def parse_type(other):
     else:
         return other
 
+def round_fixed_product(product, f, k):
+    """ Product of two fixed-point numbers with f fractional bits
+    rounded to f fractional bits, assuming that it fits into k bits. """
+    n = 64
+    w = sint()
+    val = sint()
+    addsi(w, product, 2 ** (f - 1))
+    if trunc.variant != 'exact':
+        # see trunc.py
+        trunc.trunc(val, w, f, k)
+        return val
+    bit_array = [sgf2n() for _ in range(n)]
+    e_bitdec(w, n, *bit_array)
+    if carry.short_fixed_rec():
+        e_sbitrec(val, k - f, *bit_array[f:k])
+    else:
+        e_bitrec(val, n, *(bit_array[f:] + [bit_array[k - 1]] * f))
+    return val
+
 class cfix(_number):
     """ Clear fixed point type. """
     __slots__ = ['value', 'f', 'k', 'size']
@@ -2690,18 +2172,23 @@ class cfix(_number):
         f = self.f
         k = self.k
         self.size = get_global_vector_size()
+        # value known at compile time, see division.py
+        self.public_value = None
         if isinstance(v, cint):
             self.v = cint(v,size=self.size)
         elif isinstance(v, cfix.scalars):
             self.v = cint(int(round(v * (2 ** f))),size=self.size)
+            self.public_value = v
         elif isinstance(v, cfix):
             self.v = v.v
+            self.public_value = v.public_value
         elif isinstance(v, MemValue):
             self.v = v
 
     @vectorize
     def load_int(self, v):
         self.v = cint(v) * (2 ** self.f)
+        self.public_value = v if isinstance(v, (int, long)) else None
 
     def store_in_mem(self, address):
         self.v.store_in_mem(address)
@@ -2761,24 +2248,9 @@ class cfix(_number):
             # return res
             # original (end)
             # parallel (i.e., round optimized)
-            n = 64
             part_of_w = sint()
-            w = sint()
-            val = sint()
-            bit_array = [sgf2n() for _ in range(n)]
-            tmp_array = [sgf2n() for _ in range(n)]
-            d = self.k - self.f
-
             mulm(part_of_w, other.v, self.v)
-            addsi(w, part_of_w, 2 ** (self.f - 1))
-            e_bitdec(w, n, *bit_array)
-            for i in range(n):
-                if i <= n - self.f - 1:
-                    tmp_array[i] = bit_array[i + self.f]
-                else:
-                    tmp_array[i] = bit_array[d + self.f - 1]
-            e_bitrec(val, n, *tmp_array)
-            return sfix(val)
+            return sfix(round_fixed_product(part_of_w, self.f, self.k))
         else:
             raise CompilerError('Invalid type %s for cfix.__mul__' % type(other))
     
@@ -2919,11 +2391,14 @@ class sfix(_number):
         k = self.k
         # warning: don't initialize a sfix from a sint, this is only used in internal methods;
         # for external initialization use load_int.
+        # value known at compile time, see division.py
+        self.public_value = None
         if isinstance(_v, sint):
             self.v = _v
         elif isinstance(_v, cfix.scalars):
             # self.v = sint(_v)
             self.v = sint(int(round(_v * (2 ** f))), size=self.size)
+            self.public_value = _v
         elif isinstance(_v, sfloat):
             p = (f + _v.p)
             b = (p >= 0)
@@ -2931,6 +2406,7 @@ class sfix(_number):
             self.v = (1-2*_v.s)*a
         elif isinstance(_v, sfix):
             self.v = _v.v
+            self.public_value = _v.public_value
         elif isinstance(_v, MemFix):
             #this is a memvalue object
             self.v = _v.v
@@ -2941,6 +2417,7 @@ class sfix(_number):
     @vectorize
     def load_int(self, v):
         self.v = sint(v) * (2**self.f)
+        self.public_value = v if isinstance(v, (int, long)) else None
 
     def store_in_mem(self, address):
         self.v.store_in_mem(address)
@@ -2961,7 +2438,6 @@ class sfix(_number):
 
     @vectorize 
     def mul(self, other):
-        n = 64
         other = parse_type(other)
         # original (start)
         # if isinstance(other, (sfix, cfix)):
@@ -2977,66 +2453,31 @@ class sfix(_number):
         # ADDED (start)
         if isinstance(other, sfix):
             part_of_w = sint()
-            w = sint()
-            val = sint()
-            bit_array = [sgf2n() for _ in range(n)]
-            tmp_array = [sgf2n() for _ in range(n)]
-            d = self.k - self.f
-
             muls(part_of_w, self.v, other.v)
-            addsi(w, part_of_w, 2 ** (self.f - 1))
-
-            e_bitdec(w, n, *bit_array)
-
-            for i in range(n):
-                if i <= n - self.f - 1:
-                    tmp_array[i] = bit_array[i + self.f]
-                else:
-                    tmp_array[i] = bit_array[d + self.f - 1]
-
-            e_bitrec(val, n, *tmp_array)
-            return sfix(val)
+            return sfix(round_fixed_product(part_of_w, self.f, self.k))
         elif isinstance(other, cfix):
             part_of_w = sint()
-            w = sint()
-            val = sint()
-            bit_array = [sgf2n() for _ in range(n)]
-            tmp_array = [sgf2n() for _ in range(n)]
-            d = self.k - self.f
-
             mulm(part_of_w, self.v, other.v)
-            addsi(w, part_of_w, 2 ** (self.f - 1))
-            e_bitdec(w, n, *bit_array)
-            for i in range(n):
-                if i <= n - self.f - 1:
-                    tmp_array[i] = bit_array[i + self.f]
-                else:
-                    tmp_array[i] = bit_array[d + self.f - 1]
-            e_bitrec(val, n, *tmp_array)
-            return sfix(val)
+            return sfix(round_fixed_product(part_of_w, self.f, self.k))
         elif isinstance(other, cfix.scalars):
             scalar_fix = cfix(other)
             part_of_w = sint()
-            w = sint()
-            val = sint()
-            bit_array = [sgf2n() for _ in range(n)]
-            tmp_array = [sgf2n() for _ in range(n)]
-            d = self.k - self.f
-
             mulm(part_of_w, self.v, scalar_fix.v)
-            addsi(w, part_of_w, 2 ** (self.f - 1))
-            e_bitdec(w, n, *bit_array)
-            for i in range(n):
-                if i <= n - self.f - 1:
-                    tmp_array[i] = bit_array[i + self.f]
-                else:
-                    tmp_array[i] = bit_array[d + self.f - 1]
-            e_bitrec(val, n, *tmp_array)
-            return sfix(val)
+            return sfix(round_fixed_product(part_of_w, self.f, self.k))
         else:
             raise CompilerError('Invalid type %s for sfix.__mul__' % type(other))
         # ADDED (end)
 
+    @classmethod
+    def dot(cls, a, b):
+        """ Sum of the products of two lists with a dot product of the
+        representations (see sint.dot()) and one truncation. The sum
+        must fit wherever a single product does. """
+        a = [parse_type(x) for x in a]
+        b = [parse_type(x) for x in b]
+        prod = sint.conv(sint.dot([x.v for x in a], [x.v for x in b]))
+        return sfix(round_fixed_product(prod, cls.f, cls.k))
+
     @vectorize 
     def __sub__(self, other):
         other = parse_type(other)
@@ -3059,63 +2500,8 @@ class sfix(_number):
         #     raise NotImplementedError
         # original (end)
 
-        ring_size = 64
-
-        step = self.k
-        tmp = sint()
-
-        bit_array = [sgf2n() for _ in range(ring_size)]
-        op_bit_array = [sgf2n() for _ in range(step)]
-
         # BIU-NEC_eq
-        other = parse_type(other)
-        if isinstance(other, sfix):
-            subs(tmp, self.v, other.v)
-            e_bitdec(tmp, ring_size, *bit_array)
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-            # minimize communication rounds (when n - 1 round bit-decomposition is used)
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-            # return tmp_bit_array[step - 1]
-            res = tmp_bit_array[step - 1].e_bit_inject()
-        elif isinstance(other, cfix):
-            subml(tmp, self.v, other.v)
-            e_bitdec(tmp, ring_size, *bit_array)
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-            # minimize communication rounds (when n - 1 round bit-decomposition is used)
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-            # return tmp_bit_array[step - 1]
-            res = tmp_bit_array[step - 1].e_bit_inject()
-        elif isinstance(other, int):
-            other_val = cfix(other)
-            subml(tmp, self.v, other_val.v)
-            e_bitdec(tmp, ring_size, *bit_array)
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-            # minimize communication rounds (when n - 1 round bit-decomposition is used)
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-            # return tmp_bit_array[step - 1]
-            res = tmp_bit_array[step - 1].e_bit_inject()
-        else:
-            raise NotImplementedError
-
-        return res
+        return self.equal_bit(other).e_bit_inject()
 
     @vectorize
     def __le__(self, other):
@@ -3128,98 +2514,9 @@ class sfix(_number):
         # original (end)
 
         # BIU-NEC_le
-        ring_size = 64
-        other = parse_type(other)
-        step = self.k
-        tmp = sint()
-        bit_array_sub = [sgf2n() for _ in range(ring_size)]
-
-        # signed ver. (start)
-        prod_left = sgf2n()
-        prod_right = sgf2n()
-        prod = sgf2n()
-        ans = sgf2n()
-        bit_array_self = [sgf2n() for _ in range(ring_size)]
-        bit_array_other = [sgf2n() for _ in range(ring_size)]
-        # signed ver. (end)
-
-        if isinstance(other, sfix):
-            subs(tmp, other.v, self.v)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, step, *bit_array_self)
-            e_bitdec(other.v, step, *bit_array_other)
-            gadds(prod_left, bit_array_self[step - 1], bit_array_other[step - 1])
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_other[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-
-            # gaddsi(bit_res, bit_array[step - 1], 1)
-            # res = bit_res.e_bit_inject()
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            res = bit_res.e_bit_inject()
-            # signed ver. (end)
-
-        elif isinstance(other, cfix):
-            submr(tmp, other.v, self.v)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, step, *bit_array_self)
-            sign = cgf2n(other.v >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gaddm(prod_right, bit_array_sub[step - 1], sign)
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-
-            # gaddsi(bit_res, bit_array[step - 1], 1)
-            # res = bit_res.e_bit_inject()
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            res = bit_res.e_bit_inject()
-            # signed ver. (end)
-
-        elif isinstance(other, int):
-            other_val = cgf2n(other)
-            submr(tmp, other_val, self.v)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, step, *bit_array_self)
-            sign = cgf2n(other_val >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gaddm(prod_right, bit_array_sub[step - 1], sign)
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-
-            # gaddsi(bit_res, bit_array[step - 1], 1)
-            # res = bit_res.e_bit_inject()
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            res = bit_res.e_bit_inject()
-            # signed ver. (end)
-
-        else:
-            raise NotImplementedError
-
-        return res
+        bit_res = sgf2n()
+        gaddsi(bit_res, self.less_than_bit(other, True), 1)
+        return bit_res.e_bit_inject()
 
     @vectorize 
     def __lt__(self, other):
@@ -3232,85 +2529,7 @@ class sfix(_number):
         # original (end)
 
         # BIU-NEC_lt
-        ring_size = 64
-        other = parse_type(other)
-
-        step = self.k
-        tmp = sint()
-        bit_array_sub = [sgf2n() for _ in range(ring_size)]
-
-        # signed ver. (start)
-        prod_left = sgf2n()
-        prod_right = sgf2n()
-        prod = sgf2n()
-        ans = sgf2n()
-        bit_array_self = [sgf2n() for _ in range(ring_size)]
-        bit_array_other = [sgf2n() for _ in range(ring_size)]
-        # signed ver. (end)
-
-        if isinstance(other, sfix):
-            subs(tmp, self.v, other.v)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, ring_size, *bit_array_self)
-            e_bitdec(other.v, ring_size, *bit_array_other)
-            gadds(prod_left, bit_array_self[step - 1], bit_array_other[step - 1])
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            # result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-
-        elif isinstance(other, cfix):
-            subml(tmp, self.v, other.v)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, ring_size, *bit_array_self)
-            sign = cgf2n(other.v >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            # result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-        elif isinstance(other, int):
-            other_val = cgf2n(other)
-            subml(tmp, self.v, other_val)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, ring_size, *bit_array_self)
-            sign = cgf2n(other_val >> (step - 1))
-            gadds(prod_left, bit_array_self[step - 1], sign)
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            # result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-
-        else:
-            raise NotImplementedError
-        return result
+        return self.less_than_bit(other).e_bit_inject()
 
     @vectorize
     def __ge__(self, other):
@@ -3323,96 +2542,9 @@ class sfix(_number):
         # original (end)
 
         # BIU-NEC_ge
-        ring_size = 64
-        other = parse_type(other)
-        step = self.k
-
-        tmp = sint()
-        bit_array_sub = [sgf2n() for _ in range(ring_size)]
-
-        # signed ver. (start)
-        prod_left = sgf2n()
-        prod_right = sgf2n()
-        prod = sgf2n()
-        ans = sgf2n()
-        bit_array_self = [sgf2n() for _ in range(ring_size)]
-        bit_array_other = [sgf2n() for _ in range(ring_size)]
-        # signed ver. (end)
-
-        if isinstance(other, sfix):
-            subs(tmp, self.v, other.v)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, ring_size, *bit_array_self)
-            e_bitdec(other.v, ring_size, *bit_array_other)
-            gadds(prod_left, bit_array_self[step - 1], bit_array_other[step - 1])
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-            # gaddsi(bit_res, bit_array[step - 1], 1)
-            # res = bit_res.e_bit_inject()
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            res = bit_res.e_bit_inject()
-            # signed ver. (end)
-
-
-        elif isinstance(other, cfix):
-            subml(tmp, self.v, other.v)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, ring_size, *bit_array_self)
-            sign = cgf2n(other.v >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-            # gaddsi(bit_res, bit_array[step - 1], 1)
-            # res = bit_res.e_bit_inject()
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            res = bit_res.e_bit_inject()
-            # signed ver. (end)
-        elif isinstance(other, int):
-            other_val = cgf2n(other)
-            subml(tmp, self.v, other_val)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, ring_size, *bit_array_self)
-            sign = cgf2n(other_val >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_self[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            bit_res = sgf2n()
-            # gaddsi(bit_res, bit_array[step - 1], 1)
-            # res = bit_res.e_bit_inject()
-
-            # signed ver. (start)
-            gaddsi(bit_res, ans, 1)
-            res = bit_res.e_bit_inject()
-            # signed ver. (end)
-
-        else:
-            raise NotImplementedError
-
-        return res
+        bit_res = sgf2n()
+        gaddsi(bit_res, self.less_than_bit(other), 1)
+        return bit_res.e_bit_inject()
 
     @vectorize
     def __gt__(self, other):
@@ -3425,85 +2557,24 @@ class sfix(_number):
         # original (end)
 
         # BIU-NEC_gt
-        ring_size = 64
-        other = parse_type(other)
-        step = self.k
-        tmp = sint()
-        bit_array_sub = [sgf2n() for _ in range(ring_size)]
-
-        # signed ver. (start)
-        prod_left = sgf2n()
-        prod_right = sgf2n()
-        prod = sgf2n()
-        ans = sgf2n()
-        bit_array_self = [sgf2n() for _ in range(ring_size)]
-        bit_array_other = [sgf2n() for _ in range(ring_size)]
-        # signed ver. (end)
-
-        if isinstance(other, sfix):
-            subs(tmp, other.v, self.v)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, step, *bit_array_self)
-            e_bitdec(other.v, step, *bit_array_other)
-            gadds(prod_left, bit_array_self[step - 1], bit_array_other[step - 1])
-            gadds(prod_right, bit_array_sub[step - 1], bit_array_other[step - 1])
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
+        return self.less_than_bit(other, True).e_bit_inject()
 
-            #result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-
-        elif isinstance(other, cfix):
-            submr(tmp, other.v, self.v)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, step, *bit_array_self)
-            sign = cgf2n(other.v >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gaddm(prod_right, bit_array_sub[step - 1], sign)
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            #result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-
-        elif isinstance(other, int):
-            other_val = cgf2n(other)
-            submr(tmp, other_val, self.v)
-            e_bitdec(tmp, ring_size, *bit_array_sub)
-
-            # signed ver. (start)
-            e_bitdec(self.v, step, *bit_array_self)
-            sign = cgf2n(other_val >> (step - 1))
-            gaddm(prod_left, bit_array_self[step - 1], sign)
-            gaddm(prod_right, bit_array_sub[step - 1], sign)
-            ge_startmult(prod_left, prod_right)
-            ge_stopmult(prod)
-            gadds(ans, prod, bit_array_sub[step - 1])
-            # signed ver. (end)
-
-            # result = bit_array_sub[step - 1].e_bit_inject()
-
-            # signed ver. (start)
-            result = ans.e_bit_inject()
-            # signed ver. (end)
-        else:
+    def equal_bit(self, other):
+        """ Share mod 2 of self == other. """
+        other = parse_type(other)
+        if not isinstance(other, (sfix, cfix)):
             raise NotImplementedError
+        return equal_bit(self.v, other.v, self.k)
 
-        return result
+    def less_than_bit(self, other, swap=False):
+        """ Share mod 2 of self < other, or other < self with swap. """
+        other = parse_type(other)
+        if not isinstance(other, (sfix, cfix)):
+            raise NotImplementedError
+        if swap:
+            return signed_less_than(other.v, self.v, self.k)
+        else:
+            return signed_less_than(self.v, other.v, self.k)
 
     @vectorize
     def __ne__(self, other):
@@ -3515,230 +2586,197 @@ class sfix(_number):
         #     raise NotImplementedError
         # original (end)
 
-        # BIU-NEC_eq
-        ring_size = 64
-        step = self.k
-        tmp = sint()
+        # BIU-NEC_ne
         bit_res = sgf2n()
-        bit_array = [sgf2n() for _ in range(ring_size)]
-        op_bit_array = [sgf2n() for _ in range(step)]
-        other = parse_type(other)
-        if isinstance(other, sfix):
-            subs(tmp, self.v, other.v)
-            e_bitdec(tmp, ring_size, *bit_array)
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-            # minimize communication rounds
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-            gaddsi(bit_res, tmp_bit_array[step - 1], 1)
-            # return bit_res
-            res = bit_res.e_bit_inject()
-        elif isinstance(other, cfix):
-            subml(tmp, self.v, other.v)
-            e_bitdec(tmp, ring_size, *bit_array)
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-            # minimize communication rounds
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-            gaddsi(bit_res, tmp_bit_array[step - 1], 1)
-            # return bit_res
-            res = bit_res.e_bit_inject()
-        elif isinstance(other, int):
-            other_val = cfix(other)
-            subml(tmp, self.v, other_val.v)
-            e_bitdec(tmp, ring_size, *bit_array)
-            for i in range(step):
-                gaddsi(op_bit_array[i], bit_array[i], 1)
-            # minimize communication rounds
-            tmp_bit_array = [sgf2n() for _ in range(step)]
-            ge_startmult(op_bit_array[0], op_bit_array[1])
-            ge_stopmult(tmp_bit_array[1])
-            for i in range(2, step):
-                ge_startmult(op_bit_array[i], tmp_bit_array[i - 1])
-                ge_stopmult(tmp_bit_array[i])
-            gaddsi(bit_res, tmp_bit_array[step - 1], 1)
-            # return bit_res
-            res = bit_res.e_bit_inject()
-        else:
-            raise NotImplementedError
-
-        return res
+        gaddsi(bit_res, self.equal_bit(other), 1)
+        return bit_res.e_bit_inject()
 
     @vectorize
     def __div__(self, other):
         other = parse_type(other)
+        if isinstance(other, (sfix, cfix)) and \
+                other.public_value is not None:
+            return self.div_public(other.public_value)
         if isinstance(other, sfix):
             # original (start)
             # return sfix(library.FPDiv(self.v, other.v, self.k, self.f, self.kappa))
             # original (end)
+            return self * other.compute_reciprocal()
+        elif isinstance(other, cfix):
+            # original (start)
+            # return sfix(library.sint_cint_division(self.v, other.v, self.k, self.f, self.kappa))
+            # original (end)
+            # 2^(2f) / other.v in the clear, signed as the ring is mapped
+            # to signed integers
+            reciprocal = cint(regint(2 ** (2 * self.f)) / regint(other.v))
+            prod = sint()
+            mulm(prod, self.v, reciprocal)
+            return sfix(round_fixed_product(prod, self.f, self.k))
+        else:
+            raise TypeError('Incompatible fixed point types in division')
 
-            # f = 16, d = 32, n = 64
+    def div_public(self, divisor):
+        """ Division by a number known at compile time, see division.py """
+        if divisor == 0:
+            raise CompilerError('Division by zero')
+        r, m, k = division.public_reciprocal(divisor, self.f, self.k)
+        prod = sint()
+        mulm(prod, self.v, cint(r))
+        return sfix(round_fixed_product(prod, m, k))
 
-            d = self.k - self.f
-            f = self.f
+    @vectorize
+    def compute_reciprocal(self):
+        """ Reciprocal by Goldschmidt iterations, reused for the same
+        register where possible, see division.py. """
+        res = division.cached_reciprocal(self.v)
+        if res is not None:
+            return sfix(res)
+        # f = 16, d = 32, n = 64
+
+        d = self.k - self.f
+        f = self.f
 
-            # DEBUG (start)
-            # print("d:%d" % d)
-            # print("f:%d" % f)
-            # DEBUG (end)
+        # DEBUG (start)
+        # print("d:%d" % d)
+        # print("f:%d" % f)
+        # DEBUG (end)
 
-            T = int(math.floor(math.log((d+f), 2)))
+        T = division.n_iterations(d+f)
+
+        # test for accuracy (start)
+        # T = int(math.floor(math.log((d + 2*f), 2)))
+        # T = d + f
+        # T = d + 2 * f
+        # test for accuracy (end)
+
+        d_dash = int(math.floor(d/2))
+        w = sint()
+        prod = sint()
+        eta = [sint() for _ in range(T+1)]
+        eta_dash = [sint() for _ in range(T+1)]
+        pi = [sint() for _ in range(T+1)]
+        w_dot_pi_0 = sint()
+        v = [sint() for _ in range(T+1)]
+        v_dash = [sint() for _ in range(T+1)]
+        z = sint()
 
-            # test for accuracy (start)
-            # T = int(math.floor(math.log((d + 2*f), 2)))
-            # T = d + f
-            # T = d + 2 * f
-            # test for accuracy (end)
+        # DEBUG (start)
+        # clear_v = cint()
+        # clear_w = cint()
+        # clear_prod = cint()
+        # clear_eta = [cint() for _ in range(T + 1)]
+        # clear_eta_dash = [cint() for _ in range(T + 1)]
+        # clear_pi = [cint() for _ in range(T + 1)]
+        # #clear_w_dot_pi_0 = sint()
+        # clear_V = [cint() for _ in range(T + 1)]
+        # clear_V_dash = [cint() for _ in range(T + 1)]
+        # DEBUG (end)
 
-            d_dash = int(math.floor(d/2))
-            w = sint()
-            prod = sint()
-            eta = [sint() for _ in range(T+1)]
-            eta_dash = [sint() for _ in range(T+1)]
-            pi = [sint() for _ in range(T+1)]
-            w_dot_pi_0 = sint()
-            v = [sint() for _ in range(T+1)]
-            v_dash = [sint() for _ in range(T+1)]
-            z = sint()
+        w = self.v.e_reci_appro(d_dash+f)
+        # DEBUG (start)
+        # startopen(self.v)
+        # stopopen(clear_v)
+        # print_char4("othe")
+        # print_char4("r.v:")
+        # print_reg_plain(clear_v)
+        # print_char('\n')
+        #
+        # startopen(w)
+        # stopopen(clear_w)
+        # print_char4("w:")
+        # print_reg_plain(clear_w)
+        # print_char('\n')
+        # DEBUG (end)
+
+        constant = cint(2**(d_dash+f-1))
+
+        e_startmult(self.v, w)
+        e_stopmult(prod)
+        submr(eta[0], constant, prod)
+        addm(pi[0], eta[0], constant)
+
+        # DEBUG (start)
+        # startopen(prod)
+        # stopopen(clear_prod)
+        # print_char4("prod")
+        # print_char4(":")
+        # print_reg_plain(clear_prod)
+        # print_char('\n')
+        #
+        # startopen(eta[0])
+        # stopopen(clear_eta[0])
+        # print_char4("eta0")
+        # print_char4(":")
+        # print_reg_plain(clear_eta[0])
+        # print_char('\n')
+        #
+        # print_char4("cons")
+        # print_char4(":")
+        # print_reg_plain(constant)
+        # print_char('\n')
+        #
+        # startopen(pi[0])
+        # stopopen(clear_pi[0])
+        # print_char4("pi0")
+        # print_char4(":")
+        # print_reg_plain(clear_pi[0])
+        # print_char('\n')
+        # DEBUG (end)
+
+        for k in range(1,T+1):
+            e_startmult(eta[k-1], eta[k-1])
+            e_stopmult(eta_dash[k])
+            eta[k] = eta_dash[k].e_round_and_extend(d_dash+f-1)
 
             # DEBUG (start)
-            # clear_v = cint()
-            # clear_w = cint()
-            # clear_prod = cint()
-            # clear_eta = [cint() for _ in range(T + 1)]
-            # clear_eta_dash = [cint() for _ in range(T + 1)]
-            # clear_pi = [cint() for _ in range(T + 1)]
-            # #clear_w_dot_pi_0 = sint()
-            # clear_V = [cint() for _ in range(T + 1)]
-            # clear_V_dash = [cint() for _ in range(T + 1)]
+            # startopen(eta[k])
+            # stopopen(clear_eta[k])
+            # print_char4("eta"+str(k))
+            # print_char4(":")
+            # print_reg_plain(clear_eta[k])
+            # print_char('\n')
             # DEBUG (end)
 
-            w = other.v.e_reci_appro(d_dash+f)
+            addm(pi[k], eta[k], constant)
+
             # DEBUG (start)
-            # startopen(other.v)
-            # stopopen(clear_v)
-            # print_char4("othe")
-            # print_char4("r.v:")
-            # print_reg_plain(clear_v)
-            # print_char('\n')
-            #
-            # startopen(w)
-            # stopopen(clear_w)
-            # print_char4("w:")
-            # print_reg_plain(clear_w)
+            # startopen(pi[k])
+            # stopopen(clear_pi[k])
+            # print_char4("pi"+str(k))
+            # print_char4(":")
+            # print_reg_plain(clear_pi[k])
             # print_char('\n')
             # DEBUG (end)
 
-            constant = cint(2**(d_dash+f-1))
+        e_startmult(w, pi[0])
+        e_stopmult(w_dot_pi_0)
+        v_dash[0] = w_dot_pi_0
 
-            e_startmult(other.v, w)
-            e_stopmult(prod)
-            submr(eta[0], constant, prod)
-            addm(pi[0], eta[0], constant)
+        for k in range(1, T+1):
+            v[k - 1] = v_dash[k - 1].e_round_and_extend(d_dash + f - 1)
+            e_startmult(v[k - 1], pi[k])
+            e_stopmult(v_dash[k])
 
             # DEBUG (start)
-            # startopen(prod)
-            # stopopen(clear_prod)
-            # print_char4("prod")
-            # print_char4(":")
-            # print_reg_plain(clear_prod)
-            # print_char('\n')
-            #
-            # startopen(eta[0])
-            # stopopen(clear_eta[0])
-            # print_char4("eta0")
-            # print_char4(":")
-            # print_reg_plain(clear_eta[0])
-            # print_char('\n')
-            #
-            # print_char4("cons")
+            # startopen(v[k - 1])
+            # stopopen(clear_V[k - 1])
+            # print_char4("v"+str(k - 1))
             # print_char4(":")
-            # print_reg_plain(constant)
+            # print_reg_plain(clear_V[k - 1])
             # print_char('\n')
             #
-            # startopen(pi[0])
-            # stopopen(clear_pi[0])
-            # print_char4("pi0")
+            # startopen(v_dash[k])
+            # stopopen(clear_V_dash[k])
+            # print_char4("v_da")
+            # print_char4("sh" + str(k))
             # print_char4(":")
-            # print_reg_plain(clear_pi[0])
+            # print_reg_plain(clear_V_dash[k])
             # print_char('\n')
             # DEBUG (end)
 
-            for k in range(1,T+1):
-                e_startmult(eta[k-1], eta[k-1])
-                e_stopmult(eta_dash[k])
-                eta[k] = eta_dash[k].e_round_and_extend(d_dash+f-1)
-
-                # DEBUG (start)
-                # startopen(eta[k])
-                # stopopen(clear_eta[k])
-                # print_char4("eta"+str(k))
-                # print_char4(":")
-                # print_reg_plain(clear_eta[k])
-                # print_char('\n')
-                # DEBUG (end)
-
-                addm(pi[k], eta[k], constant)
-
-                # DEBUG (start)
-                # startopen(pi[k])
-                # stopopen(clear_pi[k])
-                # print_char4("pi"+str(k))
-                # print_char4(":")
-                # print_reg_plain(clear_pi[k])
-                # print_char('\n')
-                # DEBUG (end)
-
-            e_startmult(w, pi[0])
-            e_stopmult(w_dot_pi_0)
-            v_dash[0] = w_dot_pi_0
-
-            for k in range(1, T+1):
-                v[k - 1] = v_dash[k - 1].e_round_and_extend(d_dash + f - 1)
-                e_startmult(v[k - 1], pi[k])
-                e_stopmult(v_dash[k])
-
-                # DEBUG (start)
-                # startopen(v[k - 1])
-                # stopopen(clear_V[k - 1])
-                # print_char4("v"+str(k - 1))
-                # print_char4(":")
-                # print_reg_plain(clear_V[k - 1])
-                # print_char('\n')
-                #
-                # startopen(v_dash[k])
-                # stopopen(clear_V_dash[k])
-                # print_char4("v_da")
-                # print_char4("sh" + str(k))
-                # print_char4(":")
-                # print_reg_plain(clear_V_dash[k])
-                # print_char('\n')
-                # DEBUG (end)
-
-            z = v_dash[T].e_round_and_extend((2 * d_dash) - 2)
-            ans = self * sfix(z)
-            return ans
-        elif isinstance(other, cfix):
-            # original (start)
-            # return sfix(library.sint_cint_division(self.v, other.v, self.k, self.f, self.kappa))
-            # original (end)
-            raise NotImplementedError
-        else:
-            raise TypeError('Incompatible fixed point types in division')
-
-    @vectorize
-    def compute_reciprocal(self):
-        return sfix(library.FPDiv(cint(2) ** self.f, self.v, self.k, self.f, self.kappa, True))
+        z = v_dash[T].e_round_and_extend((2 * d_dash) - 2)
+        division.cache_reciprocal(self.v, z)
+        return sfix(z)
 
     def reveal(self):
         val = self.v.reveal()
@@ -4629,7 +3667,14 @@ class Array(object):
                 raise IndexError('index %s, length %s' % \
                                      (str(index), str(self.length)))
         if (program.curr_block, index) not in self.address_cache:
-            self.address_cache[program.curr_block, index] = self.address + index
+            address = self.address + index
+            if isinstance(address, Tape.Register) and \
+                    isinstance(self.address, (int, long)) and \
+                    self.length is not None:
+                # the alias analysis assumes the index to be in range
+                program.curr_tape.address_bounds[id(address)] = \
+                    address, self.address, self.length
+            self.address_cache[program.curr_block, index] = address
         return self.address_cache[program.curr_block, index]
 
     def get_slice(self, index):
@@ -4702,6 +3747,61 @@ class Array(object):
         e_bitrec(res, self.length, *a)
         return res
 
+    def oblivious_get(self, index):
+        """ Element of a sint array at a secret index, see
+        library.oblivious_get(). """
+        return library.oblivious_get(self._values(), index)
+
+    def oblivious_set(self, index, value):
+        """ Set the element of a sint array at a secret index in
+        [0, length) like in library.oblivious_get(). """
+        if self.length == 1:
+            self[0] = value
+            return
+        old = self._values()
+        value = sint.conv(value)
+        new = sint(size=self.length)
+        for i in range(self.length):
+            movs(new[i], value)
+        prods = sint(size=self.length)
+        ve_bitinj_mul(self.length, library.one_hot(index, self.length),
+                      new - old, prods)
+        (old + prods).store_in_mem(self.address)
+
+    def dot(self, other):
+        """ Sum of the products with another array or list of the same
+        length, see sint.dot(). """
+        if len(other) != self.length:
+            raise CompilerError('Dot product of arrays of different lengths')
+        if self.value_type is sint:
+            return sint.dot(list(self), list(other))
+        return sum(x * y for x,y in zip(self, other))
+
+    def get_vector(self):
+        """ All elements in one vector register. """
+        return self.value_type.load_mem(self.address, size=self.length)
+
+    def assign_vector(self, vector):
+        """ Store a vector register of the same length. """
+        if vector.size != self.length:
+            raise CompilerError('Length mismatch between array and vector')
+        vector.store_in_mem(self.address)
+
+    def _values(self):
+        if self.value_type is not sint:
+            raise CompilerError('Oblivious access needs a sint array')
+        return sint.load_mem(self.address, size=self.length)
+
+    def e_bit_inject(self):
+        """ Convert an array of sgf2n to an array of sint with one vector
+        instruction, that is, in two rounds whatever the length. """
+        if self.value_type is not sgf2n:
+            raise CompilerError('Bit injection needs an sgf2n array')
+        res = Array(self.length, sint)
+        bits = sgf2n.load_mem(self.address, size=self.length)
+        bits.e_bit_inject().store_in_mem(res.address)
+        return res
+
 sint.dynamic_array = Array
 sgf2n.dynamic_array = Array
 
@@ -5046,6 +4146,13 @@ class sfixArray(Array):
     def get_address(self, index):
         return self.array.get_address(index)
 
+    def get_vector(self):
+        """ All elements as one sfix vector, see mpc_math.py. """
+        return sfix(self.array.get_vector())
+
+    def assign_vector(self, vector):
+        self.array.assign_vector(vector.v)
+
 class sfixMatrix(Matrix):
     def __init__(self, rows, columns, address=None):
         self.rows = rows
@@ -282,6 +282,8 @@ void BaseInstruction::parse_operands(istream& s, int pos)
       case WRITEFILESHARE:
       case E_STARTMULT:
       case E_STOPMULT:
+      case E_STARTDOTPROD:
+      case E_STOPDOTPROD:
       case GE_STARTMULT:
       case GE_STOPMULT:
         num_var_args = get_int(s);
@@ -1921,6 +1923,12 @@ void Instruction::execute(Processor& Proc) const
       case E_STOPMULT:
       	Proc.Ext_Mult_Stop(start, size);
       	break;
+      case E_STARTDOTPROD:
+    	Proc.Ext_DotProd_Start(start, size);
+    	break;
+      case E_STOPDOTPROD:
+      	Proc.Ext_DotProd_Stop(start, size);
+      	break;
       case GE_STARTMULT:
     	Proc.Ext_BMult_Start(start, size);
     	break;
@@ -270,6 +270,8 @@ enum
 //	E_STOP_MULT = 0x20A,
 	E_STARTMULT = 0x40,
 	E_STOPMULT = 0x41,
+	E_STARTDOTPROD = 0x44,
+	E_STOPDOTPROD = 0x45,
 	GE_STARTMULT = 0x140,
 	GE_STOPMULT = 0x141,
 	E_START_OPEN = 0x20B,
@@ -1475,15 +1475,18 @@ void Processor::Ext_Mult_Start(const vector<int>& reg, int size)
 //		rhs_factors.push_back(*curr++);
 //	}
 
-	if (lhs_factors_ring.size() != (uint32_t)(sz/2)) {
-		lhs_factors_ring.resize(sz/2);
-		rhs_factors_ring.resize(sz/2);
+	int n_mult = sz * size / 2;
+	if (lhs_factors_ring.size() != (uint32_t)n_mult) {
+		lhs_factors_ring.resize(n_mult);
+		rhs_factors_ring.resize(n_mult);
 		mult_allocate(lhs_factors_ring.size());
 	}
 
-	for (int i=0; i<sz/2; i++) {
-		lhs_factors_ring[i] = Sh_PO[2*i];
-		rhs_factors_ring[i] = Sh_PO[2*i+1];
+	// factors of vector registers are multiplied element by element
+	for (int i=0; i<sz/2; i++)
+	  for (int j=0; j<size; j++) {
+		lhs_factors_ring[i*size+j] = Sh_PO[2*i*size+j];
+		rhs_factors_ring[i*size+j] = Sh_PO[(2*i+1)*size+j];
 	}
 
 	export_shares(lhs_factors_ring, mult_factor1);
@@ -1532,15 +1535,18 @@ void Processor::Ext_BMult_Start(const vector<int>& reg, int size)
 //	vector< Share<gf2n> > lhs_factors, rhs_factors;
 //	vector< Share<gf2n> >::const_iterator curr = Sh_PO.begin(), stop = Sh_PO.end();
 
-	if (lhs_factors_bit.size() != (uint32_t)(sz/2)) {
-		lhs_factors_bit.resize(sz/2);
-		rhs_factors_bit.resize(sz/2);
+	int n_mult = sz * size / 2;
+	if (lhs_factors_bit.size() != (uint32_t)n_mult) {
+		lhs_factors_bit.resize(n_mult);
+		rhs_factors_bit.resize(n_mult);
 		bmult_allocate(lhs_factors_bit.size());
 	}
 
-	for (int i=0; i<sz/2; i++) {
-		lhs_factors_bit[i] = Sh_PO[2*i];
-		rhs_factors_bit[i] = Sh_PO[2*i+1];
+	// factors of vector registers are multiplied element by element
+	for (int i=0; i<sz/2; i++)
+	  for (int j=0; j<size; j++) {
+		lhs_factors_bit[i*size+j] = Sh_PO[2*i*size+j];
+		rhs_factors_bit[i*size+j] = Sh_PO[(2*i+1)*size+j];
 //		cout << "lhs_factors " << i << " = " << lhs_factors[i].get_share().get() << ", " << lhs_factors[i].get_mac().get() << endl;
 //		cout << "rhs_factors " << i << " = " << rhs_factors[i].get_share().get() << ", " << rhs_factors[i].get_mac().get() << endl;
 	}
@@ -1606,6 +1612,113 @@ void Processor::Ext_Mult_Stop(const vector<int>& reg, int size)
 //	cout << "Processor::Ext_Mult_Stop extension library stop_mult launched." << endl;
 }
 
+// The arguments are groups of a length n followed by n pairs of factors,
+// and there is one result per group. If the extension library provides
+// start_dotprod, it gets the factors group by group and element by element,
+// so that every result is the sum of lengths[i] consecutive products, and
+// communicates one element per result. Otherwise the products are computed
+// as by Ext_Mult_Start and summed up locally.
+void Processor::Ext_DotProd_Start(const vector<int>& reg, int size)
+{
+	dotprod_lengths.clear();
+	vector<int> factors;
+	for (size_t i = 0; i < reg.size(); i += 2 * reg[i] + 1)
+	{
+		dotprod_lengths.push_back(reg[i]);
+		factors.insert(factors.end(), reg.begin() + i + 1, reg.begin() + i + 1 + 2 * reg[i]);
+	}
+
+	if (NULL == the_ext_lib_z2n.ext_start_dotprod)
+	{
+		Ext_Mult_Start(factors, size);
+		return;
+	}
+
+	vector< Share<gfp> >& Sh_PO = get_Sh_PO<gfp>();
+	Sh_PO.clear();
+	Sh_PO.reserve(factors.size()*size);
+	prep_shares(factors, Sh_PO, size);
+
+	int n_mult = factors.size() * size / 2;
+	lhs_factors_ring.resize(n_mult);
+	rhs_factors_ring.resize(n_mult);
+	mult_allocate(n_mult);
+
+	dotprod_counts.clear();
+	int k = 0, pair = 0;
+	for (size_t g = 0; g < dotprod_lengths.size(); g++)
+	{
+		for (int j = 0; j < size; j++)
+		{
+			for (int i = pair; i < pair + dotprod_lengths[g]; i++, k++)
+			{
+				lhs_factors_ring[k] = Sh_PO[2*i*size+j];
+				rhs_factors_ring[k] = Sh_PO[(2*i+1)*size+j];
+			}
+			dotprod_counts.push_back(dotprod_lengths[g]);
+		}
+		pair += dotprod_lengths[g];
+	}
+
+	export_shares(lhs_factors_ring, mult_factor1);
+	export_shares(rhs_factors_ring, mult_factor2);
+	mult_product.count = dotprod_counts.size();
+
+	if(0 != (*the_ext_lib_z2n.ext_start_dotprod)(&spdz_gfp_ext_context, &mult_factor1, &mult_factor2, &dotprod_counts[0], &mult_product))
+	{
+		cerr << "Processor::Ext_DotProd_Start extension library start_dotprod failed." << endl;
+		dlclose(the_ext_lib_z2n.ext_lib_handle);
+		abort();
+	}
+}
+
+void Processor::Ext_DotProd_Stop(const vector<int>& reg, int size)
+{
+	vector< Share<gfp> >& Sh_PO = get_Sh_PO<gfp>();
+	Sh_PO.clear();
+
+	if (NULL == the_ext_lib_z2n.ext_start_dotprod)
+	{
+		if(0 != (*the_ext_lib_z2n.ext_stop_mult)(&spdz_gfp_ext_context))
+		{
+			cerr << "Processor::Ext_DotProd_Stop library stop_mult failed." << endl;
+			dlclose(the_ext_lib_z2n.ext_lib_handle);
+			abort();
+		}
+		vector< Share<gfp> > products(mult_product.count);
+		import_shares(mult_product, products);
+		int pair = 0;
+		for (size_t g = 0; g < dotprod_lengths.size(); g++)
+		{
+			for (int j = 0; j < size; j++)
+			{
+				Share<gfp> sum = products[pair*size+j];
+				for (int i = pair + 1; i < pair + dotprod_lengths[g]; i++)
+					sum += products[i*size+j];
+				Sh_PO.push_back(sum);
+			}
+			pair += dotprod_lengths[g];
+		}
+		sent += mult_product.count;
+	}
+	else
+	{
+		if(0 != (*the_ext_lib_z2n.ext_stop_dotprod)(&spdz_gfp_ext_context))
+		{
+			cerr << "Processor::Ext_DotProd_Stop library stop_dotprod failed." << endl;
+			dlclose(the_ext_lib_z2n.ext_lib_handle);
+			abort();
+		}
+		Sh_PO.resize(mult_product.count);
+		import_shares(mult_product, Sh_PO);
+		mult_product.count = mult_factor1.count;
+		sent += reg.size() * size;
+	}
+
+	load_shares(reg, Sh_PO, size);
+	rounds++;
+}
+
 #if defined(EXT_NEC_RING)
 void Processor::Ext_BMult_Stop(const vector<int>& reg, int size)
 {
@@ -2301,6 +2414,8 @@ spdz_ext_ifc::spdz_ext_ifc()
 	*(void**)(&ext_verify_final) = NULL;
 	*(void**)(&ext_start_mult) = NULL;
 	*(void**)(&ext_stop_mult) = NULL;
+	*(void**)(&ext_start_dotprod) = NULL;
+	*(void**)(&ext_stop_dotprod) = NULL;
 
 	//get the SPDZ-2 extension library for env-var
 	const char * spdz_ext_lib = getenv("SPDZ_EXT_LIB");
@@ -2346,6 +2461,16 @@ spdz_ext_ifc::spdz_ext_ifc()
 	LOAD_LIB_METHOD("verify_final", ext_verify_final)
 	LOAD_LIB_METHOD("start_mult", ext_start_mult)
 	LOAD_LIB_METHOD("stop_mult", ext_stop_mult)
+
+	//the dot product is optional, see Processor::Ext_DotProd_Start
+	*(void**)(&ext_start_dotprod) = dlsym(ext_lib_handle, "start_dotprod");
+	*(void**)(&ext_stop_dotprod) = dlsym(ext_lib_handle, "stop_dotprod");
+	if(NULL == ext_start_dotprod || NULL == ext_stop_dotprod)
+	{
+		*(void**)(&ext_start_dotprod) = NULL;
+		*(void**)(&ext_stop_dotprod) = NULL;
+	}
+	dlerror();
 }
 
 spdz_ext_ifc::~spdz_ext_ifc()
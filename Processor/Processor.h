@@ -100,6 +100,9 @@ public:
     int (*ext_verify_final)(MPC_CTX * ctx, int * error);
     int (*ext_start_mult)(MPC_CTX * ctx, const share_t * factor1, const share_t * factor2, share_t * product);
     int (*ext_stop_mult)(MPC_CTX * ctx);
+    // optional, NULL if the library does not provide them
+    int (*ext_start_dotprod)(MPC_CTX * ctx, const share_t * factor1, const share_t * factor2, const int * lengths, share_t * products);
+    int (*ext_stop_dotprod)(MPC_CTX * ctx);
 
     static int load_extension_method(const char * method_name, void ** proc_addr, void * libhandle);
 };
@@ -355,6 +358,8 @@ class Processor : public ProcessorBase
   void Ext_Final_Verification();
   void Ext_Mult_Start(const vector<int>& reg, int size);
   void Ext_Mult_Stop(const vector<int>& reg, int size);
+  void Ext_DotProd_Start(const vector<int>& reg, int size);
+  void Ext_DotProd_Stop(const vector<int>& reg, int size);
   void Ext_Open_Start(const vector<int>& reg, int size);
   void Ext_Open_Stop(const vector<int>& reg, int size);
 
@@ -370,6 +375,8 @@ class Processor : public ProcessorBase
   share_t mult_factor1, mult_factor2, mult_product;
   void mult_allocate(const size_t required_count);
   void mult_clear();
+  // lengths of the dot products by group and as passed to start_dotprod
+  vector<int> dotprod_lengths, dotprod_counts;
 
 #if defined(EXT_NEC_RING)
   size_t bmult_allocated;
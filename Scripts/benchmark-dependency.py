@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# Time building the dependency graph of a synthetic basic block.
+#
+# Usage (from the main directory):
+#
+# ./Scripts/benchmark-dependency.py [instructions]
+#
+# The block mixes local arithmetic, multiplications, opens, memory
+# accesses and output like a compiled program. The program is set up in
+# a temporary directory, so nothing is written to Programs.
+
+import sys, os, time, random, shutil, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+
+import Compiler.instructions as inst
+import Compiler.instructions_base
+import Compiler.types
+import Compiler.comparison
+import Compiler.allocator as al
+from Compiler.program import Program
+
+class Options(object):
+    galois = 40
+    merge_opens = True
+    max_parallel_open = False
+    preserve_mem_order = True
+    dead_code_elimination = False
+    stream = False
+
+def generate(n, seed=0):
+    """ Append about n instructions to the current block. """
+    random.seed(seed)
+    program = inst.program
+    new_reg = program.curr_block.new_reg
+    secret = [new_reg('s') for i in range(10)]
+    clear = [new_reg('c') for i in range(10)]
+    for reg in secret:
+        inst.ldsi(reg, 1)
+    for reg in clear:
+        inst.ldi(reg, 1)
+    count = 0
+    while count < n:
+        k = random.randint(0, 9)
+        if k < 4:
+            res = new_reg('s')
+            inst.adds(res, random.choice(secret), random.choice(secret))
+            secret.append(res)
+            count += 1
+        elif k < 6:
+            res = new_reg('s')
+            inst.addm(res, random.choice(secret), random.choice(clear))
+            secret.append(res)
+            count += 1
+        elif k < 8:
+            res = new_reg('s')
+            inst.e_startmult(random.choice(secret), random.choice(secret))
+            inst.e_stopmult(res)
+            secret.append(res)
+            count += 2
+        elif k < 9:
+            res = new_reg('c')
+            inst.e_startopen(random.choice(secret))
+            inst.e_stopopen(res)
+            clear.append(res)
+            count += 2
+        else:
+            addr = random.randint(0, 1000)
+            if random.randint(0, 1):
+                inst.stms(random.choice(secret), addr)
+            else:
+                res = new_reg('s')
+                inst.ldms(res, addr)
+                secret.append(res)
+            count += 1
+        del secret[:-100]
+        del clear[:-100]
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    try:
+        os.mkdir(tmp + '/Programs')
+        os.chdir(tmp)
+        program = Program(['benchmark'], Options())
+        program.EMULATE = False
+        for module in (inst, Compiler.instructions_base, Compiler.types,
+                       Compiler.comparison):
+            module.program = program
+        generate(n)
+        block = program.curr_block
+        print 'Block of %d instructions' % len(block.instructions)
+        start = time.time()
+        for i in block.instructions:
+            i.get_def(), i.get_used()
+        print 'get_def/get_used: %.2f s' % (time.time() - start)
+        start = time.time()
+        al.Merger(block, Options())
+        print 'Dependency graph: %.2f s' % (time.time() - start)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+# Compare SparseDiGraph and CompactDiGraph on a synthetic basic block.
+#
+# Usage (from the main directory):
+#
+# ./Scripts/benchmark-graph.py [instructions] [edges per instruction]
+#
+# Every graph is built, merged and sorted in a separate process so that
+# the reported peak memory only covers one graph. Before timing, both
+# classes are checked to give the same results on smaller graphs.
+
+import sys, os, time, random, resource, subprocess, itertools
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+
+import Compiler.graph
+
+def build(cls, n, degree, seed=0):
+    """ Mimic Merger.dependency_graph: every instruction depends on a few
+    recent instructions, every 100th instruction is an open, and the
+    sources are collected while building. Opens only depend on
+    instructions before the previous open so that there is no path
+    between them, like opens of the same depth. """
+    random.seed(seed)
+    G = cls(n)
+    sources = []
+    opens = []
+    for i in xrange(n):
+        G.add_node(i, is_source=True)
+        for k in xrange(degree):
+            if i % 100 == 0:
+                j = i - random.randint(101, 150)
+            else:
+                j = i - random.randint(1, 50)
+            if j >= 0:
+                G.add_edge(j, i)
+                G.set_attr(i, 'is_source', G.get_attr(j, 'is_source'))
+        if i % 100 == 0:
+            opens.append(i)
+            G.add_node(i, merges=[])
+            G.set_attr(i, 'stop', min(i + 1, n - 1))
+        if not G.in_degree(i):
+            sources.append(i)
+    return G, sources, opens
+
+def merge_nodes(G, i, j):
+    """ Same as Merger.merge_nodes """
+    if j in G[i]:
+        G.remove_edge(i, j)
+    if i in G[j]:
+        G.remove_edge(j, i)
+    G.add_edges_from(zip(itertools.cycle([i]), G[j], [G.weights[(j,k)] for k in G[j]]))
+    G.add_edges_from(zip(G.pred[j], itertools.cycle([i]), [G.weights[(k,j)] for k in G.pred[j]]))
+    G.get_attr(i, 'merges').append(j)
+    G.remove_node(j)
+
+def merge_opens(G, opens):
+    """ Merge every second open into the previous one. """
+    for k in xrange(1, len(opens), 2):
+        merge_nodes(G, opens[k - 1], opens[k])
+
+def run(cls, n, degree, seed=0):
+    G, sources, opens = build(cls, n, degree, seed)
+    merge_opens(G, opens)
+    return G, sources, Compiler.graph.topological_sort(G)
+
+def check(n=3000, degree=3, seeds=20):
+    for seed in range(seeds):
+        results = [run(cls, n, degree, seed) for cls in \
+                   (Compiler.graph.SparseDiGraph, Compiler.graph.CompactDiGraph)]
+        (G, sources, order), (H, sources2, order2) = results
+        assert sources == sources2, 'sources differ for seed %d' % seed
+        assert order == order2, 'topological order differs for seed %d' % seed
+        for i in xrange(n):
+            assert G[i] == H[i] and G.pred[i] == H.pred[i] and \
+                G.degree(i) == H.degree(i) and \
+                G.in_degree(i) == H.in_degree(i), \
+                'node %d differs for seed %d' % (i, seed)
+            for attr in G.default_attributes:
+                assert G.get_attr(i, attr) == H.get_attr(i, attr), \
+                    'attribute %s of node %d differs for seed %d' % \
+                    (attr, i, seed)
+    print 'Results identical on %d random graphs' % seeds
+
+def run_variant(name, n, degree):
+    cls = getattr(Compiler.graph, name)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    run(cls, n, degree)
+    elapsed = time.time() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print '%s %f %d' % (name, elapsed, after - before)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    degree = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    if len(sys.argv) > 3:
+        run_variant(sys.argv[3], n, degree)
+        return
+    check()
+    print 'Synthetic block of %d instructions, up to %d edges each' % (n, degree)
+    results = {}
+    for name in ('SparseDiGraph', 'CompactDiGraph'):
+        out = subprocess.check_output([sys.executable, __file__, str(n),
+                                       str(degree), name])
+        name, elapsed, mem = out.split()
+        results[name] = float(elapsed), int(mem)
+        print '%-15s %8.2f s %10d KB' % (name, float(elapsed), int(mem))
+    old, new = results['SparseDiGraph'], results['CompactDiGraph']
+    print 'Time saved: %.1f%%, memory saved: %.1f%%' % \
+        (100 * (1 - new[0] / old[0]), 100 * (1 - float(new[1]) / max(old[1], 1)))
+
+if __name__ == '__main__':
+    main()
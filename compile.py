@@ -17,6 +17,7 @@
 
 from optparse import OptionParser
 import Compiler
+import Compiler.cache
 
 def main():
     usage = "usage: %prog [options] filename [args]"
@@ -40,12 +41,33 @@ def main():
                       help="emulate register values for debugging")
     parser.add_option("-c", "--comparison", dest="comparison", default="log",
                       help="comparison variant: log|plain|inv|sinv")
+    parser.add_option("--bitdec", dest="bitdec", default="ripple",
+                      help="carry propagation in bit decomposition: "
+                      "ripple|sqrt|kogge-stone|sklansky")
+    parser.add_option("--bitrec", dest="bitrec", default="ripple",
+                      help="bit recomposition: ripple|inject|inject-k "
+                      "(inject-k assumes sfix products fit into k bits)")
+    parser.add_option("--trunc", dest="trunc", default="exact",
+                      help="truncation: exact|short|prob (short assumes sfix "
+                      "products fit into k bits, prob may be one too low)")
+    parser.add_option("--div-iterations", dest="div_iterations", type="int",
+                      help="Goldschmidt iterations for division by secret "
+                      "sfix (default: floor(log2(k)))")
+    parser.add_option("--dotprod", action="store_true", dest="dotprod",
+                      default=False,
+                      help="replace sums of sint products by dot products, "
+                      "which need start_dotprod in the extension library "
+                      "to save communication")
+    parser.add_option("--no-cse", action="store_false", dest="cse",
+                      default=True,
+                      help="don't reuse the results of bit decompositions, "
+                      "conversions and comparisons with the same inputs")
     parser.add_option("-r", "--noreorder", dest="reorder_between_opens",
                       action="store_false", default=True,
                       help="don't attempt to place instructions between start/stop opens")
     parser.add_option("-M", "--preserve-mem-order", action="store_true",
                       dest="preserve_mem_order", default=True,
-                      help="preserve order of memory instructions; possible efficiency loss")
+                      help="preserve order of memory instructions that may overlap (default)")
     parser.add_option("-O", "--optimize-hard", action="store_false",
                       dest="preserve_mem_order", default=True,
                       help="don't preserve order of memory instructions; possible loss of correctness")
@@ -56,6 +78,30 @@ def main():
     parser.add_option("-D", "--dead-code-elimination", action="store_true",
                       dest="dead_code_elimination", default=False,
                       help="eliminate instructions with unused result")
+    parser.add_option("--stream", action="store_true", dest="stream",
+                      default=False,
+                      help="optimize and write basic blocks as soon as they "
+                      "are complete to save memory; disables register "
+                      "reallocation, emulation and dead code elimination "
+                      "in streamed blocks")
+    parser.add_option("-B", "--merge-blocks", dest="merge_blocks",
+                      type="int", default=0,
+                      help="unroll loops with constant bounds of up to N "
+                      "iterations and merge communication rounds across "
+                      "the resulting blocks (default: 0)")
+    parser.add_option("--latency", dest="latency", type="float",
+                      help="seconds per round of communication in the cost "
+                      "report (default: see NETWORK in Compiler/config.py)")
+    parser.add_option("--bandwidth", dest="bandwidth", type="float",
+                      help="bytes per second in the cost report (default: "
+                      "see NETWORK in Compiler/config.py)")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", default=1,
+                      help="number of forked processes for merging large "
+                      "basic blocks (default: 1)")
+    parser.add_option("--no-cache", action="store_false", dest="cache",
+                      default=True,
+                      help="always compile instead of restoring the result "
+                      "from the compilation cache")
     parser.add_option("-P", "--profile", action="store_true", dest="profile",
                       help="profile compilation")
     parser.add_option("-C", "--continous", action="store_true", dest="continuous",
@@ -67,7 +113,15 @@ def main():
         parser.print_help()
         return
 
+    # assembly output and profiling need an actual compilation
+    use_cache = options.cache and not options.asmoutfile and \
+        not options.profile
+
     def compilation():
+        if use_cache:
+            key = Compiler.cache.key(args, options)
+            if Compiler.cache.restore(args, options, key):
+                return
         prog = Compiler.run(args, options, param=int(options.param),
                             merge_opens=options.merge_opens, emulate=options.emulate,
                             assemblymode=options.assemblymode, debug=options.debug)
@@ -77,6 +131,9 @@ def main():
             for tape in prog.tapes:
                 tape.write_str(options.asmoutfile + '-' + tape.name)
 
+        if use_cache:
+            Compiler.cache.store(prog, key)
+
     if options.profile:
         import cProfile
         p = cProfile.Profile().runctx('compilation()', globals(), locals())